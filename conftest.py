@@ -7,12 +7,237 @@
 # NOTICE: authors should document their contributions in concisely in NOTICE
 # with details inline in source files, comments, and docstrings.
 """
-This adds the automatic fixtures needed with the pytest.ini
+This adds the automatic fixtures needed with the pytest.ini, along with helpers shared by the tests
 """
 
+import os
+import time
+import threading
+
+import pytest
 import wield.pytest
 from wield.pytest.fixtures import (  # noqa
     tpath,
     closefigs,
     capture,
 )
+from wield.epics import autocas
+from wield.epics.autocas.cascore import cas_shards, pyepics_backend
+
+# the shards of the CA tests serve on their own ports, since a unicast search only reaches one of
+# several servers sharing a port on the same host
+SHARD_PORTS = [15064, 15065, 15066, 15067]
+# a port of its own for the remote PV tests, as the shard servers of other tests may still be
+# closing
+REMOTE_PORT = SHARD_PORTS[-1]
+
+
+def run_reactor_with(reactor, *targets):
+    """
+    Runs the reactor in this (main) thread while each of targets runs in its own thread, as the
+    pcaspy server thread or other clients would, until all of them return. Returns the list of
+    their return values, or raises the first exception of a target.
+    """
+    results = [None] * len(targets)
+    errors = []
+    remaining = [len(targets)]
+    lock = threading.Lock()
+
+    def wrap(idx, target):
+        try:
+            results[idx] = target()
+        except BaseException as E:
+            with lock:
+                errors.append(E)
+        finally:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    reactor.loop_kill()
+
+    threads = [
+        threading.Thread(target=wrap, args=(idx, target)) for idx, target in enumerate(targets)
+    ]
+
+    def start():
+        for thread in threads:
+            thread.start()
+
+    # started from within the reactor, so that it is seen as running
+    reactor.send_task(start)
+    reactor.run_reactor()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def ca_local_environ():
+    """
+    Keep the CA traffic of the tests on this host, also searching the shard ports. Must be called
+    before pyepics creates its CA context.
+    """
+    os.environ.setdefault("EPICS_CA_AUTO_ADDR_LIST", "NO")
+    addrs = os.environ.get("EPICS_CA_ADDR_LIST", "127.0.0.1").split()
+    for port in SHARD_PORTS:
+        addr = "127.0.0.1:{0}".format(port)
+        if addr not in addrs:
+            addrs.append(addr)
+    os.environ["EPICS_CA_ADDR_LIST"] = " ".join(addrs)
+    # for the long waveforms of the remote PV benchmarks
+    os.environ.setdefault("EPICS_CA_MAX_ARRAY_BYTES", str(10**7))
+
+
+def cas_db_relays(rvs, remote=False, deferred=False):
+    """
+    db mapping each channel of rvs to the settings of its relay, as setting PVs, or as external
+    PVs if remote
+    """
+    db = dict()
+    for channel, rv in rvs.items():
+        entry = rv.db_defaults()
+        entry.update(
+            interaction="external" if remote else "setting",
+            remote=remote,
+            deferred=deferred,
+        )
+        db[channel] = entry
+    return db
+
+
+def cas_db_kinds(prefix="X1:TEST-"):
+    """
+    db of a PV of each kind of relay, along with a report PV. Returns the db and the relays by
+    their name without the prefix.
+    """
+    rvs = dict(
+        VAL=autocas.RelayValueFloat(0),
+        LIM=autocas.RelayValueFloatLowHighMod(0, low=0, high=10),
+        INT=autocas.RelayValueInt(0),
+        ENUM=autocas.RelayValueEnum(0, ["A", "B", "C"]),
+        REPORT=autocas.RelayValueFloat(0),
+    )
+    db = cas_db_relays({prefix + name: rv for name, rv in rvs.items()})
+    db[prefix + "REPORT"]["interaction"] = "report"
+    return db, rvs
+
+
+def cas_remote_connect(
+    prefix,
+    N,
+    N_missing=0,
+    timeout_s=60,
+    check=None,
+    deferred=False,
+    rvs_host=None,
+    rvs_remote=None,
+    **kwargs
+):
+    """
+    Host N PVs in a shard worker, and connect a CAEpicsClient to them along with N_missing
+    channels that don't exist. Returns the client, its relays and the seconds until every
+    hosted PV was connected, or found bad. check is then called in the client thread.
+
+    The relays rvs_host and rvs_remote, mapping channels to relays, are used instead if given.
+    """
+    if rvs_host is None:
+        rvs_host = dict()
+        rvs_remote = dict()
+        for idx in range(N + N_missing):
+            channel = "{0}C{1}".format(prefix, idx)
+            if idx < N:
+                rvs_host[channel] = autocas.RelayValueFloat(float(idx))
+            rvs_remote[channel] = autocas.RelayValueFloat(-1.0)
+    db_host = cas_db_relays(rvs_host)
+    db = cas_db_relays(rvs_remote, remote=True, deferred=deferred)
+    # one reactor also applies the writes of the client to the hosted PVs
+    reactor = autocas.Reactor()
+    server = cas_shards.ShardedCAServer(
+        db_host, reactor, shards=[list(db_host)], ports=[REMOTE_PORT]
+    )
+    client = pyepics_backend.CAEpicsClient(db, reactor, **kwargs)
+    results = dict()
+
+    def target():
+        t_start = time.perf_counter()
+        reactor.send_task_synchronous(client.start)
+        t_end = time.time() + timeout_s
+        while time.time() < t_end:
+            pending, bad, connected = reactor.send_task_synchronous(client.connection_counts)
+            if pending <= N_missing:
+                break
+            time.sleep(0.01)
+        results["connect_s"] = time.perf_counter() - t_start
+        if check is not None:
+            check(client, reactor)
+
+    with server:
+        run_reactor_with(reactor, target)
+    return client, rvs_remote, results["connect_s"]
+
+
+def cas_remote_write(client, reactor, rvs, value, timeout_s=10):
+    """
+    Put value to every relay from the reactor, and wait until every put of the client
+    completed. Returns the seconds taken.
+    """
+
+    def update():
+        for rv in rvs.values():
+            rv.put(value)
+
+    def outstanding():
+        with client._put_lock:
+            return sum(client._puts_outstanding.values())
+
+    t_start = time.perf_counter()
+    reactor.send_task_synchronous(update)
+    t_end = time.time() + timeout_s
+    # wait for the puts to be issued, then completed
+    while time.time() < t_end and reactor.send_task_synchronous(
+        lambda: len(client.pending_writes)
+    ):
+        time.sleep(0.001)
+    while time.time() < t_end and outstanding() > 0:
+        time.sleep(0.001)
+    return time.perf_counter() - t_start
+
+
+# the helpers above as fixtures, so that the tests don't import them from here or each other
+
+
+@pytest.fixture(name="run_reactor_with")
+def fixture_run_reactor_with():
+    return run_reactor_with
+
+
+@pytest.fixture(name="ca_local", scope="session")
+def fixture_ca_local():
+    ca_local_environ()
+    return
+
+
+@pytest.fixture(name="shard_ports")
+def fixture_shard_ports(ca_local):
+    return SHARD_PORTS
+
+
+@pytest.fixture(name="cas_db_relays")
+def fixture_cas_db_relays():
+    return cas_db_relays
+
+
+@pytest.fixture(name="cas_db_kinds")
+def fixture_cas_db_kinds(ca_local):
+    return cas_db_kinds
+
+
+@pytest.fixture(name="cas_remote_connect")
+def fixture_cas_remote_connect(ca_local):
+    return cas_remote_connect
+
+
+@pytest.fixture(name="cas_remote_write")
+def fixture_cas_remote_write():
+    return cas_remote_write
@@ -11,16 +11,19 @@ from ._version import version, __version__, version_info
 
 from .cascore import (
     Reactor,
+    AsyncioReactor,
     CASUser,
     InstaCAS,
     CAS9CmdLine,
     CAS9Module,
     CADriverServer,
+    ShardedCAServer,
     RelayValueFloat,
     RelayValueFloatLowHighMod,
     RelayValueInt,
     RelayValueString,
     RelayValueLongString,
+    RelayWaveform,
     RelayValueEnum,
     RelayValueCoerced,
     RelayValueRejected,
@@ -32,6 +35,20 @@ from .cascore import (
     RelayBoolAny,
     RelayBoolNotAll,
     RelayBoolNotAny,
+    RelayCompact,
+    RelayCompactFloat,
+    RelayCompactInt,
+    RelayCompactString,
+    RelayArrayFloatLowHighMod,
+    RelayArrayElement,
+    CASRelayValidate,
+    relay_validate,
+    VALUE_VALID,
+    VALUE_COERCED,
+    VALUE_REJECTED,
+    RelayBatch,
+    batch,
+    batch_active,
     dproperty,
     dproperty_ctree,
     mproperty,
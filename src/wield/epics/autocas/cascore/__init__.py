@@ -10,6 +10,15 @@
 
 
 from .reactor import Reactor
+from .asyncio_reactor import AsyncioReactor
+from .workers import BusWorker
+from .futures import ReactorFuture, FutureCancelled, gather
+from .lanes import (
+    LANE_CONTROL,
+    LANE_IO,
+    LANE_MONITOR,
+    LANE_HOUSEKEEPING,
+)
 
 from .cascore import (
     CASUser,
@@ -32,12 +41,17 @@ from .pcaspy_backend import (
     CADriverServer,
 )
 
+from .cas_shards import (
+    ShardedCAServer,
+)
+
 from .relay_values import (
     RelayValueFloat,
     RelayValueFloatLowHighMod,
     RelayValueInt,
     RelayValueString,
     RelayValueLongString,
+    RelayWaveform,
     RelayValueEnum,
     RelayValueCoerced,
     RelayValueRejected,
@@ -49,4 +63,18 @@ from .relay_values import (
     RelayBoolAny,
     RelayBoolNotAll,
     RelayBoolNotAny,
+    RelayCompact,
+    RelayCompactFloat,
+    RelayCompactInt,
+    RelayCompactString,
+    RelayArrayFloatLowHighMod,
+    RelayArrayElement,
+    CASRelayValidate,
+    relay_validate,
+    VALUE_VALID,
+    VALUE_COERCED,
+    VALUE_REJECTED,
+    RelayBatch,
+    batch,
+    batch_active,
 )
@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Reactor running its tasks on an :mod:`asyncio` event loop, so that autocas services can share
+a process with other asyncio code.
+"""
+import time
+import asyncio
+import threading
+import functools
+
+from . import reactor
+from . import clocks
+from . import lanes
+from . import reactor_profile
+from .reactor import keyboard_interrupt_delay
+
+
+class _TaskLocked(object):
+    """
+    Awaitable driving a coroutine one step at a time. The task lock is held while each step
+    runs and released while the coroutine is suspended, so that coroutines touch relay values
+    under the same lock as every other reactor task.
+    """
+
+    def __init__(self, coro, task_lock):
+        self.coro = coro
+        self.task_lock = task_lock
+
+    def __await__(self):
+        coro = self.coro
+        send_val = None
+        throw_exc = None
+        while True:
+            with self.task_lock, keyboard_interrupt_delay:
+                try:
+                    if throw_exc is None:
+                        yielded = coro.send(send_val)
+                    else:
+                        yielded = coro.throw(throw_exc)
+                except StopIteration as E:
+                    return E.value
+            try:
+                send_val = yield yielded
+                throw_exc = None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as E:
+                send_val = None
+                throw_exc = E
+
+
+class AsyncioReactor(reactor.ReactorBase):
+    """
+    Drop-in alternative to :class:`~.reactor.Reactor`. Tasks are run from the event loop, timed
+    tasks with loop.call_at and sends from other threads (the pcaspy and pyepics threads) with
+    loop.call_soon_threadsafe. Each task holds the task_lock while it runs.
+
+    Ready tasks wait in the same priority lanes as for the threaded reactor. The loop runs one
+    of them per callback, chosen by the LaneScheduler, so other asyncio callbacks still
+    interleave with a burst of tasks.
+
+    Tasks may return a coroutine (e.g. be async functions), which then runs as an asyncio task.
+    The task lock is released whenever it awaits, so it may await serial I/O through
+    :meth:`run_blocking` without stalling the other reactor tasks.
+
+    The reactor may own its event loop and be run with flush or run_reactor, or it may be given
+    a running loop and be awaited with run_async.
+    """
+
+    def __init__(self, task_lock=None, loop=None, lane_shares=None):
+        super(AsyncioReactor, self).__init__(
+            task_lock=task_lock,
+            clock=clocks.RealTimeClock(),
+        )
+        if loop is None:
+            loop = asyncio.new_event_loop()
+        self.loop = loop
+        # ready tasks, in their priority lanes. Filled from any thread and drained by the loop
+        self._task_queue = lanes.LaneScheduler(lane_shares)
+        self._lanes_lock = threading.Lock()
+        # if a _lanes_drain callback is waiting in the loop
+        self._drain_queued = False
+        # keyed timed tasks, maps key to (TimerHandle, task, lane)
+        self._timer_handles = dict()
+        self._exit_future = None
+        self._heartbeat_handle = None
+        return  # ~__init__
+
+    def run_reactor(self):
+        self._run_begin()
+        try:
+            self.loop.run_until_complete(self._run_wait(forever=True))
+        finally:
+            self._run_end()
+
+    def run_async(self):
+        """
+        Run the reactor within an already running event loop until loop_kill, use as
+
+            await reactor.run_async()
+
+        The task lock is released as soon as this is called, rather than when first awaited,
+        so tasks already handed to the loop can run.
+        """
+        self._run_begin()
+
+        async def run():
+            try:
+                await self._run_wait(forever=True)
+            finally:
+                self._run_end()
+
+        return run()
+
+    def flush(
+        self,
+        for_s=None,
+        modulo_s=None,
+        mtime_to=None,
+    ):
+        if for_s is not None:
+            if mtime_to is None:
+                mtime_to = self.clock.time()
+            mtime_to += for_s
+
+        if modulo_s is not None:
+            if mtime_to is None:
+                mtime_to = self.clock.time()
+            mtime_to = mtime_to + modulo_s - mtime_to % modulo_s
+        # if mtime_to is None at this point, then it means to run the ready tasks and quit
+        self._run_begin()
+        try:
+            self.loop.run_until_complete(self._run_wait(mtime_to=mtime_to))
+        finally:
+            self._run_end()
+        return
+
+    def _run_begin(self):
+        self._exit_future = self.loop.create_future()
+        self._current_reactor_thread = threading.current_thread()
+        self._heartbeat()
+        self.task_lock.release()
+
+    def _run_end(self):
+        self._exit_future = None
+        self._heartbeat_handle.cancel()
+        self._heartbeat_handle = None
+        self._current_reactor_thread = None
+        self.task_lock.acquire()
+
+    async def _run_wait(self, mtime_to=None, forever=False):
+        if forever:
+            await self._exit_future
+            return
+
+        if mtime_to is None:
+            # run the ready tasks, as the threaded reactor does
+            while self._task_queue and not self._exit_future.done():
+                await asyncio.sleep(0)
+            timeout_s = 0
+        else:
+            timeout_s = max(mtime_to - self.clock.time(), 0)
+        await asyncio.wait([self._exit_future], timeout=timeout_s)
+        if self._exit_future.done():
+            # raises any task exception
+            self._exit_future.result()
+        return
+
+    def _heartbeat(self):
+        """
+        Ticks the task count for the canary thread. The loop has no idle state the
+        canary can inspect, so it only knows the loop is alive when this runs.
+        """
+        self._task_num += 1
+        self._heartbeat_handle = self.loop.call_later(
+            self._canary_poll, self._heartbeat
+        )
+
+    def _exit(self):
+        fut = self._exit_future
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    def loop_kill(self):
+        self.loop.call_soon_threadsafe(self._exit)
+
+    def _task_failed(self, E):
+        # like the threaded reactor, a failed task ends the run and raises from it
+        fut = self._exit_future
+        if fut is not None and not fut.done():
+            fut.set_exception(E)
+        else:
+            self.loop.call_exception_handler(
+                dict(
+                    message="Reactor task failed",
+                    exception=E,
+                )
+            )
+
+    def _run_task(self, item, mtime_ready=None, lane=None):
+        self._task_num += 1
+        try:
+            with self.task_lock, keyboard_interrupt_delay:
+                if mtime_ready is not None:
+                    wait_s = self.clock.time() - mtime_ready
+                else:
+                    wait_s = None
+                t_start = time.perf_counter()
+                try:
+                    ret = item()
+                finally:
+                    # only the synchronous part of coroutine tasks is timed
+                    self.profile.record_run(
+                        getattr(item, "profile_name", None) or reactor_profile.task_name(item),
+                        time.perf_counter() - t_start,
+                        wait_s=wait_s,
+                        depth=len(self._timer_handles) + len(self._task_queue),
+                        lane=lane,
+                    )
+        except Exception as E:
+            self._task_failed(E)
+            return
+        if asyncio.iscoroutine(ret):
+            self.loop.create_task(self._run_coroutine(ret))
+        return
+
+    async def _run_coroutine(self, coro):
+        try:
+            await _TaskLocked(coro, self.task_lock)
+        except Exception as E:
+            self._task_failed(E)
+
+    def run_blocking(self, func, *args, executor=None):
+        """
+        Returns an awaitable running func(*args) in an executor thread. The task lock is not held
+        during the call, so func should only do the blocking I/O and leave relay values to the
+        awaiting coroutine.
+        """
+        return self.loop.run_in_executor(executor, functools.partial(func, *args))
+
+    def _in_loop(self, func, *args):
+        """
+        Call func now if this thread may use the loop, otherwise hand it to the loop thread
+        """
+        thread = self._current_reactor_thread
+        if thread is None or thread is threading.current_thread():
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def _loop_time(self, mtime):
+        return self.loop.time() + (mtime - self.clock.time())
+
+    def send_task(self, item, run_at=None, lane=None):
+        """
+        Send the nullary callable item to run in the reactor, immediately or at the time run_at.
+        lane is the name of the priority lane for the task, the control lane by default.
+        """
+        if not callable(item):
+            raise RuntimeError("Reactor Item must be a nullary Callable")
+        self._task_send_num += 1
+        if (self._task_send_num % self.rate_latency_check) == 0:
+            my_time = self.clock.time()
+            self.send_task(lambda: self._check_latency(my_time))
+        lane = self._task_queue.lane(lane)
+        if run_at is None:
+            self._lane_push(
+                lane,
+                item,
+                self.clock.time(),
+                threadsafe=self._current_reactor_thread is not threading.current_thread(),
+            )
+        else:
+            self._in_loop(self._call_at, run_at, item, lane)
+        return
+
+    def _call_at(self, mtime, item, lane):
+        self.loop.call_at(self._loop_time(mtime), self._lane_push, lane, item, mtime)
+
+    def _lane_push(self, lane, item, mtime_ready, threadsafe=False):
+        """
+        Add the task to its lane, queueing a _lanes_drain unless one already is. Callable from
+        other threads with threadsafe set.
+        """
+        with self._lanes_lock:
+            self._task_queue.push(lane, (item, mtime_ready))
+            if self._drain_queued:
+                return
+            self._drain_queued = True
+        if threadsafe:
+            self.loop.call_soon_threadsafe(self._lanes_drain)
+        else:
+            self.loop.call_soon(self._lanes_drain)
+
+    def _lanes_drain(self):
+        """
+        Run the next ready task, queueing another drain if more are waiting
+        """
+        with self._lanes_lock:
+            ready = self._task_queue.pop()
+            if self._task_queue:
+                self.loop.call_soon(self._lanes_drain)
+            else:
+                self._drain_queued = False
+        if ready is not None:
+            (item, mtime_ready), lane = ready
+            self._run_task(item, mtime_ready, lane.name)
+
+    def lane_names(self):
+        return list(self._task_queue.lanes.keys())
+
+    def lane_status(self):
+        """
+        dict mapping each lane name to the (number of ready tasks, wait of its oldest task in
+        seconds). The wait is None for empty lanes.
+        """
+        with self._lanes_lock:
+            depths = self._task_queue.depths()
+            oldest = self._task_queue.oldest()
+        mtime_now = self.clock.time()
+        status = dict()
+        for name, depth in depths.items():
+            mtime_ready = oldest[name]
+            if mtime_ready is None:
+                status[name] = (depth, None)
+            else:
+                status[name] = (depth, mtime_now - mtime_ready)
+        return status
+
+    def _check_latency(self, send_time):
+        now_time = self.clock.time()
+        self.latency_cb(now_time - send_time, len(self._task_queue))
+
+    def _timer_set(self, key, mtime, task, lane=None):
+        lane = self._task_queue.lane(lane)
+        self._in_loop(self._timer_set_loop, key, mtime, task, lane)
+
+    def _timer_set_loop(self, key, mtime, task, lane):
+        handle_task = self._timer_handles.get(key, None)
+        if handle_task is not None:
+            handle_task[0].cancel()
+        handle = self.loop.call_at(
+            self._loop_time(mtime), self._timer_fire, key, mtime, task, lane
+        )
+        self._timer_handles[key] = (handle, task, lane)
+
+    def _timer_move(self, key, mtime):
+        self._in_loop(self._timer_move_loop, key, mtime)
+
+    def _timer_move_loop(self, key, mtime):
+        handle_task = self._timer_handles.get(key, None)
+        # may have already fired if this was handed over from another thread
+        if handle_task is not None:
+            self._timer_set_loop(key, mtime, handle_task[1], handle_task[2])
+
+    def _timer_cancel(self, key):
+        self._in_loop(self._timer_cancel_loop, key)
+
+    def _timer_cancel_loop(self, key):
+        handle_task = self._timer_handles.pop(key, None)
+        if handle_task is not None:
+            handle_task[0].cancel()
+
+    def _timer_fire(self, key, mtime, task, lane):
+        # due tasks join their lane, and skip themselves if cancelled while waiting there
+        self._timer_handles.pop(key, None)
+        self._lane_push(lane, task, mtime)
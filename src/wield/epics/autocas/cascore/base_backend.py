@@ -32,22 +32,62 @@ class CASCollector(declarative.OverridableObject):
         """
         return {}
 
+    @declarative.dproperty
+    def channel_rvs(self):
+        """
+        Mapping from PV name to its RelayValue or RelayBool, the index of the names hosted so far
+        """
+        return {}
+
+    @declarative.dproperty
+    def channel_db(self):
+        """
+        Mapping from PV name to its settings dictionary, including the rv. Filled by cas_host,
+        sharing the dictionaries of rv_db
+        """
+        return {}
+
     def cas_db_generate(self):
-        db_gen = dict()
-        for rv, db_entry in self.rv_db.items():
-            name = self.rv_names.get(rv, None)
-            if name is None:
-                print("MISSING NAME: ", rv)
-            elif isinstance(name, (list, tuple)):
-                name = self.prefix2channel(name)
-            dcopy = dict(db_entry)
-            dcopy["rv"] = rv
-            db_gen[name] = dcopy
-        return db_gen
+        """
+        The db of every hosted PV, as maintained by cas_host. Returns a snapshot, so that PVs
+        hosted later don't change the dictionary while the servers and clients iterate it. The
+        settings dictionaries are copied too, so edits to them don't reach rv_db.
+        """
+        return {channel: dict(db_entry) for channel, db_entry in self.channel_db.items()}
+
+    def channels(self, remote=None):
+        """
+        Sorted list of the PV names, only the remote or the hosted ones if remote is given
+        """
+        if remote is None:
+            return sorted(self.channel_db)
+        return sorted(
+            channel
+            for channel, db_entry in self.channel_db.items()
+            if bool(db_entry.get("remote", False)) == remote
+        )
+
+    def channel_name(self, prefix):
+        """
+        The PV name of a prefix, as given to cas_host
+        """
+        if isinstance(prefix, (list, tuple)):
+            return self.prefix2channel(prefix)
+        return prefix
 
     def prefix2channel(self, prefix):
         raise NotImplementedError()
 
+    def batch(self):
+        """
+        Context deferring the relay callbacks, and so the CA publishing, until it exits, see
+        relay_values.batch. For devices assigning several relays at once, such as readbacks.
+
+        with self.root.batch():
+            ...
+        """
+        return relay_values.batch()
+
     def cas_host(
         self,
         rv,
@@ -76,15 +116,18 @@ class CASCollector(declarative.OverridableObject):
         hihi=None,
         adel=None,
         mdel=None,
+        # limit on the rate of monitor events, changes in between are posted once it allows
+        publish_max_hz=None,
         EDCU=None,
         burt=None,
         burtRO=None,
         urgentsave_s=None,
         deferred=False,
         remote=False,
+        # queue client writes for the reactor instead of taking its lock, None for the server setting
+        write_handoff=None,
         # **kwargs
     ):
-        # TODO, need some way to check that multiple PV's of the same name are not registered
         if conf_name is None:
             conf_name = name
 
@@ -114,6 +157,14 @@ class CASCollector(declarative.OverridableObject):
                     self.rv_names.get(rv), prefix
                 )
             )
+        channel = self.channel_name(prefix)
+        rv_hosted = self.channel_rvs.get(channel, None)
+        if rv_hosted is not None:
+            raise RuntimeError(
+                "PV {0} is already hosted, by {1!r}, can't also host {2!r}".format(
+                    channel, rv_hosted, rv
+                )
+            )
         self.rv_names[rv] = prefix
 
         if isinstance(rv, relay_values.CASRelay):
@@ -183,11 +234,13 @@ class CASCollector(declarative.OverridableObject):
             hihi=hihi,
             adel=adel,
             mdel=mdel,
+            publish_max_hz=publish_max_hz,
             burt=burt,
             burtRO=burtRO,
             urgentsave_s=urgentsave_s,
             remote=remote,
             deferred=deferred,
+            write_handoff=write_handoff,
             interaction=interaction,
         )
         for k, v in db_inj.items():
@@ -216,6 +269,8 @@ class CASCollector(declarative.OverridableObject):
             ctree_check("remote", bool)
             ctree_check("deferred", bool)
             ctree_check("interaction", check_interaction)
+            ctree_check("publish_max_hz", float)
+            ctree_check("write_handoff", bool)
 
             if dtype in ["float", "int"]:
                 if db.get("count", None) is None:
@@ -228,6 +283,8 @@ class CASCollector(declarative.OverridableObject):
                     ctree_check("high", float)
                     ctree_check("lolo", float)
                     ctree_check("hihi", float)
+                    ctree_check("mdel", float)
+                    ctree_check("adel", float)
                     ctree_check("burt", bool)
                     ctree_check("burtRO", bool)
                 else:
@@ -269,5 +326,8 @@ class CASCollector(declarative.OverridableObject):
             db["enums"]
         else:
             raise RuntimeError("Type Not Recognized")
+        db["rv"] = rv
         self.rv_db[rv] = db
+        self.channel_rvs[channel] = rv
+        self.channel_db[channel] = db
         return
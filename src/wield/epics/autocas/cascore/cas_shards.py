@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Hosting of the PVs across several worker processes, each running its own pcaspy server, so that
+serving the clients is not limited to the one core of the reactor process. See ShardedCAServer.
+"""
+
+import os
+import functools
+import threading
+import multiprocessing
+
+from . import relay_values
+from . import pcaspy_backend
+
+# each CASUser subtree, up to shard_depth below the subsystem, is kept within one shard
+SHARD_BY_SUBTREE = "subtree"
+# channels are balanced across the shards individually
+SHARD_BY_CHANNEL = "channel"
+
+
+def shard_partition(keys, N):
+    """
+    Partition the channels into N shards, given a mapping of channel to its shard key. Channels
+    with equal keys are kept together, and the groups are assigned largest first to the least
+    loaded shard, so that the partition is balanced and the same for the same db.
+
+    Returns a list of N lists of channels.
+    """
+    groups = dict()
+    for channel, key in keys.items():
+        groups.setdefault(str(key), []).append(channel)
+
+    shards = [[] for idx in range(N)]
+    for key, channels in sorted(groups.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+        idx_min = min(range(N), key=lambda idx: (len(shards[idx]), idx))
+        shards[idx_min].extend(sorted(channels))
+    return shards
+
+
+def shard_main(conn, db_cas_raw, writable, process_s=0.002, port=None):
+    """
+    Entry of the shard worker processes. Hosts db_cas_raw in a pcaspy server, handling the
+    messages of the ShardedCAServer between calls into the server, so that pcaspy is only used
+    from this one thread.
+    """
+    if port is not None:
+        # read by the server as it is created
+        os.environ["EPICS_CAS_SERVER_PORT"] = str(port)
+    import pcaspy
+
+    class ShardDriver(pcaspy.Driver):
+        def write(self, channel, value):
+            if channel not in writable:
+                return False
+            # the reactor process completes the write, see ShardedCAServer._write_apply
+            conn.send(("write", channel, value))
+            return True
+
+    server = pcaspy.SimpleServer()
+    server.createPV("", db_cas_raw)
+    driver = ShardDriver()
+    for channel, db_entry in db_cas_raw.items():
+        driver.setParam(channel, db_entry["value"])
+        dtemp = dict(db_entry)
+        # If "type" is included in setParamInfo, it crashes pcaspy
+        dtemp.pop("type", None)
+        driver.setParamInfo(channel, dtemp)
+    driver.updatePVs()
+    conn.send(("ready",))
+
+    while True:
+        server.process(process_s)
+        while conn.poll():
+            try:
+                msg = conn.recv()
+            except EOFError:
+                return
+            if msg[0] == "flush":
+                values, done = msg[1:]
+                for channel, value in values:
+                    driver.setParam(channel, value)
+                for channel, success in done:
+                    if not success:
+                        driver.setParamStatus(
+                            channel,
+                            pcaspy.Alarm.WRITE_ALARM,
+                            pcaspy.Severity.INVALID_ALARM,
+                        )
+                driver.updatePVs()
+                for channel, success in done:
+                    driver.callbackPV(channel)
+            elif msg[0] == "info":
+                channel, info = msg[1:]
+                driver.setParamInfo(channel, info)
+                driver.updatePV(channel)
+            elif msg[0] == "stop":
+                return
+
+
+class ShardedCAServer(object):
+    """
+    Hosts the non-remote PVs of the db across len(shards) worker processes, each with its own CA
+    server. The RelayValues stay in this process with the reactor, and their changes are sent to
+    the owning shard over a pipe, collected into one message per shard per reactor pass.
+
+    Client writes are sent back to this process and applied by the reactor with the same checks
+    as CADriverServer.write. Every writable channel is asyn, so that put-callback clients complete
+    once the value is applied. Since the write is accepted before the checks, rejected writes
+    instead complete with a write alarm, as pcaspy sets for rejected synchronous writes.
+
+    The shards post every value change, as pcaspy does. The publish_max_hz rate limits of
+    CADriverServer are not applied.
+
+    Servers sharing a UDP port on one host are not all reached by unicast searches, such as from
+    clients listing the host in EPICS_CA_ADDR_LIST. For those, give each shard its own port and
+    list every host:port.
+    """
+
+    def __init__(
+        self,
+        db,
+        reactor,
+        shards,
+        saver=None,
+        publish_max_latency_s=None,
+        process_s=0.002,
+        ports=None,
+    ):
+        """
+        shards is a list of the lists of channels hosted by each worker, see shard_partition.
+        process_s is the longest that the workers wait in the server before handling updates.
+        ports optionally sets the CA server port of each worker, otherwise the usual one.
+        """
+        self.db = db
+        self.reactor = reactor
+        self.saver = saver
+        self.publish_max_latency_s = publish_max_latency_s
+        self.process_s = process_s
+        if ports is not None and len(ports) != len(shards):
+            raise RuntimeError("Must give a port for every shard")
+        self.ports = ports
+
+        self.shards = []
+        # index of the shard hosting each channel
+        self._shard_of = dict()
+        for shard in shards:
+            shard = [channel for channel in shard if not self.db[channel]["remote"]]
+            for channel in shard:
+                if channel in self._shard_of:
+                    raise RuntimeError(
+                        "Channel {0} assigned to multiple shards".format(channel)
+                    )
+                self._shard_of[channel] = len(self.shards)
+            self.shards.append(shard)
+        for channel, db_entry in self.db.items():
+            if not db_entry["remote"] and channel not in self._shard_of:
+                raise RuntimeError("Channel {0} not assigned to a shard".format(channel))
+
+        # channels changed since the last flush, and the writes to complete, for each shard
+        self._forward_dirty = [dict() for shard in self.shards]
+        self._forward_done = [[] for shard in self.shards]
+        self._forward_lock = threading.Lock()
+        self._forward_queued = False
+
+        self._writers = dict()
+        for channel in self._shard_of:
+            db_entry = self.db[channel]
+            db_entry["rv"].register(
+                callback=self._forward_cb_generator(channel),
+                key=self,
+            )
+            for elem in pcaspy_backend.DB_INFO_ELEMS:
+                elem_val = db_entry.get(elem, None)
+                if isinstance(elem_val, relay_values.RelayValueDecl):
+                    elem_val.register(callback=self._info_cb_generator(channel, elem))
+            self._writers[channel] = self._writer_generate(channel)
+
+        self.processes = []
+        self._conns = []
+        self._conn_locks = []
+        self._receivers = []
+
+        if self.saver is not None:
+            self.saver.set_db_driver(self.db, self)
+            self.saver.folders_make_ready()
+            self.saver.load_snap()
+        return
+
+    def _writer_generate(self, channel):
+        db = self.db[channel]
+        if db["interaction"] == "report":
+            return None
+
+        if db["type"] == "enum":
+            enum_N = len(db["enums"])
+        else:
+            enum_N = None
+
+        saver = None
+        urgentsave_s = None
+        if self.saver is not None:
+            urgentsave_s = db.get("urgentsave_s", None)
+            if urgentsave_s is not None and urgentsave_s >= 0:
+                saver = self.saver
+
+        def set_param(value):
+            self._forward_mark(channel)
+
+        # without the lock, as writes are applied by the reactor itself
+        return pcaspy_backend.ChannelWriter(
+            channel=channel,
+            rv=db["rv"],
+            key=self,
+            lock=None,
+            enum_N=enum_N,
+            saver=saver,
+            urgentsave_s=urgentsave_s,
+            set_param=set_param,
+        )
+
+    def _forward_cb_generator(self, channel):
+        def forward_cb(value):
+            self._forward_mark(channel)
+
+        return forward_cb
+
+    def _info_cb_generator(self, channel, elem):
+        def info_cb(value):
+            self._send(self._shard_of[channel], ("info", channel, {elem: value}))
+
+        return info_cb
+
+    def _forward_mark(self, channel, done=None):
+        """
+        Add the channel to the dirty set of its shard, and the write completion if done is not
+        None, queueing the flush unless one already is. Callable from any thread.
+        """
+        shard_idx = self._shard_of[channel]
+        with self._forward_lock:
+            self._forward_dirty[shard_idx][channel] = True
+            if done is not None:
+                self._forward_done[shard_idx].append((channel, done))
+            if self._forward_queued:
+                return
+            self._forward_queued = True
+        if self.publish_max_latency_s is None:
+            self.reactor.send_task(self._forward_flush)
+        else:
+            self.reactor.send_task(
+                self._forward_flush,
+                run_at=self.reactor.time() + self.publish_max_latency_s,
+            )
+        return
+
+    def _forward_flush(self):
+        """
+        Send the values of the changed channels, and then the write completions, to each shard
+        """
+        with self._forward_lock:
+            dirty = self._forward_dirty
+            done = self._forward_done
+            self._forward_dirty = [dict() for shard in self.shards]
+            self._forward_done = [[] for shard in self.shards]
+            self._forward_queued = False
+        for shard_idx, channels in enumerate(dirty):
+            if not channels and not done[shard_idx]:
+                continue
+            values = [(channel, self.db[channel]["rv"].value) for channel in channels]
+            self._send(shard_idx, ("flush", values, done[shard_idx]))
+        return
+
+    def _send(self, shard_idx, msg):
+        # nothing to send to before start, the shards are created with the current values
+        if not self._conns:
+            return
+        with self._conn_locks[shard_idx]:
+            self._conns[shard_idx].send(msg)
+
+    def _write_apply(self, channel, value):
+        writer = self._writers[channel]
+        if writer is None:
+            success = False
+        else:
+            success = writer.write(value)
+        # always post the value, as the shard has the rejected one
+        self._forward_mark(channel, done=success)
+        return
+
+    def _receive(self, conn, ready):
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                return
+            if msg[0] == "write":
+                channel, value = msg[1:]
+                self.reactor.send_task(functools.partial(self._write_apply, channel, value))
+            elif msg[0] == "ready":
+                ready.set()
+
+    def _db_cas_raw(self, shard):
+        db_cas_raw = dict()
+        for channel in shard:
+            db_entry = self.db[channel]
+            entry_use = dict()
+            for elem in pcaspy_backend.DB_INFO_ELEMS:
+                if elem in db_entry:
+                    elem_val = db_entry[elem]
+                    if isinstance(elem_val, relay_values.RelayValueDecl):
+                        elem_val = elem_val.value
+                    entry_use[elem] = elem_val
+            for elem in pcaspy_backend.DB_STATIC_ELEMS:
+                if elem in db_entry:
+                    entry_use[elem] = db_entry[elem]
+            # the current value, rather than the one at registration
+            entry_use["value"] = db_entry["rv"].value
+            if self._writers[channel] is not None:
+                entry_use.setdefault("asyn", True)
+            db_cas_raw[channel] = entry_use
+        return db_cas_raw
+
+    def start(self, timeout_s=60):
+        """
+        Start the shard workers, returning once all of them are serving
+        """
+        # spawned, since forking copies the threads and CA contexts of this process
+        ctx = multiprocessing.get_context("spawn")
+        readies = []
+        for shard_idx, shard in enumerate(self.shards):
+            conn, conn_child = ctx.Pipe()
+            writable = set(channel for channel in shard if self._writers[channel] is not None)
+            if self.ports is not None:
+                port = self.ports[shard_idx]
+            else:
+                port = None
+            process = ctx.Process(
+                target=shard_main,
+                args=(conn_child, self._db_cas_raw(shard), writable, self.process_s, port),
+                daemon=True,
+            )
+            process.start()
+            conn_child.close()
+            ready = threading.Event()
+            receiver = threading.Thread(target=self._receive, args=(conn, ready), daemon=True)
+            receiver.start()
+            readies.append(ready)
+            self.processes.append(process)
+            self._conns.append(conn)
+            self._conn_locks.append(threading.Lock())
+            self._receivers.append(receiver)
+        for shard_idx, ready in enumerate(readies):
+            if not ready.wait(timeout_s):
+                self.stop()
+                raise RuntimeError("CAS shard {0} failed to start".format(shard_idx))
+        return
+
+    def stop(self, timeout_s=5):
+        for shard_idx, process in enumerate(self.processes):
+            try:
+                self._send(shard_idx, ("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout_s)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        # the receivers end once the workers close their side
+        for receiver in self._receivers:
+            receiver.join()
+        for conn in self._conns:
+            conn.close()
+        self.processes = []
+        self._conns = []
+        self._conn_locks = []
+        self._receivers = []
+        return
+
+    def __enter__(self):
+        self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def read(self, channel):
+        return self.db[channel]["rv"].value
+
+    def write_sync_typecast(self, channel, value):
+        """
+        Write from the reactor, such as by burt/autosave, typecasting the value as
+        CADriverServer.write_sync_typecast does
+        """
+        writer = self._writers[channel]
+        if writer is None:
+            return False
+        value = pcaspy_backend.value_typecast(self.db[channel], value)
+        return writer.write(value)
@@ -10,17 +10,157 @@
 from wield import declarative
 
 from . import reactor
+from . import lanes
 from . import pcaspy_backend
+from . import cas_shards
 from . import pyepics_backend
 from . import base_backend
 from . import cas9declarative
 from . import ctree
 
 
+def reactor_type_validator(val):
+    assert val in ["threaded", "asyncio"]
+    return val
+
+
+def publish_mode_validator(val):
+    assert val in [pcaspy_backend.PUBLISH_BATCHED, pcaspy_backend.PUBLISH_IMMEDIATE]
+    return val
+
+
+def shard_by_validator(val):
+    assert val in [cas_shards.SHARD_BY_SUBTREE, cas_shards.SHARD_BY_CHANNEL]
+    return val
+
+
 class InstaCAS(base_backend.CASCollector, declarative.OverridableObject):
+    @cas9declarative.dproperty_ctree(default="threaded", validator=reactor_type_validator)
+    def reactor_type(self, val):
+        """
+        Event loop implementation of the reactor, one of [threaded, asyncio]. The asyncio reactor
+        allows running alongside other asyncio code, see InstaCAS.run_async.
+        """
+        return val
+
+    @cas9declarative.dproperty_ctree(default=lanes.LANE_SHARES_DEFAULT[lanes.LANE_CONTROL])
+    def reactor_share_control(self, val):
+        """
+        Share of the reactor for the control lane, writes and commands
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cas9declarative.dproperty_ctree(default=lanes.LANE_SHARES_DEFAULT[lanes.LANE_IO])
+    def reactor_share_io(self, val):
+        """
+        Share of the reactor for the io lane, device block-chains and connections
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cas9declarative.dproperty_ctree(default=lanes.LANE_SHARES_DEFAULT[lanes.LANE_MONITOR])
+    def reactor_share_monitor(self, val):
+        """
+        Share of the reactor for the monitor lane, updates from remote PVs
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cas9declarative.dproperty_ctree(default=lanes.LANE_SHARES_DEFAULT[lanes.LANE_HOUSEKEEPING])
+    def reactor_share_housekeeping(self, val):
+        """
+        Share of the reactor for the housekeeping lane, autosave and status
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cas9declarative.dproperty_ctree(
+        default=pcaspy_backend.PUBLISH_IMMEDIATE, validator=publish_mode_validator
+    )
+    def publish_mode(self, val):
+        """
+        How changes of hosted PVs are posted to CA clients, one of [immediate, batched]. Batched
+        collects the changed PVs and posts them together once per reactor pass, which is much
+        cheaper when hosting thousands of PVs.
+        """
+        return val
+
+    @cas9declarative.dproperty_ctree(default=None)
+    def publish_max_latency_s(self, val):
+        """
+        In the batched publish_mode, delay posting changes by up to this long to collect more
+        of them into each post. None posts at the next reactor pass.
+        """
+        if val is not None:
+            val = float(val)
+            assert val >= 0
+        return val
+
+    @cas9declarative.dproperty_ctree(default=False)
+    def write_handoff(self, val):
+        """
+        Queue client writes of hosted PVs for the reactor rather than waiting on its lock in the
+        CA server thread, so that puts return promptly while the reactor is busy
+        """
+        return bool(val)
+
+    @cas9declarative.dproperty_ctree(default=0)
+    def shards(self, val):
+        """
+        Number of worker processes to host the PVs across, each with its own CA server. 0 hosts
+        them all in this process. See ShardedCAServer.
+        """
+        val = int(val)
+        assert val >= 0
+        return val
+
+    @cas9declarative.dproperty_ctree(
+        default=cas_shards.SHARD_BY_SUBTREE, validator=shard_by_validator
+    )
+    def shard_by(self, val):
+        """
+        How PVs are partitioned across the shards, one of [subtree, channel]. Subtree keeps
+        the PVs of each CASUser subtree, shard_depth below the subsystem, in one shard.
+        """
+        return val
+
+    @cas9declarative.dproperty_ctree(default=1)
+    def shard_depth(self, val):
+        """
+        Depth of the CASUser subtrees kept together by shard_by=subtree
+        """
+        val = int(val)
+        assert val >= 0
+        return val
+
+    @cas9declarative.dproperty_ctree(default=None)
+    def shard_port_base(self, val):
+        """
+        If set, shard i serves CA on port shard_port_base + i, so that clients may reach every
+        shard by unicast. Otherwise they share the usual CA port.
+        """
+        if val is not None:
+            val = int(val)
+        return val
+
     @cas9declarative.dproperty
     def reactor(self):
-        return reactor.Reactor()
+        lane_shares = {
+            lanes.LANE_CONTROL: self.reactor_share_control,
+            lanes.LANE_IO: self.reactor_share_io,
+            lanes.LANE_MONITOR: self.reactor_share_monitor,
+            lanes.LANE_HOUSEKEEPING: self.reactor_share_housekeeping,
+        }
+        if self.reactor_type == "asyncio":
+            from . import asyncio_reactor
+
+            return asyncio_reactor.AsyncioReactor(lane_shares=lane_shares)
+        return reactor.Reactor(lane_shares=lane_shares)
 
     @cas9declarative.dproperty
     def autosave(self):
@@ -85,19 +225,56 @@ class InstaCAS(base_backend.CASCollector, declarative.OverridableObject):
         chn = chn.upper()
         return chn
 
+    def cas_shard_keys(self, db):
+        """
+        The shard key of each hosted channel in db, see cas_shards.shard_partition
+        """
+        keys = dict()
+        for channel, db_entry in db.items():
+            if db_entry["remote"]:
+                continue
+            prefix = self.rv_names.get(db_entry["rv"], None)
+            if self.shard_by == cas_shards.SHARD_BY_SUBTREE and isinstance(
+                prefix, (list, tuple)
+            ):
+                keys[channel] = tuple(prefix[: 1 + self.shard_depth])
+            else:
+                keys[channel] = channel
+        return keys
+
     def start(self):
         if self._db_generated is None:
             self._db_generated = self.cas_db_generate()
-            self._cas_generated = pcaspy_backend.CADriverServer(
-                self._db_generated,
-                self.reactor,
-                saver=self.autosave,
-            )
+            if self.shards > 0:
+                ports = None
+                if self.shard_port_base is not None:
+                    ports = [self.shard_port_base + idx for idx in range(self.shards)]
+                self._cas_generated = cas_shards.ShardedCAServer(
+                    self._db_generated,
+                    self.reactor,
+                    shards=cas_shards.shard_partition(
+                        self.cas_shard_keys(self._db_generated), self.shards
+                    ),
+                    saver=self.autosave,
+                    publish_max_latency_s=self.publish_max_latency_s,
+                    ports=ports,
+                )
+            else:
+                self._cas_generated = pcaspy_backend.CADriverServer(
+                    self._db_generated,
+                    self.reactor,
+                    saver=self.autosave,
+                    publish_mode=self.publish_mode,
+                    publish_max_latency_s=self.publish_max_latency_s,
+                    write_handoff=self.write_handoff,
+                )
             self._cas_remote = pyepics_backend.CAEpicsClient(
                 self._db_generated,
                 self.reactor,
                 saver=self.autosave,
             )
+            if self.status is not None:
+                self.status.cas_attach(self._db_generated, self._cas_remote)
             self._cas_generated.start()
             self._cas_remote.start()
             return True
@@ -124,12 +301,24 @@ class InstaCAS(base_backend.CASCollector, declarative.OverridableObject):
             )
         return
 
+    async def run_async(self):
+        """
+        Run within an already running asyncio event loop. Requires the asyncio reactor_type.
+        """
+        self.start()
+        try:
+            await self.reactor.run_async()
+        finally:
+            self.stop()
+
     def stop(self):
         if self._db_generated is not None:
             self._cas_generated.stop()
             self._cas_remote.stop()
             self._db_generated = None
             self._cas_generated = None
+        # the bus threads of the serial connections
+        self.reactor.bus_workers_stop()
 
     @cas9declarative.dproperty
     def config_files(self, val=None):
@@ -218,11 +407,19 @@ class CASUser(declarative.OverridableObject):
     def reactor(self):
         return self.root.reactor
 
+    def batch(self):
+        return self.root.batch()
+
     @cas9declarative.mproperty
     def ctree(self):
         return self.parent.ctree[self.name]
 
+    @cas9declarative.mproperty
+    def _ctree_PVs(self):
+        # every hosted PV adds a key here, so the subtree is looked up (and its keys checked) only once
+        return self.ctree["PVs"]
+
     def cas_host(self, rv, name=None, **kwargs):
         return self.root.cas_host(
-            rv=rv, name=name, self_prefix=self.prefix, ctree=self.ctree["PVs"], **kwargs
+            rv=rv, name=name, self_prefix=self.prefix, ctree=self._ctree_PVs, **kwargs
         )
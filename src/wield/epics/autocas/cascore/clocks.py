@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Clocks used by the :class:`~.reactor.Reactor` to timestamp and sleep until its deadlines.
+
+A clock provides time() and wait(condition, deadline). wait is called with the
+condition held and must return when the condition is notified or when the clock
+reaches the deadline. A deadline of None waits only for a notification.
+"""
+import time
+
+
+class RealTimeClock(object):
+    """
+    Monotonic clock offset to agree with the wall time when it is created. It never jumps
+    with system time adjustments, but modulo scheduling still lines up with the wall clock.
+    """
+
+    def __init__(self):
+        self._offset = time.time() - time.monotonic()
+
+    def time(self):
+        return time.monotonic() + self._offset
+
+    def wait(self, condition, deadline):
+        if deadline is None:
+            condition.wait()
+            return
+        timeout_s = deadline - self.time()
+        if timeout_s > 0:
+            condition.wait(timeout_s)
+        return
+
+
+class VirtualClock(object):
+    """
+    Simulated clock for tests and simulations. Waiting on a deadline jumps the clock
+    straight to that deadline, so a reactor flushes hours of scheduled tasks without sleeping.
+
+    Waiting without a deadline still blocks for real, since only another thread can provide
+    the next task.
+    """
+
+    def __init__(self, start=None):
+        if start is None:
+            start = time.time()
+        self._now = start
+
+    def time(self):
+        return self._now
+
+    def advance(self, dt_s):
+        """
+        Move the clock forward by dt_s
+        """
+        self.advance_to(self._now + dt_s)
+
+    def advance_to(self, mtime):
+        """
+        Move the clock forward to mtime. Never moves the clock backward.
+        """
+        if mtime > self._now:
+            self._now = mtime
+
+    def wait(self, condition, deadline):
+        if deadline is None:
+            condition.wait()
+            return
+        self.advance_to(deadline)
+        return
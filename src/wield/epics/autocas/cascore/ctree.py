@@ -14,6 +14,9 @@ from wield.bunch.deep_bunch import DeepBunchSingleAssign, DeepBunch
 
 CTreeKey = namedtuple('CTreeKey', ['namespace', 'name'])
 
+#marks a missing key, a KeyError from a DeepBunch formats the whole tree
+_NOTSET = ('NOTSET',)
+
 class ConfigTree(object):
     """
     This object is an access wrapper for configuration tree needs. Values can only be gathered using specific methods, rather than the typical
@@ -97,10 +100,9 @@ class ConfigTree(object):
                 ' it is storing a subtree rather than a single value'
             ).format(key))
 
-        try:
-            return cdict.get(self.VALUE_KEY)
-        except KeyError:
-            pass
+        value = cdict.get(self.VALUE_KEY, _NOTSET)
+        if value is not _NOTSET:
+            return value
 
         #normalize the classification if it is a single string
         if isinstance(classification, str):
@@ -128,9 +130,8 @@ class ConfigTree(object):
                 ).format(key, default, ctdefault))
 
         #now check if it is already configured
-        try:
-            config = cdict.get(self.CONFIG_KEY)
-        except KeyError:
+        config = cdict.get(self.CONFIG_KEY, _NOTSET)
+        if config is _NOTSET:
             #no configuration, so use default
             config = default
 
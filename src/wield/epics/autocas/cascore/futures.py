@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Futures for results of reactor tasks, see :meth:`~.reactor.Reactor.send_task_future`.
+"""
+import threading
+
+_PENDING = "PENDING"
+_RUNNING = "RUNNING"
+_CANCELLED = "CANCELLED"
+_FINISHED = "FINISHED"
+
+
+class FutureCancelled(RuntimeError):
+    pass
+
+
+class ReactorFuture(object):
+    """
+    Result of a task run by the reactor, carrying its return value or exception. Threads
+    waiting on result() sleep until the task finishes, rather than polling.
+
+    Callbacks added with add_done_callback (and so chained with then) run in the thread that
+    completes the future, which for reactor tasks is the reactor with the task_lock held.
+    """
+
+    def __init__(self):
+        self._cv = threading.Condition(threading.Lock())
+        self._state = _PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._state in (_FINISHED, _CANCELLED)
+
+    def cancelled(self):
+        return self._state == _CANCELLED
+
+    def running(self):
+        return self._state == _RUNNING
+
+    def cancel(self):
+        """
+        Cancel the task if it has not yet started. Returns True if the future is cancelled.
+        """
+        with self._cv:
+            if self._state == _CANCELLED:
+                return True
+            if self._state != _PENDING:
+                return False
+            self._state = _CANCELLED
+            self._cv.notify_all()
+        self._run_callbacks()
+        return True
+
+    def set_running(self):
+        """
+        Mark the task as started. Returns False if it was cancelled and so should not run.
+        """
+        with self._cv:
+            if self._state == _CANCELLED:
+                return False
+            if self._state != _PENDING:
+                raise RuntimeError("Future already started")
+            self._state = _RUNNING
+        return True
+
+    def set_result(self, result):
+        with self._cv:
+            if self.done():
+                raise RuntimeError("Future already completed")
+            self._result = result
+            self._state = _FINISHED
+            self._cv.notify_all()
+        self._run_callbacks()
+
+    def set_exception(self, exception):
+        with self._cv:
+            if self.done():
+                raise RuntimeError("Future already completed")
+            self._exception = exception
+            self._state = _FINISHED
+            self._cv.notify_all()
+        self._run_callbacks()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the future is done. Returns False if the timeout expired first.
+        """
+        with self._cv:
+            if not self.done():
+                self._cv.wait_for(self.done, timeout)
+            return self.done()
+
+    def result(self, timeout=None):
+        """
+        The return value of the task, waiting up to timeout seconds for it. Raises the exception
+        of the task if it failed.
+
+        :raises: :exc:`TimeoutError` if the timeout expires
+        :raises: :exc:`FutureCancelled` if the task was cancelled
+        """
+        if not self.wait(timeout):
+            raise TimeoutError("Reactor task did not complete in {0}s".format(timeout))
+        if self._state == _CANCELLED:
+            raise FutureCancelled()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        The exception raised by the task, or None, waiting up to timeout seconds for it.
+        """
+        if not self.wait(timeout):
+            raise TimeoutError("Reactor task did not complete in {0}s".format(timeout))
+        if self._state == _CANCELLED:
+            raise FutureCancelled()
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(future) once it is done, immediately if it already is.
+        """
+        with self._cv:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _run_callbacks(self):
+        with self._cv:
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def then(self, func):
+        """
+        Returns a new future for func(result) run once this one completes. Exceptions and
+        cancellation are passed through without calling func. If func returns a future, the new
+        future completes with it.
+        """
+        future = ReactorFuture()
+
+        def chain(prev):
+            if prev.cancelled():
+                future.cancel()
+                return
+            if prev._exception is not None:
+                future.set_exception(prev._exception)
+                return
+            future.set_running()
+            try:
+                ret = func(prev._result)
+            except Exception as E:
+                future.set_exception(E)
+                return
+            if isinstance(ret, ReactorFuture):
+                ret.add_done_callback(future._resolve_from)
+            else:
+                future.set_result(ret)
+
+        self.add_done_callback(chain)
+        return future
+
+    def _resolve_from(self, other):
+        if other.cancelled():
+            # already running, so record the cancellation as an exception
+            self.set_exception(FutureCancelled())
+        elif other._exception is not None:
+            self.set_exception(other._exception)
+        else:
+            self.set_result(other._result)
+
+
+def gather(futures):
+    """
+    Returns a future for the list of results of futures, so that a batch of tasks may be waited
+    on once. It fails with the first exception among them.
+    """
+    futures = list(futures)
+    future = ReactorFuture()
+    future.set_running()
+    if not futures:
+        future.set_result([])
+        return future
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def collect(prev):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if future.done():
+            return
+        if prev.cancelled():
+            exception = FutureCancelled()
+        else:
+            exception = prev._exception
+        if exception is not None:
+            with lock:
+                if future.done():
+                    return
+                future.set_exception(exception)
+            return
+        if last:
+            with lock:
+                if future.done():
+                    return
+                future.set_result([fut._result for fut in futures])
+
+    for fut in futures:
+        fut.add_done_callback(collect)
+    return future
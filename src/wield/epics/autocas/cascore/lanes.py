@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Priority lanes for the ready tasks of the :class:`~.reactor.Reactor`.
+"""
+import collections
+
+LANE_CONTROL = "control"
+LANE_IO = "io"
+LANE_MONITOR = "monitor"
+LANE_HOUSEKEEPING = "housekeeping"
+
+# default lane for tasks that do not specify one
+LANE_DEFAULT = LANE_CONTROL
+
+LANE_SHARES_DEFAULT = collections.OrderedDict(
+    [
+        # writes and commands from the CA server and users
+        (LANE_CONTROL, 8),
+        # device block-chains and connection handling
+        (LANE_IO, 4),
+        # fan-in of the remote PV monitor callbacks
+        (LANE_MONITOR, 2),
+        # autosave, status and other periodic bookkeeping
+        (LANE_HOUSEKEEPING, 1),
+    ]
+)
+
+
+class _Lane(object):
+    __slots__ = ("name", "share", "stride", "vpass", "queue")
+
+    def __init__(self, name, share):
+        if share <= 0:
+            raise RuntimeError("Lane {0} must have a positive share".format(name))
+        self.name = name
+        self.share = share
+        self.stride = 1 / share
+        self.vpass = 0
+        self.queue = collections.deque()
+
+
+class LaneScheduler(object):
+    """
+    Ready queues of tasks, one FIFO per lane. Lanes are chosen by stride scheduling, so that
+    while several lanes are busy each gets a number of task runs in proportion to its share,
+    and no busy lane is ever starved outright. An idle lane does not bank credit for later bursts.
+
+    Entries are (task, mtime_ready) pairs. This implementation is **not** threadsafe.
+    """
+
+    def __init__(self, shares=None):
+        if shares is None:
+            shares = LANE_SHARES_DEFAULT
+        self.lanes = collections.OrderedDict(
+            (name, _Lane(name, share)) for name, share in shares.items()
+        )
+        self._lane_list = list(self.lanes.values())
+        self._vtime = 0
+        self._N = 0
+
+    def __len__(self):
+        return self._N
+
+    def __bool__(self):
+        return self._N > 0
+
+    def __nonzero__(self):
+        return self._N > 0
+
+    def lane(self, name):
+        if name is None:
+            name = LANE_DEFAULT
+        try:
+            return self.lanes[name]
+        except KeyError:
+            raise RuntimeError(
+                "Unknown reactor lane {0}, must be one of {1}".format(name, list(self.lanes))
+            )
+
+    def push(self, lane, entry):
+        """
+        Append the entry to the lane (as returned by the lane method)
+        """
+        if not lane.queue and lane.vpass < self._vtime:
+            lane.vpass = self._vtime
+        lane.queue.append(entry)
+        self._N += 1
+
+    def pop(self):
+        """
+        Returns the next (entry, lane) or None if there are no ready tasks
+        """
+        if not self._N:
+            return None
+        best = None
+        for lane in self._lane_list:
+            if lane.queue and (best is None or lane.vpass < best.vpass):
+                best = lane
+        self._vtime = best.vpass
+        best.vpass += best.stride
+        self._N -= 1
+        return best.queue.popleft(), best
+
+    def depths(self):
+        """
+        dict of the number of ready tasks in each lane
+        """
+        return {name: len(lane.queue) for name, lane in self.lanes.items()}
+
+    def oldest(self):
+        """
+        dict of the mtime_ready of the oldest task in each lane, None for empty lanes
+        """
+        ret = dict()
+        for name, lane in self.lanes.items():
+            if lane.queue:
+                ret[name] = lane.queue[0][1]
+            else:
+                ret[name] = None
+        return ret
@@ -8,27 +8,460 @@
 """
 """
 
+import threading
+import collections
 import numpy as np
 import pcaspy
 import pcaspy.tools
+from pcaspy import cas
 
 from . import relay_values
 from ..utilities.pprint import pprint
 
+# every changed channel is posted by its own updatePV call, right away
+PUBLISH_IMMEDIATE = "immediate"
+# changed channels collect in a dirty set, posted together once per reactor pass
+PUBLISH_BATCHED = "batched"
+
+# pcaspy fields of the db entries, which may be given as RelayValues to change live
+DB_INFO_ELEMS = [
+    "count",  # 1 	Number of elements
+    "enums",  # [] 	String representations of the enumerate states
+    "states",  # [] 	Severity values of the enumerate states.
+    "prec",  # 0 	Data precision
+    "unit",  # '' 	Physical meaning of data
+    "lolim",  # 0 	Data low limit for graphics display
+    "hilim",  # 0 	Data high limit for graphics display
+    "low",  # 0 	Data low limit for alarm
+    "high",  # 0 	Data high limit for alarm
+    "lolo",  # 0 	Data low low limit for alarm
+    "hihi",  # 0 	Data high high limit for alarm
+    "adel",  # 0 	Archive deadband
+    "mdel",  # 0 	Monitor,                    value change deadband
+]
+
+# pcaspy fields of the db entries, fixed once the server is created
+DB_STATIC_ELEMS = [
+    "type",  # 'float' PV data type. enum, string, char, float or int
+    "scan",  # 0 	Scan period in second. 0 means passive
+    "asyn",  # False 	Process finishes asynchronously if True
+    "asg",  # '' 	Access security group name
+    "value",  # 0 or '' 	Data initial value
+]
+
+
+def value_typecast(db_entry, value):
+    """
+    Cast the value to the type of the channel, so that values may be given as strings, as from
+    a burt snapshot
+    """
+    rv = db_entry["rv"]
+    ctype = db_entry["type"]
+    if isinstance(rv, relay_values.RelayWaveform):
+        # the relay casts directly into its buffer
+        pass
+    elif ctype == "float":
+        ccount = db_entry.get("count", 1)
+        if ccount == 1:
+            value = float(value)
+        else:
+            value = np.asarray(value, dtype=float)
+    elif ctype == "int":
+        ccount = db_entry.get("count", 1)
+        if ccount == 1:
+            try:
+                value = int(value)
+            except ValueError:
+                value = float(value)
+        else:
+            value = np.asarray(value, dtype=int)
+    elif ctype == "enum":
+        try:
+            value = int(value)
+        except ValueError:
+            value = db_entry["enums"].index(value)
+    elif ctype == "string":
+        # should be happy
+        value = str(value)
+    elif ctype == "char":
+        # also should be happy as a str
+        value = str(value)
+    return value
+
+
+def alarm_check(db_entry, value):
+    """
+    The (alarm, severity) that setParam gives the value, from the alarm limits or the enum states
+    of the pcaspy db entry of the channel
+    """
+    ctype = db_entry.get("type", "float")
+    if ctype == "enum":
+        states = db_entry.get("states", None)
+        if not states:
+            states = [pcaspy.Severity.NO_ALARM] * len(db_entry.get("enums", []))
+        if not 0 <= value < len(states):
+            return pcaspy.Alarm.STATE_ALARM, pcaspy.Severity.MAJOR_ALARM
+        if states[value] == pcaspy.Severity.NO_ALARM:
+            return pcaspy.Alarm.NO_ALARM, pcaspy.Severity.NO_ALARM
+        return pcaspy.Alarm.STATE_ALARM, states[value]
+    if ctype not in ["float", "int"]:
+        return pcaspy.Alarm.NO_ALARM, pcaspy.Severity.NO_ALARM
+
+    # as pcaspy, limits only apply when ordered, and arrays alarm on any element
+    values = np.atleast_1d(value)
+    alarm = pcaspy.Alarm.NO_ALARM
+    severity = pcaspy.Severity.NO_ALARM
+    low = db_entry.get("low", 0)
+    high = db_entry.get("high", 0)
+    if low < high:
+        if np.any(values <= low):
+            alarm, severity = pcaspy.Alarm.LOW_ALARM, pcaspy.Severity.MINOR_ALARM
+        elif np.any(values >= high):
+            alarm, severity = pcaspy.Alarm.HIGH_ALARM, pcaspy.Severity.MINOR_ALARM
+    lolo = db_entry.get("lolo", 0)
+    hihi = db_entry.get("hihi", 0)
+    if lolo < hihi:
+        if np.any(values <= lolo):
+            alarm, severity = pcaspy.Alarm.LOLO_ALARM, pcaspy.Severity.MAJOR_ALARM
+        elif np.any(values >= hihi):
+            alarm, severity = pcaspy.Alarm.HIHI_ALARM, pcaspy.Severity.MAJOR_ALARM
+    return alarm, severity
+
+
+class PublishFilter(object):
+    """
+    State of the monitor deadbands and publish rate limit of a channel. The deadbands follow the
+    EPICS MDEL and ADEL fields, and may be given as RelayValues to be changed live. If only one
+    deadband is given, it applies to both, so that it alone gates the events.
+    """
+
+    __slots__ = ("mdel", "adel", "mlst", "alst", "period_s", "mtime_last", "trailing")
+
+    def __init__(self, value, mdel=None, adel=None, max_hz=None):
+        if mdel is None:
+            mdel = adel
+        elif adel is None:
+            adel = mdel
+        self.mdel = mdel
+        self.adel = adel
+        self.mlst = value
+        self.alst = value
+        if max_hz is not None and max_hz > 0:
+            self.period_s = 1 / max_hz
+        else:
+            self.period_s = None
+        self.mtime_last = None
+        # if a publish is waiting on the rate limit
+        self.trailing = False
+
+    def deadband_passes(self, value):
+        """
+        Check if the value is outside either deadband, updating the last values of the
+        deadbands it passes
+        """
+        passes = False
+        mdel = self.mdel
+        if isinstance(mdel, relay_values.RelayValueDecl):
+            mdel = mdel.value
+        if mdel is None or mdel < 0 or abs(value - self.mlst) > mdel:
+            self.mlst = value
+            passes = True
+        adel = self.adel
+        if isinstance(adel, relay_values.RelayValueDecl):
+            adel = adel.value
+        if adel is None or adel < 0 or abs(value - self.alst) > adel:
+            self.alst = value
+            passes = True
+        return passes
+
+
+class ChannelWriter(object):
+    """
+    Handler of client writes to a hosted channel, with the checks and policies of the channel
+    resolved when the server is constructed, see CADriverServer.write
+    """
+
+    __slots__ = (
+        "channel",
+        "rv",
+        "validate",
+        "key",
+        "lock",
+        "enum_N",
+        "saver",
+        "urgentsave_s",
+        "set_param",
+    )
+
+    def __init__(self, channel, rv, key, lock, enum_N, saver, urgentsave_s, set_param):
+        self.channel = channel
+        self.rv = rv
+        # the relay booleans have no validator, and check in their put
+        self.validate = relay_values.relay_validate(rv)
+        self.key = key
+        # None for mt_assign channels
+        self.lock = lock
+        self.enum_N = enum_N
+        # None unless writes trigger an urgent save
+        self.saver = saver
+        self.urgentsave_s = urgentsave_s
+        self.set_param = set_param
+
+    def write(self, value):
+        # reject values that don't correspond to an actual index of
+        # the enum
+        # FIXME: this is apparently a feature? of cas that allows for
+        # setting numeric values higher than the enum?
+        enum_N = self.enum_N
+        if enum_N is not None and (value >= enum_N or value < 0):
+            return False
+
+        if self.saver is not None:
+            self.saver.urgentsave_notify(self.channel, self.urgentsave_s)
+
+        lock = self.lock
+        if lock is None:
+            status, value = self.put(value)
+        else:
+            with lock:
+                status, value = self.put(value)
+        if status == relay_values.VALUE_REJECTED:
+            return False
+        # pcaspy posts the channel after write returns, failing the write if coerced
+        self.set_param(value)
+        return status == relay_values.VALUE_VALID
+
+    def put(self, value):
+        """
+        Validate and put the value into the relay, returning (status, value) as from validate
+        """
+        rv = self.rv
+        if self.validate is None:
+            rv.put_exclude_cb(value, key=self.key)
+            return relay_values.VALUE_VALID, value
+        status, value = self.validate(value)
+        if status != relay_values.VALUE_REJECTED:
+            rv.put_valid_exclude_cb(value, key=self.key)
+        return status, value
+
+
+class ChannelWriterHandoff(ChannelWriter):
+    """
+    Write handler that never takes the task_lock in the CA server thread. The write is checked
+    against the relay validator there, and then queued for the reactor to apply. The channel is
+    asyn, so that put-callback clients complete once the value is applied and posted.
+
+    Writes arriving while one is still queued replace its value. The completions are run by
+    the ServerThread.
+    """
+
+    __slots__ = ("driver", "reactor", "mailbox_lock", "mailbox", "queued")
+
+    def __init__(self, driver, reactor, **kwargs):
+        super(ChannelWriterHandoff, self).__init__(**kwargs)
+        self.driver = driver
+        self.reactor = reactor
+        self.mailbox_lock = threading.Lock()
+        # (value, notify) of the write waiting for the reactor
+        self.mailbox = None
+        self.queued = False
+
+    def write(self, value):
+        enum_N = self.enum_N
+        if enum_N is not None and (value >= enum_N or value < 0):
+            return False
+
+        # the validators are pure checks, so may run outside the reactor. The booleans are only
+        # checked by the reactor
+        retval = True
+        if self.validate is not None:
+            status, value = self.validate(value)
+            if status == relay_values.VALUE_REJECTED:
+                return False
+            # pcaspy ends the asyn write immediately on failure
+            retval = status == relay_values.VALUE_VALID
+
+        with self.mailbox_lock:
+            if retval:
+                # counted here in the server thread, which also runs the completion
+                self.driver.cas_thread.outstanding += 1
+            if self.mailbox is not None and self.mailbox[1]:
+                # the replaced write still needs its completion
+                self.driver.cas_thread.completions.append((None, self.channel))
+            self.mailbox = (value, retval)
+            if self.queued:
+                return retval
+            self.queued = True
+        self.reactor.send_task(self.apply)
+        return retval
+
+    def apply(self):
+        with self.mailbox_lock:
+            value, notify = self.mailbox
+            self.mailbox = None
+            self.queued = False
+
+        if self.saver is not None:
+            self.saver.urgentsave_notify(self.channel, self.urgentsave_s)
+
+        # if rejected, the relay changed since the check, so post the value it kept
+        self.put(value)
+        # posted by the server thread, as posting from here deadlocks against asyn writes
+        self.driver.cas_thread.completions.append((self, notify))
+        return
+
+    def post(self, notify):
+        self.set_param(self.rv.value)
+        self.driver.updatePV(self.channel)
+        if notify:
+            self.driver.callbackPV(self.channel)
+        return
+
+
+class ServerThread(pcaspy.tools.ServerThread):
+    """
+    The pcaspy server loop, also posting and completing the asyn writes applied by the reactor.
+    The server is not threadsafe, and posting or calling callbackPV from the reactor while an
+    asyn write is in progress deadlocks against it, so these are queued here and run between
+    calls into the server. While any are outstanding the loop polls quickly, so that they
+    complete promptly.
+    """
+
+    process_s = 0.1
+    process_pending_s = 0.0005
+
+    def __init__(self, server, driver):
+        super(ServerThread, self).__init__(server)
+        self.driver = driver
+        self.completions = collections.deque()
+        # asyn writes handed to the reactor and not yet completed
+        self.outstanding = 0
+
+    def run(self):
+        while self.running:
+            if self.outstanding > 0:
+                self.server.process(self.process_pending_s)
+            else:
+                self.server.process(self.process_s)
+            self.complete()
+
+    def complete(self):
+        completions = self.completions
+        while completions:
+            writer, notify = completions.popleft()
+            if writer is None:
+                # a replaced write, notify is its channel
+                self.outstanding -= 1
+                self.driver.callbackPV(notify)
+                continue
+            if notify:
+                self.outstanding -= 1
+            writer.post(notify)
+        return
+
 
 class CADriverServer(pcaspy.Driver):
+    def _param_setter(self, channel):
+        """
+        setParam for the channel. RelayWaveform buffers are instead stored without the copy that
+        setParam makes of arrays, since the relay only changes them along with a callback. The
+        stored value is then always the relay buffer, whatever value is given.
+        """
+        rv = self.db[channel]["rv"]
+        if isinstance(rv, relay_values.RelayWaveform):
+
+            def set_param(value):
+                param = self.pvDB[channel]
+                param.value = rv.value
+                param.time = cas.epicsTimeStamp()
+                # arrays always post, and have no alarm limits to check
+                param.mask |= cas.DBE_VALUE | cas.DBE_LOG
+                param.flag = True
+
+            return set_param
+
+        def set_param(value):
+            self.setParam(channel, value)
+
+        return set_param
+
+    def _param_store(self, channel, value):
+        """
+        Keep the value for reads of the channel, with its timestamp and alarm status as setParam
+        sets them, but without a value monitor event. Alarm transitions still post, as for a
+        record.
+        """
+        param = self.pvDB[channel]
+        param.time = cas.epicsTimeStamp()
+        if isinstance(self.db[channel]["rv"], relay_values.RelayWaveform):
+            param.value = self.db[channel]["rv"].value
+            return
+        param.value = value
+        alarm, severity = alarm_check(self.db_cas_raw[channel], value)
+        self.setParamStatus(channel, alarm, severity)
+
+    def _put_cb_filtered(self, channel, pfilter, put_cb):
+        """
+        Wraps put_cb so that values within the deadbands, or above the rate limit, are only stored
+        for reads and not posted to monitors. Values held by the rate limit are posted once it
+        allows, if they pass the deadbands by then.
+        """
+        rv = self.db[channel]["rv"]
+
+        def put_trailing():
+            pfilter.trailing = False
+            put_cb_filtered(rv.value)
+
+        def put_cb_filtered(value):
+            if pfilter.period_s is not None and pfilter.mtime_last is not None:
+                mtime_next = pfilter.mtime_last + pfilter.period_s
+                if self.reactor.time() < mtime_next:
+                    self._param_store(channel, value)
+                    if not pfilter.trailing:
+                        pfilter.trailing = True
+                        self.reactor.send_task(put_trailing, run_at=mtime_next)
+                    return
+            if pfilter.mdel is not None or pfilter.adel is not None:
+                if not pfilter.deadband_passes(value):
+                    self._param_store(channel, value)
+                    return
+            if pfilter.period_s is not None:
+                pfilter.mtime_last = self.reactor.time()
+            put_cb(value)
+
+        return put_cb_filtered
+
     def _put_cb_generator_immediate(self, channel):
+        set_param = self._param_set[channel]
+
         def put_cb(value):
-            self.setParam(channel, value)
-            self.updatePVs()
+            set_param(value)
+            batch = relay_values.batch_active()
+            if batch is None:
+                self.updatePV(channel)
+            else:
+                # posted together as the batch exits
+                self._publish_mark(channel, flush=False)
+                batch.after(self._publish_flush)
+
+        return put_cb
+
+    def _put_cb_generator_batched(self, channel):
+        set_param = self._param_set[channel]
+
+        def put_cb(value):
+            set_param(value)
+            self._publish_mark(channel)
 
         return put_cb
 
     def _put_cb_generator_deferred(self, channel):
+        set_param = self._param_set[channel]
+
         def put_cb(value):
-            self.setParam(channel, value)
-            self.updatePVs()
-            pass
+            set_param(value)
+            # posted by the deferred_write_period loop
+            self._publish_mark(channel, flush=False)
 
         return put_cb
 
@@ -41,16 +474,62 @@ class CADriverServer(pcaspy.Driver):
             dtemp = dict(use_entry)
             dtemp.pop("type", None)
             self.setParamInfo(channel, dtemp)
+            self._publish(channel)
 
         return put_cb
 
-    def __init__(self, db, reactor, saver=None, deferred_write_period=1 / 4.0):
+    def __init__(
+        self,
+        db,
+        reactor,
+        saver=None,
+        deferred_write_period=1 / 4.0,
+        publish_mode=PUBLISH_IMMEDIATE,
+        publish_max_latency_s=None,
+        write_handoff=False,
+    ):
+        """
+        publish_mode chooses how RelayValue changes are posted to CA clients. By default each
+        change is posted right away. In the batched mode changed channels are posted together by
+        a single reactor task, sent at the next change after the previous post. With
+        publish_max_latency_s that task is instead delayed by up to that long, to collect more
+        changes into each post.
+
+        Changes within the mdel and adel deadbands of a channel, or faster than its publish_max_hz,
+        never reach pcaspy as monitor events. Reads of the channel still see them.
+
+        With write_handoff, client writes are queued for the reactor rather than taking the
+        task_lock in the CA server thread, see ChannelWriterHandoff. Channels may also set
+        write_handoff in their db entry.
+        """
         self.db = db
         self.reactor = reactor
         self.saver = saver
 
+        if publish_mode not in [PUBLISH_BATCHED, PUBLISH_IMMEDIATE]:
+            raise RuntimeError(
+                "Unknown publish_mode {0}, must be one of {1}".format(
+                    publish_mode, [PUBLISH_BATCHED, PUBLISH_IMMEDIATE]
+                )
+            )
+        self.publish_mode = publish_mode
+        self.publish_max_latency_s = publish_max_latency_s
+        self.write_handoff = write_handoff
+        # channels changed since the last post, in order of their first change
+        self._publish_dirty = dict()
+        self._publish_lock = threading.Lock()
+        self._publish_queued = False
+        # the setParam of each hosted channel, see _param_setter
+        self._param_set = dict()
+        # PublishFilter of the channels with deadbands or publish rate limits
+        self.publish_filters = dict()
+        if publish_mode == PUBLISH_IMMEDIATE:
+            put_cb_generator = self._put_cb_generator_immediate
+        else:
+            put_cb_generator = self._put_cb_generator_batched
+
         self.cas = pcaspy.SimpleServer()
-        self.cas_thread = pcaspy.tools.ServerThread(self.cas)
+        self.cas_thread = ServerThread(self.cas, driver=self)
         self.cas_thread.daemon = True
 
         db_cas_raw = {}
@@ -63,42 +542,37 @@ class CADriverServer(pcaspy.Driver):
                 continue
             rv = db_entry["rv"]
             entry_use = {}
+            self._param_set[channel] = self._param_setter(channel)
 
             # provide a callback key so that we can avoid the callback during the write method
             # print("ENTRY", db_entry)
             if not db_entry["deferred"]:
-                rv.register(
-                    callback=self._put_cb_generator_immediate(channel),
-                    key=self,
-                )
+                put_cb = put_cb_generator(channel)
             else:
                 if deferred_write_period is not None and deferred_write_period > 0:
-                    rv.register(
-                        callback=self._put_cb_generator_deferred(channel),
-                        key=self,
-                    )
+                    put_cb = self._put_cb_generator_deferred(channel)
                 else:
-                    rv.register(
-                        callback=self._put_cb_generator_immediate(channel),
-                        key=self,
-                    )
+                    put_cb = put_cb_generator(channel)
+
+            # deadbands only apply to scalar numbers
+            mdel = adel = None
+            if db_entry.get("type", None) in ["float", "int"] and db_entry.get(
+                "count", None
+            ) in [None, 1]:
+                mdel = db_entry.get("mdel", None)
+                adel = db_entry.get("adel", None)
+            max_hz = db_entry.get("publish_max_hz", None)
+            if mdel is not None or adel is not None or max_hz is not None:
+                pfilter = PublishFilter(rv.value, mdel=mdel, adel=adel, max_hz=max_hz)
+                self.publish_filters[channel] = pfilter
+                put_cb = self._put_cb_filtered(channel, pfilter, put_cb)
+            rv.register(
+                callback=put_cb,
+                key=self,
+            )
 
             # setup relays for any of the channel values to be inserted
-            for elem in [
-                "count",  # 1 	Number of elements
-                "enums",  # [] 	String representations of the enumerate states
-                "states",  # [] 	Severity values of the enumerate states.
-                "prec",  # 0 	Data precision
-                "unit",  # '' 	Physical meaning of data
-                "lolim",  # 0 	Data low limit for graphics display
-                "hilim",  # 0 	Data high limit for graphics display
-                "low",  # 0 	Data low limit for alarm
-                "high",  # 0 	Data high limit for alarm
-                "lolo",  # 0 	Data low low limit for alarm
-                "hihi",  # 0 	Data high high limit for alarm
-                "adel",  # 0 	Archive deadband
-                "mdel",  # 0 	Monitor,                    value change deadband
-            ]:
+            for elem in DB_INFO_ELEMS:
                 if elem in db_entry:
                     elem_val = db_entry[elem]
                     if isinstance(elem_val, relay_values.RelayValueDecl):
@@ -108,22 +582,21 @@ class CADriverServer(pcaspy.Driver):
                         )
                     else:
                         entry_use[elem] = elem_val
-            for elem in [
-                "type",  # 'float' PV data type. enum, string, char, float or int
-                "scan",  # 0 	Scan period in second. 0 means passive
-                "asyn",  # False 	Process finishes asynchronously if True
-                "asg",  # '' 	Access security group name
-                "value",  # 0 or '' 	Data initial value
-            ]:
+            for elem in DB_STATIC_ELEMS:
                 if elem in db_entry:
                     elem_val = db_entry[elem]
                     entry_use[elem] = elem_val
 
             if "value" not in entry_use:
                 entry_use["value"] = rv.value
+            if self._write_handoff_uses(channel):
+                # writes complete once the reactor applies them
+                entry_use.setdefault("asyn", True)
             db_cas_raw[channel] = entry_use
 
         self.db_cas_raw = db_cas_raw
+        # ChannelWriter of each hosted channel, see write
+        self._writers = {channel: self._writer_generate(channel) for channel in db_cas_raw}
         # print("INT:")
         # dprint(self.db_cas_raw)
         # have to setup createPV before starting the driver
@@ -142,7 +615,7 @@ class CADriverServer(pcaspy.Driver):
         # the deferred writes will happen this often
         if deferred_write_period is not None and deferred_write_period > 0:
             self.reactor.enqueue_looping(
-                self.updatePVs,
+                self._publish_flush,
                 period_s=deferred_write_period,
             )
 
@@ -152,62 +625,100 @@ class CADriverServer(pcaspy.Driver):
             self.saver.load_snap()
         return  # ~__init__
 
-    def write(self, channel, value):
-        # NOTE: for enum records the value here is the numeric value,
-        # not the string.  setParam() expects the numeric value.
-
-        # reject writes to non-writable channels
-        if self.db[channel]["interaction"] == "report":
-            return False
-
-        ctype = self.db[channel]["type"]
-        ctype_strlike = False
+    def _publish(self, channel):
+        if self.publish_mode == PUBLISH_IMMEDIATE:
+            self.updatePV(channel)
+        else:
+            self._publish_mark(channel)
 
-        if ctype in ["string", "char"]:
-            ctype_strlike = True
+    def _publish_mark(self, channel, flush=True):
+        """
+        Add the channel to the dirty set, queueing the task to post it unless one already is.
+        Callable from any thread.
+        """
+        with self._publish_lock:
+            self._publish_dirty[channel] = True
+            if not flush or self._publish_queued:
+                return
+            self._publish_queued = True
+        if self.publish_max_latency_s is None:
+            self.reactor.send_task(self._publish_flush)
+        else:
+            self.reactor.send_task(
+                self._publish_flush,
+                run_at=self.reactor.time() + self.publish_max_latency_s,
+            )
+        return
 
-        # reject values that don't correspond to an actual index of
-        # the enum
-        # FIXME: this is apparently a feature? of cas that allows for
-        # setting numeric values higher than the enum?
-        if ctype == "enum" and (value >= len(self.db[channel]["enums"]) or value < 0):
+    def _publish_flush(self):
+        """
+        Post every channel in the dirty set
+        """
+        with self._publish_lock:
+            dirty = self._publish_dirty
+            if not dirty:
+                self._publish_queued = False
+                return
+            self._publish_dirty = dict()
+            self._publish_queued = False
+        for channel in dirty:
+            self.updatePV(channel)
+        return
+
+    def _write_handoff_uses(self, channel):
+        db = self.db[channel]
+        if db.get("mt_assign", False):
+            # already written without the lock
             return False
+        return db.get("write_handoff", self.write_handoff)
 
+    def _writer_generate(self, channel):
+        """
+        The ChannelWriter of the channel, None for channels that reject writes
+        """
         db = self.db[channel]
-        rv = db["rv"]
-        mt_assign = db.get("mt_assign", False)
+        if db["interaction"] == "report":
+            return None
+
+        if db["type"] == "enum":
+            enum_N = len(db["enums"])
+        else:
+            enum_N = None
+
+        if db.get("mt_assign", False):
+            lock = None
+        else:
+            lock = self.reactor.task_lock
 
+        saver = None
+        urgentsave_s = None
         if self.saver is not None:
             urgentsave_s = db.get("urgentsave_s", None)
             if urgentsave_s is not None and urgentsave_s >= 0:
-                self.saver.urgentsave_notify(channel, urgentsave_s)
-
-        try:
-            if mt_assign:
-                rv.put_exclude_cb(value, key=self)
-            else:
-                with self.reactor.task_lock:
-                    rv.put_exclude_cb(value, key=self)
-        except relay_values.RelayValueCoerced as E:
-            # print(value, type(value))
-            value = E.preferred
-            # print(value, type(value))
-            if mt_assign:
-                rv.put_valid_exclude_cb(E.preferred, key=self)
-            else:
-                with self.reactor.task_lock:
-                    rv.put_valid_exclude_cb(E.preferred, key=self)
-
-            self.setParam(channel, value)
+                saver = self.saver
+
+        kwargs = dict(
+            channel=channel,
+            rv=db["rv"],
+            key=self,
+            lock=lock,
+            enum_N=enum_N,
+            saver=saver,
+            urgentsave_s=urgentsave_s,
+            set_param=self._param_set[channel],
+        )
+        if self._write_handoff_uses(channel):
+            return ChannelWriterHandoff(driver=self, reactor=self.reactor, **kwargs)
+        return ChannelWriter(**kwargs)
 
-            self.updatePVs()
-            return False
-        except relay_values.RelayValueRejected:
+    def write(self, channel, value):
+        # NOTE: for enum records the value here is the numeric value,
+        # not the string.  setParam() expects the numeric value.
+        writer = self._writers[channel]
+        # reject writes to non-writable channels
+        if writer is None:
             return False
-        else:
-            self.setParam(channel, value)
-            # self.updatePVs()
-            return True
+        return writer.write(value)
 
     def write_sync_typecast(self, channel, value):
         """
@@ -223,36 +734,9 @@ class CADriverServer(pcaspy.Driver):
         if self.db[channel]["interaction"] == "report":
             return False
 
-        ctype = self.db[channel]["type"]
-        ctype_strlike = False
-        if ctype == "float":
-            ccount = self.db[channel].get("count", 1)
-            if ccount == 1:
-                value = float(value)
-            else:
-                value = np.asarray(value, dtype=float)
-        elif ctype == "int":
-            ccount = self.db[channel].get("count", 1)
-            if ccount == 1:
-                try:
-                    value = int(value)
-                except ValueError:
-                    value = float(value)
-            else:
-                value = np.asarray(value, dtype=int)
-        elif ctype == "enum":
-            try:
-                value = int(value)
-            except ValueError:
-                value = self.db[channel]["enums"].index(value)
-        elif ctype == "string":
-            # should be happy
-            value = str(value)
-            ctype_strlike = True
-        elif ctype == "char":
-            # also should be happy as a str
-            value = str(value)
-            ctype_strlike = True
+        db = self.db[channel]
+        ctype = db["type"]
+        value = value_typecast(db, value)
 
         # reject values that don't correspond to an actual index of
         # the enum
@@ -261,33 +745,17 @@ class CADriverServer(pcaspy.Driver):
         if ctype == "enum" and (value >= len(self.db[channel]["enums"]) or value < 0):
             return False
 
-        db = self.db[channel]
-        rv = db["rv"]
         if self.saver is not None:
             urgentsave_s = db.get("urgentsave_s", None)
             if urgentsave_s is not None and urgentsave_s >= 0:
                 self.saver.urgentsave_notify(channel, urgentsave_s)
 
-        try:
-            rv.put_exclude_cb(value, key=self)
-        except relay_values.RelayValueCoerced as E:
-            # print("COERCED")
-            value = E.preferred
-            rv.put_valid_exclude_cb(
-                E.preferred,
-                key=self,
-            )
-
-            self.setParam(channel, value)
-
-            self.updatePVs()
+        status, value = self._writers[channel].put(value)
+        if status == relay_values.VALUE_REJECTED:
             return False
-        except relay_values.RelayValueRejected:
-            return False
-        else:
-            self.setParam(channel, value)
-            # self.updatePVs()
-            return True
+        self._param_set[channel](value)
+        self._publish(channel)
+        return status == relay_values.VALUE_VALID
 
     def start(self):
         self.cas_thread.start()
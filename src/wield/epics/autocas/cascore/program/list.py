@@ -27,13 +27,8 @@ class ListArgs(
         List the CAS PVs hosted by this task
         """
         program = self.cmd.meta_program_generate()
-        #TODO, make this not list external
-        cas_db = program.root.cas_db_generate()
-        pvs = list(cas_db.keys())
-        pvs.sort()
-        for pv in pvs:
-            if not cas_db[pv]['remote']:
-                print(pv)
+        for pv in program.root.channels(remote=False):
+            print(pv)
 
     @declarg.command()
     def remotePVs(self, argv):
@@ -41,13 +36,8 @@ class ListArgs(
         List the external PVs connected by this task
         """
         program = self.cmd.meta_program_generate()
-        #TODO, make this not list external
-        cas_db = program.root.cas_db_generate()
-        pvs = list(cas_db.keys())
-        pvs.sort()
-        for pv in pvs:
-            if cas_db[pv]['remote']:
-                print(pv)
+        for pv in program.root.channels(remote=True):
+            print(pv)
 
 
 
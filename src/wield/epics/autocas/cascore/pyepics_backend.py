@@ -9,6 +9,9 @@
 """
 import epics
 import time
+import ctypes
+import threading
+import collections
 import numpy as np
 
 from wield import declarative
@@ -16,11 +19,246 @@ from wield import declarative
 import warnings
 
 from . import relay_values
+from . import lanes
 
 ca_element_count = epics.ca.element_count
 
 
+ECA_NORMAL = 1
+
+
+def _on_put_event(args):
+    """
+    Put completion of ca_put_many, from the epics thread
+    """
+    args.usr(args.status)
+
+
+_CB_PUT_MANY = epics.dbr.make_callback(_on_put_event, epics.dbr.event_handler_args)
+
+
+def ca_put_data(chid, value):
+    """
+    Converts a value to the (ftype, count, data) put to a channel, like epics.ca.put does.
+    numpy arrays matching the native type of the channel are sent straight from their buffer,
+    as converting them through a list dominates for long waveforms.
+    """
+    ftype = epics.ca.field_type(chid)
+    nativecount = ca_element_count(chid)
+    ctype = epics.dbr.Map[ftype]
+
+    if isinstance(value, np.ndarray) and value.ndim == 1 and value.flags.c_contiguous:
+        try:
+            native = np.dtype(ctype) == value.dtype
+        except (TypeError, ValueError):
+            native = False
+        if native and len(value) > 0:
+            count = min(len(value), nativecount)
+            return ftype, count, value.ctypes.data_as(ctypes.POINTER(ctype))
+
+    if isinstance(value, str):
+        value = bytes(value, epics.ca.IOENCODING)
+
+    if ftype == epics.dbr.STRING:
+        if not isinstance(value, (list, tuple, np.ndarray)):
+            value = [value]
+        count = max(1, min(len(value), nativecount))
+        data = (count * ctype)()
+        for idx in range(min(count, len(value))):
+            elem = value[idx]
+            if not isinstance(elem, bytes):
+                elem = bytes(str(elem), epics.ca.IOENCODING)
+            data[idx].value = elem
+        return ftype, count, data
+
+    if ftype == epics.dbr.CHAR and isinstance(value, bytes):
+        # null terminated
+        value = list(value) + [0]
+    elif isinstance(value, np.ndarray):
+        value = value.tolist()
+
+    if not isinstance(value, (list, tuple)):
+        data = (1 * ctype)()
+        try:
+            data[0] = value
+        except TypeError:
+            data[0] = type(data[0])(value)
+        return ftype, 1, data
+
+    count = min(len(value), nativecount)
+    if count == 0:
+        count = nativecount
+    data = (count * ctype)()
+    data[: min(count, len(value))] = list(value[:count])
+    return ftype, count, data
+
+
+@epics.ca.withInitialContext
+def ca_subscribe(chid, callback, use_ctrl=False):
+    """
+    Subscribe to the monitor updates of a connected channel in its native type, like
+    epics.ca.create_subscription without polling, so that many are sent with one flush. callback
+    is called with the value and metadata as keywords. Returns the references to keep while the
+    subscription lives, the last being its event id.
+    """
+    ftype = epics.ca.promote_fieldtype(epics.ca.field_type(chid), use_ctrl=use_ctrl)
+    uarg = ctypes.py_object(callback)
+    evid = ctypes.c_void_p()
+    ret = epics.ca.libca.ca_create_subscription(
+        ftype,
+        0,
+        chid,
+        epics.ca.DEFAULT_SUBSCRIPTION_MASK,
+        epics.ca._CB_EVENT,
+        uarg,
+        ctypes.byref(evid),
+    )
+    epics.ca.PySEVCHK("create_subscription", ret)
+    return (epics.ca._CB_EVENT, uarg, evid)
+
+
+@epics.ca.withInitialContext
+def ca_put_many(puts):
+    """
+    Puts to many channels with a single flush, like epics.caput_many but on existing channels.
+    puts is a sequence of (chid, value, done), and done is called with the CA status once the
+    server completes the put, or at once if CA refuses to issue it. The caller must keep the done
+    callables alive until they are called. Returns the number of puts issued.
+    """
+    N = 0
+    for chid, value, done in puts:
+        ftype, count, data = ca_put_data(chid, value)
+        ret = epics.ca.libca.ca_array_put_callback(
+            ftype, count, chid, data, _CB_PUT_MANY, ctypes.py_object(done)
+        )
+        if ret != ECA_NORMAL:
+            done(ret)
+            continue
+        N += 1
+    if N > 0:
+        epics.ca.flush_io()
+    return N
+
+
+# the native DBR types of remote channels compatible with each type of the db entries
+DB_TYPE_FTYPES = {
+    "float": (
+        epics.dbr.DOUBLE,
+        epics.dbr.FLOAT,
+        epics.dbr.LONG,
+        epics.dbr.INT,
+        epics.dbr.CHAR,
+    ),
+    "int": (epics.dbr.LONG, epics.dbr.INT, epics.dbr.CHAR),
+    "enum": (epics.dbr.ENUM,),
+    "string": (epics.dbr.STRING,),
+    "char": (epics.dbr.CHAR,),
+}
+
+
+def ca_type_check(db_entry, ftype, count):
+    """
+    Returns the reason that a remote channel of native DBR type ftype and element count can't be
+    transferred to the relay of db_entry, or None if it can
+    """
+    dtype = db_entry["type"]
+    local_count = db_entry.get("count", None)
+    if ftype not in DB_TYPE_FTYPES.get(dtype, ()):
+        return "type DBR_{0} for a {1} PV".format(epics.dbr.Name(ftype), dtype)
+    if dtype == "char":
+        # strings of any length, truncated by the relay
+        return None
+    if local_count is None or local_count == 1:
+        if count != 1:
+            return "count {0} for a scalar PV".format(count)
+    elif count > local_count:
+        return "count {0} for a PV of count {1}".format(count, local_count)
+    return None
+
+
+def ca_value_local(db_entry, value):
+    """
+    Converts the value of a native monitor update to the value put to the relay of db_entry
+    """
+    if (
+        db_entry["type"] == "char"
+        and isinstance(value, np.ndarray)
+        and not isinstance(db_entry["rv"], relay_values.RelayWaveform)
+    ):
+        # a null terminated string
+        return value.tobytes().split(b"\0", 1)[0].decode(epics.ca.IOENCODING, "replace")
+    return value
+
+
+class ChannelRates(object):
+    """
+    Exponentially weighted event rates of a set of channels, stored as columns indexed by channel
+    id and updated for a whole batch of events at once. tintR is the rate at the last event of
+    each channel and mtime its time, count the number of events.
+    """
+
+    def __init__(self, N, rateconst_s):
+        self.rateconst_s = rateconst_s
+        self.tintR = np.zeros(N)
+        self.mtime = np.zeros(N)
+        self.count = np.zeros(N, dtype=np.int64)
+
+    def update(self, ids, tnow):
+        """
+        Record an event for each of the channel ids, which must not repeat
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        # events at the same time give the limiting rate of 1 / rateconst_s
+        tdiff = np.maximum(tnow - self.mtime[ids], 1e-9)
+        weight = np.exp(-tdiff / self.rateconst_s)
+        self.tintR[ids] = (1 - weight) / tdiff + weight * self.tintR[ids]
+        self.mtime[ids] = tnow
+        self.count[ids] += 1
+        return
+
+    def rates(self, tnow):
+        """
+        The rates of every channel, decayed to tnow
+        """
+        return self.tintR * np.exp(-(tnow - self.mtime) / self.rateconst_s)
+
+    def top(self, N, tnow):
+        """
+        The ids and rates of up to N channels with the highest rates, highest first
+        """
+        return rates_top(self.rates(tnow), self.count, N)
+
+
+def rates_top(rates, count, N):
+    """
+    The ids and rates of up to N channels with events counted and the highest rates, highest first
+    """
+    active = np.flatnonzero(count)
+    if len(active) > N:
+        active = active[np.argpartition(-rates[active], N - 1)[:N]]
+    active = active[np.argsort(-rates[active], kind="stable")]
+    return active, rates[active]
+
+
 class CAEpicsClient(declarative.OverridableObject):
+    """
+    Client of the remote PVs in the db, transferring values between them and their RelayValues.
+    The bookkeeping of the PVs is keyed by their channel names.
+
+    Channels are created in batches of connect_batch_N by reactor tasks, with a single flush of
+    the searches for each batch. Connection events are collected like the monitor updates, and
+    applied once per reactor pass. Channels still unconnected, or bad, are recreated with an
+    exponential backoff, see check_pending_connections.
+    """
+
+    # channels created by each connection task
+    connect_batch_N = 500
+    # period of check_pending_connections
+    connect_check_period_s = 1
+    # delay to the first recreation of a channel, doubling to connect_backoff_max_s
+    connect_backoff_s = 5
+    connect_backoff_max_s = 300
+
     @declarative.callbackmethod
     def connections_changed(self):
         # print("ECONN: ", self.epics_pending_connections)
@@ -29,69 +267,156 @@ class CAEpicsClient(declarative.OverridableObject):
     @declarative.dproperty
     def epics_pending_connections(self):
         """
-        Stores the list of PVs known to not be connected
+        Stores the set of channels known to not be connected
         """
         return set()
 
     @declarative.dproperty
     def epics_bad_connections(self):
         """
-        List of PV's with bad connections or types
+        Mapping of channels with bad connections or types to the reason
         """
         return dict()
 
+    epics_connected_count = 0
+
+    @declarative.dproperty
+    def epics_connect_retry(self):
+        """
+        Mapping of unconnected or bad channels to (attempts, mtime_next) of their next recreation
+        """
+        return dict()
+
+    @declarative.dproperty
+    def _connect_lock(self):
+        return threading.Lock()
+
+    # the mailbox of connection events waiting for the reactor, maps channel to conn
+    _connect_events = None
+    _connect_drain_queued = False
+    # channels waiting to be created by _connect_batch
+    _connect_queue = None
+    # connected channels attached by their first monitor update, see _connection_start
+    _attach_pending = None
+
+    @declarative.dproperty
+    def PV_values(self):
+        """
+        Stores the latest value of each channel from its monitor, already converted for its RV
+        """
+        return {}
+
+    @declarative.dproperty
+    def PV_enum_strs(self):
+        """
+        Stores the states of the enum channels from their monitor
+        """
+        return {}
+
+    @declarative.dproperty
+    def _subscriptions(self):
+        """
+        The native type monitor subscriptions of the channels, the references must be kept while
+        the subscription lives
+        """
+        return {}
+
     @declarative.dproperty
     def pending_writes(self):
         """
-        set of (RV, PV) tuples needing to commit values to PVs
+        Mapping of channels to the RVs needing to commit values to their PVs, written as one
+        batch by write_pending
         """
-        return set()
+        return {}
+
+    @declarative.dproperty
+    def _batch_writes(self):
+        """
+        Mapping of channels to the RVs put within the current relay batch, see _batch_write
+        """
+        return {}
 
     @declarative.dproperty
     def pending_reads(self):
         """
-        set of (RV, PV) tuples needing to commit values to RVs
+        Mapping of channels to the RVs needing to commit values from their PVs
         """
-        return set()
+        return {}
 
     @declarative.dproperty
-    def PV_RV_map(self):
+    def monitor_dropped(self):
         """
-        Stores the mapping of PVs to RVs
+        Stores the number of monitor updates of each channel that were coalesced into a later
+        update before the reactor applied them
         """
         return {}
 
-    PV_update_rateconst_s = 10
+    monitor_dropped_total = 0
+
+    @declarative.dproperty
+    def _monitor_lock(self):
+        return threading.Lock()
+
+    # the mailbox of channels with monitor updates waiting for the reactor, maps channel to RV
+    _monitor_dirty = None
+    _monitor_drain_queued = False
+
+    @declarative.dproperty
+    def PV_RV_map(self):
+        """
+        Stores the mapping of channels to RVs
+        """
+        return {}
 
     @declarative.dproperty
-    def PV_update_rateFOM(self):
+    def channel_ids(self):
         """
-        Stores a FOM consisting of (tintR, mtime) to represent how often on
-        average the PV is changing. tintR is the inverse change rate,
-        mtime is the last change time.
+        Stores the mapping of channels to their ids, indexing channel_names and the rate stats
         """
         return {}
 
+    @declarative.dproperty
+    def channel_names(self):
+        return []
+
+    PV_update_rateconst_s = 10
+    # ChannelRates of the monitor updates, created with the channel ids
+    PV_update_rates = None
+
     @declarative.dproperty
     def PV_putfails(self):
         """
-        Stores a FOM consisting of (tintR, mtime) to represent how often on
-        average the PV is changing. tintR is the inverse change rate,
-        mtime is the last change time.
+        Stores the number of puts to each channel which failed, or were issued before the
+        previous put completed
         """
         return {}
 
-    PV_put_rateconst_s = 10
+    puts_total = 0
+    put_fails_total = 0
+    put_batches_total = 0
 
     @declarative.dproperty
-    def PV_put_rateFOM(self):
+    def _put_lock(self):
+        return threading.Lock()
+
+    @declarative.dproperty
+    def _puts_outstanding(self):
         """
-        Stores a FOM consisting of (tintR, mtime) to represent how often on
-        average the PV is changing. tintR is the inverse change rate,
-        mtime is the last change time.
+        The number of puts to each channel waiting for their completion
         """
         return {}
 
+    @declarative.dproperty
+    def _put_done(self):
+        """
+        The completion callables of each channel, kept alive while their puts are outstanding
+        """
+        return {}
+
+    PV_put_rateconst_s = 10
+    # ChannelRates of the puts
+    PV_put_rates = None
+
     @declarative.dproperty
     def RV_connection_attached(self):
         """
@@ -104,7 +429,14 @@ class CAEpicsClient(declarative.OverridableObject):
     @declarative.dproperty
     def RV_PV_map(self):
         """
-        Stores the inverse mapping
+        Stores the mapping of RVs to their epics.PV
+        """
+        return {}
+
+    @declarative.dproperty
+    def RV_validate(self):
+        """
+        Stores the mapping of RVs to their validate, see relay_values.relay_validate
         """
         return {}
 
@@ -131,8 +463,11 @@ class CAEpicsClient(declarative.OverridableObject):
 
             rv = db_entry["rv"]
             entry_use = {"rv": rv}
+            self.channel_ids[channel] = len(self.channel_names)
+            self.channel_names.append(channel)
 
             self.RV_connection_attached[rv] = False
+            self.RV_validate[rv] = relay_values.relay_validate(rv)
             # provide a callback key so that we can avoid the callback during the write method
             if not db_entry["deferred"]:
                 rv.register(
@@ -142,7 +477,7 @@ class CAEpicsClient(declarative.OverridableObject):
             else:
                 if deferred_write_period is not None and deferred_write_period > 0:
                     rv.register(
-                        callback=self._put_cb_generator_deferred(rv),
+                        callback=self._put_cb_generator_deferred(channel, rv),
                         key=self,
                     )
                 else:
@@ -199,6 +534,8 @@ class CAEpicsClient(declarative.OverridableObject):
 
         self.db_cas_raw = db_cas_raw
         self.rvdb_cas_raw = rvdb_cas_raw
+        self.PV_update_rates = ChannelRates(len(self.channel_names), self.PV_update_rateconst_s)
+        self.PV_put_rates = ChannelRates(len(self.channel_names), self.PV_put_rateconst_s)
         # have to setup createPV before starting the driver
 
         # the deferred writes will happen this often
@@ -212,89 +549,153 @@ class CAEpicsClient(declarative.OverridableObject):
 
     def _put_cb_generator_immediate(self, rv):
         def put_cb(value):
-            # a python2 safety as unicode objects crash the CAS
-            self.xfer_RV_to_PV(rv)
+            pv = self.RV_PV_map.get(rv, None)
+            if pv is None:
+                return
+            batch = relay_values.batch_active()
+            if batch is None:
+                self.xfer_RV_to_PV(rv, pv)
+            else:
+                # written together as the batch exits
+                self._batch_writes[pv.pvname] = rv
+                batch.after(self._batch_write)
 
         return put_cb
 
-    def _put_cb_generator_deferred(self, rv):
+    def _put_cb_generator_deferred(self, channel, rv):
         def put_cb(value):
-            pv = self.RV_to_PV[rv]
-            self.pending_writes.add((rv, pv))
-            pass
+            self.pending_writes[channel] = rv
 
         return put_cb
 
-    def _conn_cb_generator_deferred(self, rv):
+    def _put_done_generator(self, channel):
+        def done(status):
+            # from the epics thread
+            with self._put_lock:
+                self._puts_outstanding[channel] -= 1
+                if status != ECA_NORMAL:
+                    self.PV_putfails[channel] = self.PV_putfails.get(channel, 0) + 1
+                    self.put_fails_total += 1
+
+        return done
+
+    def _conn_cb_generator(self, channel):
         """
         This gets called from the epics thread
         """
 
-        def first_CB_event_deferred(*value, **kwargs):
+        def conn_cb(*value, **kwargs):
             conn = kwargs.get("conn", None)
-            pv = self.RV_PV_map[rv]
             if conn is None:
                 return
-            elif conn:
-
-                def conn_task():
-                    self._connection_start(rv, pv)
-
-            else:
-
-                def conn_task():
-                    self._connection_end(rv, pv)
-
-            self.reactor.send_task(conn_task)
+            self._connection_post(channel, conn)
             return
 
-        return first_CB_event_deferred
+        return conn_cb
 
-    def start(self):
-        for chn, db in self.db_cas_raw.items():
-            rv = db["rv"]
-            pv = epics.PV(
-                chn,
-                connection_callback=self._conn_cb_generator_deferred(rv),
-                auto_monitor=True,
-            )
+    def _update_cb_generator(self, channel):
+        # this callback runs in the epics thread, so the value is put in
+        # the mailbox for the reactor to apply
+        def update_cb(value=None, enum_strs=None, **kwargs):
+            return self._monitor_post(channel, value, enum_strs)
 
-            def cb_gen(rv, pv):
-                def update_cb_reactor():
-                    # TODO, deal with deferred type
-                    self.xfer_PV_to_RV(rv, pv)
-                    return
+        return update_cb
 
-                # this callback runs in the epics thread, so enqueue
-                # it in the reactor to be in the main thread
-                def update_cb(value, *args, **kwargs):
-                    return self.reactor.send_task(update_cb_reactor)
+    def start(self):
+        self._connect_queue = collections.deque(self.db_cas_raw)
+        # every channel is pending from the start, so that the counts cover them
+        for channel, db in self.db_cas_raw.items():
+            self.epics_pending_connections.add(channel)
+            self.PV_RV_map[channel] = db["rv"]
+        self.reactor.send_task(self._connect_batch, lane=lanes.LANE_IO)
+        self.reactor.enqueue_looping(
+            self.check_pending_connections,
+            period_s=self.connect_check_period_s,
+            lane=lanes.LANE_HOUSEKEEPING,
+        )
+        self.connections_changed()
+        return
 
-                return update_cb
+    def _connect_batch(self):
+        """
+        Create the next connect_batch_N channels, flushing their searches together
+        """
+        queue = self._connect_queue
+        mtime_next = self.reactor.time() + self.connect_backoff_s
+        for idx in range(min(self.connect_batch_N, len(queue))):
+            channel = queue.popleft()
+            self._channel_create(channel)
+            self.epics_connect_retry[channel] = (0, mtime_next)
+        epics.ca.flush_io()
+        if queue:
+            self.reactor.send_task(self._connect_batch, lane=lanes.LANE_IO)
+        return
 
-            pv.add_callback(callback=cb_gen(rv, pv), index=self)
+    def _channel_create(self, channel):
+        rv = self.PV_RV_map[channel]
+        # the monitor subscription is created once the connection passes _connection_check,
+        # rather than by the PV, which converts every update of the TIME type to a char_value
+        pv = epics.PV(
+            channel,
+            connection_callback=self._conn_cb_generator(channel),
+            auto_monitor=False,
+        )
+        self.RV_PV_map[rv] = pv
+        return pv
+
+    def _channel_subscribe(self, channel, pv):
+        """
+        Monitor the channel in its native type, arrays arriving as numpy arrays. Enums use the
+        CTRL type for their states.
+        """
+        if channel in self._subscriptions:
+            # kept by CA across reconnections
+            return
+        use_ctrl = epics.ca.field_type(pv.chid) == epics.dbr.ENUM
+        self._subscriptions[channel] = ca_subscribe(
+            pv.chid, self._update_cb_generator(channel), use_ctrl=use_ctrl
+        )
+        return
 
-            # register the PV as wanting a connection
-            self.epics_pending_connections.add(pv)
-            self.PV_RV_map[pv] = rv
-            self.RV_PV_map[rv] = pv
-        self.connections_changed()
+    def _channel_clear(self, channel):
+        rv = self.PV_RV_map[channel]
+        pv = self.RV_PV_map.pop(rv, None)
+        if pv is None:
+            return
+        chid = pv.chid
+        subscription = self._subscriptions.pop(channel, None)
+        if subscription is not None:
+            epics.ca.clear_subscription(subscription[2])
+        self.PV_values.pop(channel, None)
+        self.PV_enum_strs.pop(channel, None)
+        if self._attach_pending is not None:
+            self._attach_pending.discard(channel)
+        pv.connection_callbacks[:] = []
+        pv.clear_callbacks()
+        pv.disconnect()
+        if chid is not None:
+            epics.ca.clear_channel(chid)
         return
 
     def stop(self):
-        return
-        for pv, rv in self.PV_RV_map.items():
-            pv.disconnect()
-            pv.connection_callbacks[:] = []
-            pv.clear_callbacks()
+        self.reactor.enqueue_looping(self.check_pending_connections, period_s=None)
+        for channel in list(self.PV_RV_map):
+            self._channel_clear(channel)
             # rv.register(key = self, remove = True)
 
         self.PV_RV_map.clear()
         self.RV_PV_map.clear()
         self.pending_reads.clear()
         self.pending_writes.clear()
+        with self._monitor_lock:
+            self._monitor_dirty = None
+        with self._connect_lock:
+            self._connect_events = None
+        self._connect_queue = None
         self.epics_pending_connections.clear()
         self.epics_bad_connections.clear()
+        self.epics_connect_retry.clear()
+        self.epics_connected_count = 0
         return
 
     def __enter__(self):
@@ -303,21 +704,162 @@ class CAEpicsClient(declarative.OverridableObject):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.stop()
 
-    def _connection_start(self, rv, pv):
+    def connection_counts(self):
+        """
+        The number of (pending, bad, connected) channels
+        """
+        return (
+            len(self.epics_pending_connections),
+            len(self.epics_bad_connections),
+            self.epics_connected_count,
+        )
+
+    def channel_rates(self, channel):
+        """
+        The (update, put) rates in Hz of a channel
+        """
+        idx = self.channel_ids[channel]
+        tnow = time.time()
+        return (
+            float(self.PV_update_rates.rates(tnow)[idx]),
+            float(self.PV_put_rates.rates(tnow)[idx]),
+        )
+
+    def busiest_channels(self, N=5):
+        """
+        List of (channel, rate) of up to N channels with the highest rate of updates and puts
+        together, highest first
         """
-        Checks the PV types
+        tnow = time.time()
+        ids, hz = rates_top(
+            self.PV_update_rates.rates(tnow) + self.PV_put_rates.rates(tnow),
+            self.PV_update_rates.count + self.PV_put_rates.count,
+            N,
+        )
+        return [(self.channel_names[idx], float(rate)) for idx, rate in zip(ids, hz)]
+
+    def _connection_post(self, channel, conn):
+        """
+        Called from the epics thread on connection events. Only the latest state of each channel
+        is kept, and one drain task is queued at a time.
+        """
+        with self._connect_lock:
+            events = self._connect_events
+            if events is None:
+                events = self._connect_events = dict()
+            events[channel] = conn
+            if self._connect_drain_queued:
+                return
+            self._connect_drain_queued = True
+        self.reactor.send_task(self._connection_drain, lane=lanes.LANE_IO)
+        return
+
+    def _connection_drain(self):
         """
-        if pv not in self.epics_pending_connections:
-            warnings.warn("WARNING SHOULDNT GET CALLED")
+        Apply the connection events in the mailbox, in one reactor task
+        """
+        with self._connect_lock:
+            events = self._connect_events
+            self._connect_events = None
+            self._connect_drain_queued = False
+        if events is None:
             return
+        changed = False
+        for channel, conn in events.items():
+            rv = self.PV_RV_map.get(channel, None)
+            pv = self.RV_PV_map.get(rv, None)
+            if pv is None:
+                # cleared since
+                continue
+            if conn:
+                changed |= self._connection_start(channel, rv, pv)
+            else:
+                changed |= self._connection_end(channel, rv, pv)
+        # the new subscriptions
+        epics.ca.flush_io()
+        if changed:
+            self.connections_changed()
+        return
 
-        # TODO Check type and update the bad connections
-        # print(pv.type)
+    def _connection_check(self, channel, rv, pv):
+        """
+        Returns the reason that the connected PV is bad, or None if it is usable. The native type
+        and count of the remote channel must be compatible with the db entry, see ca_type_check.
+        """
+        db = self.db[channel]
+        chid = pv.chid
+        # the access properties of the PV would get its value, which it doesn't monitor
+        if epics.ca.read_access(chid) != 1:
+            return "no read access"
+        if db["interaction"] in ["report", "command", "internal"]:
+            if epics.ca.write_access(chid) != 1:
+                return "no write access"
+        return ca_type_check(db, epics.ca.field_type(chid), ca_element_count(chid))
+
+    def _connection_enums(self, channel, enum_strs):
+        """
+        Returns the reason that the enum states of a remote channel are bad, or None. Remote
+        states with other names are only warned about, as long as they cover the local states.
+        """
+        enums = list(self.db[channel].get("enums", []))
+        if enum_strs is None or len(enum_strs) < len(enums):
+            return "enum states {0} for states {1}".format(enum_strs, enums)
+        if list(enum_strs[: len(enums)]) != enums:
+            warnings.warn(
+                "Remote enum {0} has states {1} for local states {2}".format(
+                    channel, list(enum_strs), enums
+                )
+            )
+        return None
 
-        channel = pv.pvname
-        value = pv.value
+    def _connection_bad(self, channel, reason):
+        self.epics_pending_connections.remove(channel)
+        self.epics_bad_connections[channel] = reason
+        return
+
+    def _connection_start(self, channel, rv, pv):
+        """
+        Checks the PV, subscribes to it and applies the first transfer, returns if the counts
+        changed. Channels reading the PV first, and enums, which need the states arriving with
+        it, are attached by the first monitor update instead.
+        """
+        if channel not in self.epics_pending_connections:
+            # already attached, or bad until the channel is recreated
+            return False
+
+        reason = self._connection_check(channel, rv, pv)
+        if reason is not None:
+            self._connection_bad(channel, reason)
+            return True
+
+        self._channel_subscribe(channel, pv)
         db = self.db[channel]
+        if db["type"] == "enum" or db["interaction"] in ["external", "setting"]:
+            if channel in self.PV_values:
+                # the subscription outlived a disconnection, and the update already came
+                return self._connection_first_update(channel, rv, pv)
+            if self._attach_pending is None:
+                self._attach_pending = set()
+            self._attach_pending.add(channel)
+            return False
+        return self._connection_attach(channel, rv, pv)
+
+    def _connection_first_update(self, channel, rv, pv):
+        if self.db[channel]["type"] == "enum":
+            reason = self._connection_enums(channel, self.PV_enum_strs.get(channel, None))
+            if reason is not None:
+                self._connection_bad(channel, reason)
+                return True
+        # applies the value
+        return self._connection_attach(channel, rv, pv)
+
+    def _connection_attach(self, channel, rv, pv):
+        self.RV_connection_attached[rv] = True
+        self.epics_pending_connections.remove(channel)
+        self.epics_connect_retry.pop(channel, None)
+        self.epics_connected_count += 1
 
+        db = self.db[channel]
         interaction = db["interaction"]
         if interaction == "report":
             self.xfer_RV_to_PV(rv, pv)
@@ -325,39 +867,140 @@ class CAEpicsClient(declarative.OverridableObject):
             self.xfer_RV_to_PV(rv, pv)
         elif interaction == "internal":
             self.xfer_RV_to_PV(rv, pv)
-        elif interaction == "external":
-            self.xfer_PV_to_RV(rv, pv)
-        elif interaction == "setting":
+        elif interaction in ["external", "setting"]:
+            # attached by the first monitor update
             self.xfer_PV_to_RV(rv, pv)
         else:
             raise RuntimeError("Unknown interaction type")
-
-        self.RV_connection_attached[rv] = True
-        self.epics_pending_connections.remove(pv)
-        self.connections_changed()
-        return
-
-    def _connection_end(self, rv, pv):
-        if pv in self.epics_pending_connections:
+        return True
+
+    def _connection_end(self, channel, rv, pv):
+        if self._attach_pending is not None:
+            self._attach_pending.discard(channel)
+        # the first update after reconnecting is applied instead
+        self.PV_values.pop(channel, None)
+        if channel in self.epics_pending_connections:
             # this is OK, since it means that it was unregistered by a method
             # noticing that "conn" was unset
             # warnings.warn("WARNING SHOULDNT GET CALLED")
-            return
+            return False
 
-        self.RV_connection_attached[rv] = False
-        self.epics_pending_connections.add(pv)
-        self.connections_changed()
+        if channel in self.epics_bad_connections:
+            del self.epics_bad_connections[channel]
+        else:
+            self.RV_connection_attached[rv] = False
+            self.epics_connected_count -= 1
+        self.epics_pending_connections.add(channel)
+        self.epics_connect_retry[channel] = (0, self.reactor.time() + self.connect_backoff_s)
+        return True
+
+    def check_pending_connections(self):
+        """
+        Recreate the channels which stayed unconnected or bad past their backoff, doubling it
+        for each attempt up to connect_backoff_max_s. This restarts the CA search of channels
+        which CA itself has backed off, and the checks of bad channels.
+        """
+        mtime_now = self.reactor.time()
+        retry = self.epics_connect_retry
+        recreated = False
+        for channel, (attempts, mtime_next) in list(retry.items()):
+            if mtime_next > mtime_now:
+                continue
+            attempts += 1
+            backoff_s = min(self.connect_backoff_s * 2**attempts, self.connect_backoff_max_s)
+            retry[channel] = (attempts, mtime_now + backoff_s)
+            if channel in self.epics_bad_connections:
+                del self.epics_bad_connections[channel]
+                self.epics_pending_connections.add(channel)
+                self.connections_changed()
+            self._channel_clear(channel)
+            self._channel_create(channel)
+            recreated = True
+        if recreated:
+            epics.ca.flush_io()
+        return
+
+    def _monitor_post(self, channel, value, enum_strs=None):
+        """
+        Called from the epics thread on monitor updates. A channel already waiting in the mailbox
+        only has its value replaced and counts the dropped update, since the drain applies the
+        latest value anyway. Only one drain task is queued at a time.
+        """
+        with self._monitor_lock:
+            dirty = self._monitor_dirty
+            if dirty is None:
+                dirty = self._monitor_dirty = dict()
+            waiting = channel in dirty
+            dirty[channel] = (value, enum_strs)
+            if waiting:
+                self.monitor_dropped[channel] = self.monitor_dropped.get(channel, 0) + 1
+                self.monitor_dropped_total += 1
+                return
+            if self._monitor_drain_queued:
+                return
+            self._monitor_drain_queued = True
+        self.reactor.send_task(self._monitor_drain, lane=lanes.LANE_MONITOR)
+        return
+
+    def _monitor_drain(self):
+        """
+        Apply the latest value of every channel in the mailbox, in one reactor task
+        """
+        with self._monitor_lock:
+            dirty = self._monitor_dirty
+            self._monitor_dirty = None
+            self._monitor_drain_queued = False
+        if dirty is None:
+            return
+        self.PV_update_rates.update([self.channel_ids[channel] for channel in dirty], time.time())
+        changed = False
+        for channel, (value, enum_strs) in dirty.items():
+            rv = self.PV_RV_map.get(channel, None)
+            pv = self.RV_PV_map.get(rv, None)
+            if pv is None:
+                continue
+            self.PV_values[channel] = ca_value_local(self.db[channel], value)
+            if enum_strs is not None:
+                self.PV_enum_strs[channel] = enum_strs
+            if self._attach_pending is not None and channel in self._attach_pending:
+                self._attach_pending.discard(channel)
+                changed |= self._connection_first_update(channel, rv, pv)
+                continue
+            if not self.RV_connection_attached[rv]:
+                # applied once the connection is
+                continue
+            # TODO, deal with deferred type
+            self.xfer_PV_to_RV(rv, pv)
+        if changed:
+            self.connections_changed()
         return
 
     def write_pending(self):
-        for rv in self.pending_writes:
-            self.xfer_RV_to_PV(rv)
+        """
+        Write every pending RV to its PV as one batch
+        """
+        if not self.pending_writes:
+            return
+        pending = list(self.pending_writes.items())
         self.pending_writes.clear()
+        self.put_many(pending)
+
+    def _batch_write(self):
+        """
+        Write the RVs put within a relay batch, see relay_values.batch
+        """
+        pending = list(self._batch_writes.items())
+        self._batch_writes.clear()
+        self.put_many(pending)
 
     def read_pending(self):
-        for pv in self.pending_reads:
-            self.xfer_PV_to_RV(pv)
+        pending = list(self.pending_reads.items())
         self.pending_reads.clear()
+        for channel, rv in pending:
+            pv = self.RV_PV_map.get(rv, None)
+            if pv is None or channel not in self.PV_values:
+                continue
+            self.xfer_PV_to_RV(rv, pv)
 
     def xfer_PV_to_RV(self, rv, pv):
         """ """
@@ -366,16 +1009,9 @@ class CAEpicsClient(declarative.OverridableObject):
             # based on the interaction type set for the rv cas_host
             return
         channel = pv.pvname
-        value = pv.value
+        value = self.PV_values[channel]
         db = self.db[channel]
 
-        tnow = time.time()
-        tintR, tlast = self.PV_update_rateFOM.get(pv, (0, 0))
-        tdiff = tnow - tlast
-        weight = np.exp(-tdiff / self.PV_update_rateconst_s)
-        tintR = (1 - weight) / tdiff + weight * tintR
-        self.PV_update_rateFOM[pv] = (tintR, tnow)
-
         # reject writes to non-writable channels
         if db["interaction"] == "report":
             # should put the OLD value back into the PV
@@ -388,43 +1024,59 @@ class CAEpicsClient(declarative.OverridableObject):
             if urgentsave_s is not None and urgentsave_s >= 0:
                 self.saver.urgentsave_notify(channel, urgentsave_s)
 
-        try:
+        validate = self.RV_validate[rv]
+        if validate is None:
             rv.put_exclude_cb(value, key=self)
-        except relay_values.RelayValueCoerced as E:
-            pref_value = E.preferred
+            return
+
+        status, value = validate(value)
+        if status == relay_values.VALUE_VALID:
+            rv.put_valid_exclude_cb(value, key=self)
+        elif status == relay_values.VALUE_COERCED:
             # it should NOT exclude the callback, so that the changed
             # value gets updated into the PV
             # this is like calling put_exclude_cb, then xfer_RV_to_PV
-            rv.put_valid(pref_value)
-        except relay_values.RelayValueRejected:
+            rv.put_valid(value)
+        else:
             # should put the OLD value back into the PV
             # TODO, should this depend on interaction_type
             self.xfer_RV_to_PV(rv, pv)
         return
 
     def xfer_RV_to_PV(self, rv, pv):
-        if not pv.connected or not self.RV_connection_attached[rv]:
-            return
-
-        channel = pv.pvname
-        db = self.db[channel]
-        # TODO, determine if interaction type should affect this method.
-
-        if not pv.put_complete:
-            Nlast = self.PV_putfails.get(pv, 0)
-            self.PV_putfails[pv] = Nlast + 1
-
-        tnow = time.time()
-        tintR, tlast = self.PV_put_rateFOM.get(pv, (0, 0))
-        tdiff = tnow - tlast
-        weight = np.exp(-tdiff / self.PV_put_rateconst_s)
-        tintR = (1 - weight) / tdiff + weight * tintR
-        self.PV_put_rateFOM[pv] = (tintR, tnow)
-
-        pv.put(rv.value, wait=False)
+        self.put_many([(pv.pvname, rv)])
         return
 
-    def check_pending_connections(self):
-        # TODO, make something to check that the pending connections list is
-        # up-to-date
-        raise NotImplementedError()
+    def put_many(self, channel_rvs):
+        """
+        Put the values of the RVs to the PVs of their channels with a single flush, skipping
+        channels not connected and attached. Keeps the put rate and failure stats of each channel.
+        """
+        puts = []
+        channels = []
+        for channel, rv in channel_rvs:
+            pv = self.RV_PV_map.get(rv, None)
+            if pv is None or not pv.connected or not self.RV_connection_attached[rv]:
+                continue
+            # TODO, determine if interaction type should affect this method.
+
+            done = self._put_done.get(channel, None)
+            if done is None:
+                done = self._put_done[channel] = self._put_done_generator(channel)
+            puts.append((pv.chid, rv.value, done))
+            channels.append(channel)
+
+        if not puts:
+            return 0
+        self.PV_put_rates.update([self.channel_ids[channel] for channel in channels], time.time())
+        with self._put_lock:
+            for channel in channels:
+                Nout = self._puts_outstanding.get(channel, 0)
+                if Nout > 0:
+                    self.PV_putfails[channel] = self.PV_putfails.get(channel, 0) + 1
+                    self.put_fails_total += 1
+                self._puts_outstanding[channel] = Nout + 1
+        N = ca_put_many(puts)
+        self.puts_total += N
+        self.put_batches_total += 1
+        return N
@@ -19,12 +19,18 @@ except ImportError:
     import Queue as queue
 import sys
 import collections
+import contextlib
 
 from declarative.callbacks import callbackmethod
-from ..utilities.priority_queue import HeapPriorityQueue
+from ..utilities.priority_queue import IndexedHeapPriorityQueue
 
 
 from . import interrupt_delay
+from . import clocks
+from . import workers
+from . import reactor_profile
+from . import futures
+from . import lanes
 
 TThread = threading.Thread
 
@@ -33,32 +39,43 @@ keyboard_interrupt_delay = interrupt_delay.DelayedKeyboardInterrupt()
 _EXIT = "Finish The Reactor"
 
 
-class Reactor(object):
+class ReactorBase(object):
+    """
+    Task scheduling shared by the reactors, the keyed and looping enqueues, futures, bus workers
+    and the canary thread. Subclasses run the tasks, providing send_task, flush, run_reactor,
+    loop_kill and the keyed timers behind _enqueue: _timer_set, _timer_move and _timer_cancel.
+    """
+
     sleep = time.sleep
     time = time.time
     Event = threading.Event
     Queue = queue.Queue
-    max_wait_s = 1 / 4.0
 
     _task_queue = None
+    # set while the loop is idle until a deadline, so that the canary does not report it
+    _sleep_until = None
 
-    def __init__(self, task_lock=None):
+    def __init__(self, task_lock=None, clock=None):
+        if clock is None:
+            clock = clocks.RealTimeClock()
+        self.clock = clock
         self._current_reactor_thread = None
+        # marks threads running reactor work outside of the reactor thread, see worker_context
+        self._worker_local = threading.local()
+        # the BusWorkers created by bus_worker, stopped by bus_workers_stop
+        self._bus_workers = []
         self._canary_thread = None
         self._task_num = 0
         self._task_send_num = 0
         self._canary_time = 5.0
         self._canary_poll = 2.0
-        self._queue_lock = threading.Lock()
         if task_lock is None:
             self.task_lock = threading.Lock()
         else:
             self.task_lock = task_lock
         self.rate_latency_check = 1000
-
-        # rendezvous point for the queue to be generated
-        self._task_queue = queue.Queue()
-        self._pqueue = HeapPriorityQueue()
+        # task level statistics, see reactor_profile and ProgramStatus
+        self.profile = reactor_profile.ReactorProfile(self.clock.time())
 
         # this is a map from task keys to bunches storing run metadata for eager-rate-limiting queuing
         self._task_map = dict()
@@ -77,9 +94,6 @@ class Reactor(object):
         self.task_lock.acquire()
         return  # ~__init__
 
-    def run_reactor(self):
-        self._reactor_loop()
-
     def _native_thread_canary(self):
         last_task_num = None
         last_task_time = 0
@@ -87,7 +101,8 @@ class Reactor(object):
             tnum = self._task_num
             if tnum is not None:
                 time_now = time.time()
-                if tnum != last_task_num:
+                # a loop sleeping until its next deadline is idle rather than stuck
+                if tnum != last_task_num or self._sleep_until is not None:
                     if last_task_time == sys.float_info.max:
                         self.canary_revived()
                     last_task_num = tnum
@@ -110,179 +125,15 @@ class Reactor(object):
         print("Reactor canary revived!")
         return
 
-    def flush(
-        self,
-        for_s=None,
-        modulo_s=None,
-        mtime_to=None,
-    ):
-        if for_s is not None:
-            if mtime_to is None:
-                mtime_to = time.time()
-            mtime_to += for_s
-
-        if modulo_s is not None:
-            if mtime_to is None:
-                mtime_to = time.time()
-            mtime_to = mtime_to + modulo_s - mtime_to % modulo_s
-        # if mtime_to is None at this point, then it means to flush and quit immediately
-
-        self._queue_lock.acquire()
-        self.task_lock.release()
-        self._current_reactor_thread = threading.current_thread()
-        try:
-            task_num = self._task_num
-            while True:
-                task_num += 1
-                self._task_num = task_num
-                mtime = time.time()
-                if self._pqueue:
-                    ntime, nitem = self._pqueue.peek()
-                    if ntime < mtime:
-                        item = nitem
-                        self._pqueue.pop()
-                    else:
-                        try:
-                            item = self._task_queue.get(False)
-                        except queue.Empty:
-                            if mtime_to is None or mtime >= mtime_to:
-                                break
-                            try:
-                                self._queue_lock.release()
-                                item = self._task_queue.get(
-                                    True,
-                                    min(
-                                        mtime_to - mtime, ntime - mtime, self.max_wait_s
-                                    ),
-                                )
-                            except queue.Empty:
-                                continue
-                            finally:
-                                self._queue_lock.acquire()
-                else:
-                    try:
-                        item = self._task_queue.get(False)
-                    except queue.Empty:
-                        if mtime_to is None or mtime >= mtime_to:
-                            break
-                        try:
-                            self._queue_lock.release()
-                            item = self._task_queue.get(
-                                True, min(mtime_to - mtime, self.max_wait_s)
-                            )
-                        except queue.Empty:
-                            continue
-                        finally:
-                            self._queue_lock.acquire()
-                if item is _EXIT:
-                    break
-                else:
-                    # print("FLUSH: ", item)
-                    with self.task_lock, keyboard_interrupt_delay:
-                        item()
-        finally:
-            self._current_reactor_thread = None
-            self.task_lock.acquire()
-            self._queue_lock.release()
-        return
-
     def time(self):
-        return time.time()
-
-    def _reactor_loop(self):
-        self._queue_lock.acquire()
-        self.task_lock.release()
-        try:
-            self._current_reactor_thread = threading.current_thread()
-            task_num = self._task_num
-            while True:
-                task_num += 1
-                self._task_num = task_num
-                mtime = time.time()
-                if self._pqueue:
-                    ntime, nitem = self._pqueue.peek()
-                    if ntime <= mtime:
-                        item = nitem
-                        self._pqueue.pop()
-                    else:
-                        try:
-                            item = self._task_queue.get(False)
-                        except queue.Empty:
-                            try:
-                                self._queue_lock.release()
-                                item = self._task_queue.get(
-                                    True, min(ntime - mtime, self.max_wait_s)
-                                )
-                            except queue.Empty:
-                                continue
-                            finally:
-                                self._queue_lock.acquire()
-                else:
-                    try:
-                        item = self._task_queue.get(False)
-                    except queue.Empty:
-                        try:
-                            self._queue_lock.release()
-                            item = self._task_queue.get(True, self.max_wait_s)
-                        except queue.Empty:
-                            continue
-                        finally:
-                            self._queue_lock.acquire()
-                if item is _EXIT:
-                    break
-                else:
-                    with self.task_lock, keyboard_interrupt_delay:
-                        item()
-            try:
-                # slurp up remaining tasks
-                while True:
-                    task_num += 1
-                    self._task_num = task_num
-
-                    item = self._task_queue.get_nowait()
-                    with self.task_lock, keyboard_interrupt_delay:
-                        item()
-            except queue.Empty:
-                pass
-        finally:
-            self._current_reactor_thread = None
-            self.task_lock.acquire()
-            self._queue_lock.release()
-        return
-
-    def loop_kill(self):
-        self._task_queue.put(_EXIT)
+        return self.clock.time()
 
     def reactor_shutdown(self):
         return self.loop_kill()
 
-    def _check_latency(self, send_time):
-        now_time = time.time()
-        self.latency_cb(now_time - send_time, self._task_queue.qsize())
-
-    def send_task(self, item, run_at=None):
-        if not isinstance(item, collections.Callable):
-            raise RuntimeError("Reactor Item must be a nullary Callable")
-        self._task_send_num += 1
-        if (self._task_send_num % self.rate_latency_check) == 0:
-            my_time = time.time()
-            self.send_task(lambda: self._check_latency(my_time))
-        _queue = self._task_queue
-        if _queue is None:
-            print(("Send occured after queue death! {0}".format(item)))
-            return
-        if run_at is None:
-            _queue.put(item)
-        else:
-            self._pqueue.push(QueueItem(run_at, item))
-            # put a do nother item in the main queue to force a wakeup if nothing is currently in it
-            # TODO see if this can be avoided if an item is already in the queue (race condition?)
-            _queue.put(lambda: None)
-        return
-
-    def cb_send_task(self, cb):
+    def cb_send_task(self, cb, lane=None):
         def deferred(*args, **kwargs):
-            self.send_task(lambda: cb(*args, **kwargs))
+            self.send_task(lambda: cb(*args, **kwargs), lane=lane)
 
         return deferred
 
@@ -295,6 +146,7 @@ class Reactor(object):
         mtime_at=None,
         modulo_s=None,
         force_requeue=False,
+        lane=None,
     ):
         return self._enqueue(
             command,
@@ -304,6 +156,7 @@ class Reactor(object):
             mtime_at=mtime_at,
             modulo_s=modulo_s,
             force_requeue=force_requeue,
+            lane=lane,
         )
 
     def enqueue_looping(
@@ -313,10 +166,12 @@ class Reactor(object):
         period_s=None,
         skip_fraction=0.4,
         skip_cb=None,
+        lane=None,
     ):
         """
         a period_s of None (default) stops any looping!
         skip_cb is called if the loop is ever skipped
+        lane is the priority lane each run of the loop is queued in once due
         """
         loop_settings = Bunch()
         loop_settings.period_s = period_s
@@ -329,6 +184,7 @@ class Reactor(object):
                 modulo_s=period_s,
                 loop_settings=loop_settings,
                 force_requeue=True,
+                lane=lane,
             )
         else:
             # not specifying modulo_s, future_s, or mtime_at will unqueue any current task (no need to specify force_requeue although it doesn't hurt)
@@ -350,6 +206,7 @@ class Reactor(object):
         modulo_s=None,
         force_requeue=False,
         loop_settings=None,
+        lane=None,
     ):
         """
         Specialty method for rate-limited queuing. The task is keyed and so this can be called multiple times and it won't requeue. If it is already queued, the timing can be
@@ -361,6 +218,11 @@ class Reactor(object):
 
         if mtime_at, future_s and modulo_s are all None, then the task is unqueued. force_requeue does not need to be specified for this to happen
         if loop_settings is set, then the command will be re-queued
+
+        The key is also the handle of the task in the timed-task heap, so each key has at most one
+        entry there. Rescheduling moves that entry and cancelling removes it.
+
+        lane is the priority lane the task joins once it is due
         """
         if key is None:
             key = command
@@ -368,12 +230,12 @@ class Reactor(object):
         mtime = mtime_at
         if future_s is not None:
             if mtime is None:
-                mtime = time.time()
+                mtime = self.clock.time()
             mtime += future_s
 
         if modulo_s is not None:
             if mtime is None:
-                mtime = time.time()
+                mtime = self.clock.time()
             mtime = mtime + modulo_s - mtime % modulo_s
         # if mtime is None at this point, then it means to not enqueue or to cancel queuing if force_requeue is set
 
@@ -384,139 +246,167 @@ class Reactor(object):
             if limit_s is not None and (mtime - qdat_prev.mtime < limit_s):
                 mtime = qdat_prev.mtime + limit_s
 
-        # create a closure for the task which is aware of the qdata bunch.
-        # that bunch allows this task wrapper to be cancellable and loopable
-        # if the qdata has_run is changed to False, then the task will be cancelled
-        def inner_task():
-            if not qdata.has_run:
-                qdata.has_run = True
-                # move to history
-                self._task_history[key] = qdata
-                qdat_current = self._task_map.pop(key)
-                if qdat_current is not qdata:
-                    # put it back if it isn't the recently finished one!
-                    self._task_map[key] = qdat_current
-                    assert False
-
-                loop_settings = qdata.loop_settings
-
-                if loop_settings is not None:
-                    if loop_settings.period_s is not None:
-                        mtime_current = time.time()
-                        mtime_last = qdata.mtime
-                        mtime_next = (
-                            mtime_last
-                            + loop_settings.period_s
-                            - mtime_last % loop_settings.period_s
-                        )
-
-                        fraction = (mtime_next - mtime_current) / loop_settings.period_s
-                        if fraction < loop_settings.skip_fraction:
-                            mtime_next += loop_settings.period_s
-                            skip_cb = loop_settings.skip_cb
-                            if skip_cb is not None:
-                                skip_cb()
-                        self._enqueue(
-                            qdata.command,
-                            qdata.key,
-                            mtime_at=mtime_next,
-                            loop_settings=loop_settings,
-                        )
-
-                # run the task last, after updating the task run setup
-                qdata.command()
-
         if qdat_current is not None:
             # task currently exists and we need to update the time
-            assert not qdat_current.has_run
             if mtime is None:
                 # remove the task
-                # first tell the task not to run itself
-                qdat_current.has_run = True
-                # set it to None so the later block can return the correct value
-                qdat_current = None
                 self._task_map.pop(key)
+                self._timer_cancel(key)
+                return True
             elif mtime < qdat_current.mtime:
-                # push up the run time and reinject the task
+                # push up the run time of the existing heap entry
                 qdat_current.mtime = mtime
-                # have to specify qdata because the closure of inner_task needs it
-                qdata = qdat_current
-                self.send_task(inner_task, run_at=mtime)
+                self._timer_move(key, mtime)
+                return False
             elif force_requeue or loop_settings is not None:
-                qdat_current.has_run = True
-                # go ahead and remove it from the map for safety
-                self._task_map.pop(key)
-                # set it to None so the later block reqeueues it
-                qdat_current = None
                 # carry over if the task was looping and it is not forcing new loop settings
                 if loop_settings is None:
                     loop_settings = qdat_current.loop_settings
-                # this is more complex as we have to cancel the current task and recreate the qdata
-
-        # handle task creation and injection
-        # would be an "else of the previous if, but this allows it to handle force_requeue as well
-        if qdat_current is None:
-            if mtime is not None:
-                qdata = Bunch()
-                qdata.key = key
-                qdata.command = command
-                qdata.has_run = False
-                qdata.mtime = mtime
-                qdata.loop_settings = loop_settings
-
-                self._task_map[key] = qdata
-                self.send_task(inner_task, run_at=mtime)
+                # the heap entry is replaced below with the new qdata and time
             else:
-                # if mtime is None here, then the task should NOT be queued or re-queued
-                pass
+                return False
+        elif mtime is None:
+            # if mtime is None here, then the task should NOT be queued or re-queued
             return True
-        return False
 
-    def capture(self):
-        self._queue_lock.acquire()
+        qdata = Bunch()
+        qdata.key = key
+        qdata.command = command
+        qdata.mtime = mtime
+        qdata.loop_settings = loop_settings
+        qdata.lane = lane
 
-    def release(self):
-        self._queue_lock.release()
+        # create a closure for the task which is aware of the qdata bunch.
+        # that bunch allows this task wrapper to be loopable
+        def inner_task():
+            # due timers leave the heap for their lane before running, so a task earlier in the
+            # same pass may have cancelled or replaced this one in the meantime
+            if self._task_map.get(key, None) is not qdata:
+                return
+            # move to history
+            self._task_history[key] = qdata
+            self._task_map.pop(key)
+
+            if loop_settings is not None:
+                if loop_settings.period_s is not None:
+                    mtime_current = self.clock.time()
+                    mtime_last = qdata.mtime
+                    mtime_next = (
+                        mtime_last
+                        + loop_settings.period_s
+                        - mtime_last % loop_settings.period_s
+                    )
+                    if mtime_next - mtime_last < 0.5 * loop_settings.period_s:
+                        # mtime_last is already on a period boundary, but the modulo
+                        # rounded to just under the period
+                        mtime_next += loop_settings.period_s
+
+                    fraction = (mtime_next - mtime_current) / loop_settings.period_s
+                    if fraction < loop_settings.skip_fraction:
+                        mtime_next += loop_settings.period_s
+                        self.profile.record_skip(inner_task.profile_name)
+                        skip_cb = loop_settings.skip_cb
+                        if skip_cb is not None:
+                            skip_cb()
+                    self._enqueue(
+                        qdata.command,
+                        qdata.key,
+                        mtime_at=mtime_next,
+                        loop_settings=loop_settings,
+                        lane=qdata.lane,
+                    )
+
+            # run the task last, after updating the task run setup
+            qdata.command()
+
+        inner_task.profile_name = reactor_profile.task_name(key)
+        self._task_map[key] = qdata
+        self._timer_set(key, mtime, inner_task, lane)
+        return True
+
+    def profile_dump(self, F=None, N=None):
+        """
+        Print the task profile table, see :meth:`~.reactor_profile.ReactorProfile.dump`.
+        Call from a reactor task or with the task_lock held.
+        """
+        self.profile.dump(F=F, N=N)
+
+    @contextlib.contextmanager
+    def worker_context(self):
+        """
+        Context for worker threads (see :class:`~.workers.BusWorker`) running jobs while holding
+        the task_lock. Within it, the thread counts as living in the reactor.
+        """
+        prev = getattr(self._worker_local, "active", False)
+        self._worker_local.active = True
+        try:
+            yield
+        finally:
+            self._worker_local.active = prev
+
+    def bus_worker(self, name=None):
+        """
+        Create a :class:`~.workers.BusWorker` to run the blocking I/O of a single bus off of
+        the reactor thread.
+        """
+        worker = workers.BusWorker(reactor=self, name=name)
+        self._bus_workers.append(worker)
+        return worker
+
+    def bus_workers_stop(self):
+        """
+        Stop the threads of every BusWorker created by bus_worker, see
+        :meth:`~.workers.BusWorker.stop`
+        """
+        for worker in self._bus_workers:
+            worker.stop()
+        return
 
     def assert_living_in_reactor(self):
         if self._current_reactor_thread is None:
             return
+        if getattr(self._worker_local, "active", False):
+            return
         assert threading.current_thread() == self._current_reactor_thread
 
     def check_living_in_reactor(self):
         if self._current_reactor_thread is None:
             return True
+        if getattr(self._worker_local, "active", False):
+            return True
         return threading.current_thread() == self._current_reactor_thread
 
     def send_task_partial(self, func, *args, **kwargs):
         p = functools.partial(func, *args, **kwargs)
         self.send_task(p)
 
+    def send_task_future(self, func, *args, run_at=None, lane=None, **kwargs):
+        """
+        Send func(*args, **kwargs) as a task, returning a :class:`~.futures.ReactorFuture` for
+        its result. Exceptions of func are given to the future rather than raised in the reactor.
+        The task is skipped if the future is cancelled before it runs.
+        """
+        future = futures.ReactorFuture()
+
+        def future_task():
+            if not future.set_running():
+                return
+            try:
+                ret = func(*args, **kwargs)
+            except Exception as E:
+                future.set_exception(E)
+            else:
+                future.set_result(ret)
+
+        future_task.profile_name = reactor_profile.task_name(func)
+        self.send_task(future_task, run_at=run_at, lane=lane)
+        return future
+
     def send_task_synchronous(self, func, *args, **kwargs):
         if self.check_living_in_reactor():
             return func(*args, **kwargs)
         else:
-            ev_did_run = threading.Event()
-            retval = []
-
-            def reactor_run():
-                try:
-                    ret = func(*args, **kwargs)
-                    retval.append(ret)
-                except Exception as E:
-                    retval.append(None)
-                    retval.append(E)
-                finally:
-                    ev_did_run.set()
-                return
-
-            self.send_task(reactor_run)
-            while not ev_did_run.wait(timeout=0.05):
-                pass
-            if len(retval) == 2:
-                raise retval[1]
-            else:
-                return retval[0]
+            return self.send_task_future(func, *args, **kwargs).result()
 
     def reactor_only(self, func):
         """
@@ -527,27 +417,7 @@ class Reactor(object):
             if self.check_living_in_reactor():
                 return func(*args, **kwargs)
             else:
-                ev_did_run = threading.Event()
-                retval = []
-
-                def reactor_run():
-                    try:
-                        ret = func(*args, **kwargs)
-                        retval.append(ret)
-                    except Exception as E:
-                        retval.append(None)
-                        retval.append(E)
-                    finally:
-                        ev_did_run.set()
-                    return
-
-                print("Shifting call: {0} to reactor thread and waiting result")
-                self.send_task(reactor_run)
-                ev_did_run.wait()
-                if len(retval) == 2:
-                    raise retval[1]
-                else:
-                    return retval[0]
+                return self.send_task_future(func, *args, **kwargs).result()
 
         functools.update_wrapper(alt_launch, func)
         return alt_launch
@@ -557,26 +427,267 @@ class Reactor(object):
         return
 
 
-class QueueItem(collections.namedtuple("QueueTuple", ["run_at", "item"])):
+class Reactor(ReactorBase):
     """
-    Need a special container for the (mtime_run, item) pairs used in the scheduler.
-    The heap queue sometimes sorts on the second item and function callbacks cannot be sorted.
+    Reactor running its tasks from a thread, see run_reactor and flush. Ready tasks wait in
+    priority lanes and timed tasks in a keyed heap.
     """
 
-    def __lt__(self, other):
-        return self[0] < other[0]
+    def __init__(self, task_lock=None, clock=None, lane_shares=None):
+        """
+        clock provides the time used for all scheduling. It defaults to a
+        :class:`~.clocks.RealTimeClock`, use a :class:`~.clocks.VirtualClock` to run
+        schedules in simulated time.
 
-    def __gt__(self, other):
-        return self[0] > other[0]
+        lane_shares maps the names of the priority lanes to their shares of the reactor, see
+        :mod:`~.lanes`. Tasks sent without a lane go to the control lane.
+        """
+        super(Reactor, self).__init__(task_lock=task_lock, clock=clock)
+        self._queue_lock = threading.Lock()
 
-    def __eq__(self, other):
-        return self[0] == other[0]
+        # ready tasks, in their priority lanes
+        self._task_queue = lanes.LaneScheduler(lane_shares)
+        # timed tasks, keyed so that rescheduled or cancelled tasks are moved or
+        # removed rather than left in the heap
+        self._pqueue = IndexedHeapPriorityQueue()
+        # guards both queues. The loop waits on it while idle and is only
+        # notified for tasks that are due before the time it is sleeping until
+        self._queue_cv = threading.Condition(threading.Lock())
+        return  # ~__init__
 
-    def __le__(self, other):
-        return self[0] <= other[0]
+    def run_reactor(self):
+        self._run_loop(forever=True)
 
-    def __ge__(self, other):
-        return self[0] >= other[0]
+    def flush(
+        self,
+        for_s=None,
+        modulo_s=None,
+        mtime_to=None,
+    ):
+        if for_s is not None:
+            if mtime_to is None:
+                mtime_to = self.clock.time()
+            mtime_to += for_s
 
-    def __ne__(self, other):
-        return self[0] != other[0]
+        if modulo_s is not None:
+            if mtime_to is None:
+                mtime_to = self.clock.time()
+            mtime_to = mtime_to + modulo_s - mtime_to % modulo_s
+        # if mtime_to is None at this point, then it means to flush and quit immediately
+        self._run_loop(mtime_to=mtime_to)
+        return
+
+    def _run_loop(self, mtime_to=None, forever=False):
+        """
+        The event loop core for both flush and run_reactor. Runs tasks until mtime_to,
+        or until no tasks are ready if mtime_to is None. If forever is set, runs until
+        loop_kill, then runs any remaining immediate tasks.
+        """
+        block = forever or mtime_to is not None
+        self._queue_lock.acquire()
+        self.task_lock.release()
+        self._current_reactor_thread = threading.current_thread()
+        try:
+            task_num = self._task_num
+            while True:
+                task_num += 1
+                self._task_num = task_num
+                next_task = self._task_next(mtime_to, block=block)
+                if next_task is None:
+                    if forever:
+                        continue
+                    if mtime_to is None or self.clock.time() >= mtime_to:
+                        break
+                    continue
+                item, mtime_ready, lane = next_task
+                if item is _EXIT:
+                    break
+                self._run_task(item, mtime_ready, lane)
+            if forever:
+                # slurp up remaining tasks
+                while True:
+                    task_num += 1
+                    self._task_num = task_num
+
+                    with self._queue_cv:
+                        ready = self._task_queue.pop()
+                    if ready is None:
+                        break
+                    (item, mtime_ready), lane = ready
+                    self._run_task(item, mtime_ready, lane.name)
+        finally:
+            self._current_reactor_thread = None
+            self.task_lock.acquire()
+            self._queue_lock.release()
+        return
+
+    def _run_task(self, item, mtime_ready=None, lane=None):
+        """
+        Run a task holding the task_lock, recording it in the profile. mtime_ready is when the
+        task was sent or due, for the queue-wait statistics.
+        """
+        with self.task_lock, keyboard_interrupt_delay:
+            if mtime_ready is not None:
+                wait_s = self.clock.time() - mtime_ready
+            else:
+                wait_s = None
+            t_start = time.perf_counter()
+            try:
+                item()
+            finally:
+                self.profile.record_run(
+                    getattr(item, "profile_name", None) or reactor_profile.task_name(item),
+                    time.perf_counter() - t_start,
+                    wait_s=wait_s,
+                    depth=len(self._pqueue) + len(self._task_queue),
+                    lane=lane,
+                )
+        return
+
+    def _task_next(self, mtime_to=None, block=True):
+        """
+        Returns the next (task, mtime_ready, lane_name) to run. Timed tasks that are due join the
+        ready tasks of their lane, and the lane is chosen by the LaneScheduler. If none are ready,
+        this sleeps until the next timed task, mtime_to or a new task, and then returns None.
+        Does not sleep if block is False.
+
+        Must be called with _queue_lock held, which is released during the sleep.
+        """
+        with self._queue_cv:
+            mtime = self.clock.time()
+            pqueue = self._pqueue
+            ntime = None
+            while pqueue:
+                ntime, (nitem, nlane) = pqueue.peek()
+                if ntime > mtime:
+                    break
+                pqueue.pop()
+                self._task_queue.push(nlane, (nitem, ntime))
+                ntime = None
+
+            ready = self._task_queue.pop()
+            if ready is not None:
+                (item, mtime_ready), lane = ready
+                return item, mtime_ready, lane.name
+
+            if not block:
+                return None
+
+            deadline = ntime
+            if mtime_to is not None:
+                if mtime >= mtime_to:
+                    return None
+                if deadline is None or mtime_to < deadline:
+                    deadline = mtime_to
+
+            if deadline is None:
+                self._sleep_until = float("inf")
+            else:
+                self._sleep_until = deadline
+            self._queue_lock.release()
+            try:
+                self.clock.wait(self._queue_cv, deadline)
+            finally:
+                self._sleep_until = None
+        # reacquired outside of the condition so that threads holding the
+        # _queue_lock through capture() may still send tasks
+        self._queue_lock.acquire()
+        return None
+
+    def loop_kill(self):
+        with self._queue_cv:
+            self._task_queue.push(self._task_queue.lane(lanes.LANE_CONTROL), (_EXIT, None))
+            if self._sleep_until is not None:
+                self._queue_cv.notify()
+
+    def _check_latency(self, send_time):
+        now_time = self.clock.time()
+        self.latency_cb(now_time - send_time, len(self._task_queue))
+
+    def send_task(self, item, run_at=None, lane=None):
+        """
+        Send the nullary callable item to run in the reactor, immediately or at the time run_at.
+        lane is the name of the priority lane for the task, the control lane by default.
+        """
+        if not callable(item):
+            raise RuntimeError("Reactor Item must be a nullary Callable")
+        self._task_send_num += 1
+        if (self._task_send_num % self.rate_latency_check) == 0:
+            my_time = self.clock.time()
+            self.send_task(lambda: self._check_latency(my_time))
+        _queue = self._task_queue
+        if _queue is None:
+            print(("Send occured after queue death! {0}".format(item)))
+            return
+        lane = _queue.lane(lane)
+        with self._queue_cv:
+            if run_at is None:
+                _queue.push(lane, (item, self.clock.time()))
+                if self._sleep_until is not None:
+                    self._queue_cv.notify()
+            else:
+                self._pqueue.push(run_at, (item, lane))
+                self._wakeup(run_at)
+        return
+
+    def lane_names(self):
+        return list(self._task_queue.lanes.keys())
+
+    def lane_status(self):
+        """
+        dict mapping each lane name to the (number of ready tasks, wait of its oldest task in
+        seconds). The wait is None for empty lanes.
+        """
+        with self._queue_cv:
+            depths = self._task_queue.depths()
+            oldest = self._task_queue.oldest()
+        mtime_now = self.clock.time()
+        status = dict()
+        for name, depth in depths.items():
+            mtime_ready = oldest[name]
+            if mtime_ready is None:
+                status[name] = (depth, None)
+            else:
+                status[name] = (depth, mtime_now - mtime_ready)
+        return status
+
+    def _wakeup(self, mtime):
+        """
+        Wake the loop if it is sleeping past mtime. Must be called with _queue_cv held.
+        """
+        sleep_until = self._sleep_until
+        if sleep_until is not None and mtime < sleep_until:
+            self._queue_cv.notify()
+
+    def _timer_set(self, key, mtime, task, lane=None):
+        """
+        Schedule (or replace) the keyed timed task
+        """
+        lane = self._task_queue.lane(lane)
+        with self._queue_cv:
+            self._pqueue.set(key, mtime, (task, lane))
+            self._wakeup(mtime)
+
+    def _timer_move(self, key, mtime):
+        """
+        Move the keyed timed task earlier to mtime. A task already due is waiting in its
+        lane and is left there.
+        """
+        with self._queue_cv:
+            if key in self._pqueue:
+                self._pqueue.decrease_key(key, mtime)
+                self._wakeup(mtime)
+
+    def _timer_cancel(self, key):
+        """
+        Remove the keyed timed task. A task already due is waiting in its lane, and skips
+        itself when run.
+        """
+        with self._queue_cv:
+            self._pqueue.discard(key)
+
+    def capture(self):
+        self._queue_lock.acquire()
+
+    def release(self):
+        self._queue_lock.release()
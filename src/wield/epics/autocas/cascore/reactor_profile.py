@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Task-level instrumentation of the :class:`~.reactor.Reactor`.
+
+Tasks are grouped by name. Keyed tasks (from enqueue and enqueue_looping) are named after their
+key, and other tasks after the function they call, so that every lambda sent from the same line of
+code is counted together.
+"""
+import sys
+import math
+import functools
+
+
+class LogHistogram(object):
+    """
+    Histogram with logarithmic buckets, in the style of HDR histograms. Each power of two is split
+    into sub_buckets linear buckets, so every recorded value is kept to a relative precision of
+    1/sub_buckets over the full range. Values are in seconds, and all values below resolution_s
+    share the first bucket. Buckets are stored sparsely.
+    """
+
+    def __init__(self, sub_buckets=8, resolution_s=1e-6):
+        self.sub_buckets = sub_buckets
+        self.resolution_s = resolution_s
+        self.buckets = dict()
+        self.count = 0
+        self.total_s = 0
+        self.max_s = 0
+
+    def record(self, value_s):
+        self.count += 1
+        self.total_s += value_s
+        if value_s > self.max_s:
+            self.max_s = value_s
+        units = value_s / self.resolution_s
+        if units < 1:
+            idx = 0
+        else:
+            mant, exp = math.frexp(units)
+            idx = exp * self.sub_buckets + int((2 * mant - 1) * self.sub_buckets)
+        buckets = self.buckets
+        buckets[idx] = buckets.get(idx, 0) + 1
+        return
+
+    def bucket_edge_s(self, idx):
+        """
+        Upper edge of bucket idx
+        """
+        if idx == 0:
+            return self.resolution_s
+        exp, sub = divmod(idx, self.sub_buckets)
+        return self.resolution_s * math.ldexp(1 + (sub + 1) / self.sub_buckets, exp - 1)
+
+    def percentile(self, pct):
+        """
+        Upper edge of the bucket holding the pct percentile, None if empty
+        """
+        if self.count == 0:
+            return None
+        threshold = self.count * pct / 100
+        accum = 0
+        for idx in sorted(self.buckets):
+            accum += self.buckets[idx]
+            if accum >= threshold:
+                return min(self.bucket_edge_s(idx), self.max_s)
+        return self.max_s
+
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total_s / self.count
+
+    def merge(self, other):
+        for idx, count in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + count
+        self.count += other.count
+        self.total_s += other.total_s
+        self.max_s = max(self.max_s, other.max_s)
+
+    def clear(self):
+        self.buckets.clear()
+        self.count = 0
+        self.total_s = 0
+        self.max_s = 0
+
+
+class TaskStats(object):
+    """
+    Run statistics of the tasks sharing a name
+    """
+
+    __slots__ = ("runs", "total_s", "max_s", "wait_max_s", "skips")
+
+    def __init__(self):
+        self.runs = 0
+        self.total_s = 0
+        self.max_s = 0
+        self.wait_max_s = 0
+        self.skips = 0
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.total_s += other.total_s
+        self.max_s = max(self.max_s, other.max_s)
+        self.wait_max_s = max(self.wait_max_s, other.wait_max_s)
+        self.skips += other.skips
+
+
+class ProfileInterval(object):
+    """
+    Statistics accumulated since the last :meth:`ReactorProfile.interval`
+    """
+
+    def __init__(self, mtime_start):
+        self.mtime_start = mtime_start
+        self.tasks = dict()
+        # stats by priority lane
+        self.lanes = dict()
+        self.wait_hist = LogHistogram()
+        self.run_hist = LogHistogram()
+        self.depth_max = 0
+        self.skips = 0
+
+    def merge(self, other):
+        for mine, theirs in [(self.tasks, other.tasks), (self.lanes, other.lanes)]:
+            for name, stats in theirs.items():
+                mstats = mine.get(name, None)
+                if mstats is None:
+                    mstats = mine[name] = TaskStats()
+                mstats.merge(stats)
+        self.wait_hist.merge(other.wait_hist)
+        self.run_hist.merge(other.run_hist)
+        self.depth_max = max(self.depth_max, other.depth_max)
+        self.skips += other.skips
+
+    def top_tasks(self, N=5):
+        """
+        The N (name, TaskStats) pairs with the largest cumulative execution time
+        """
+        tasks = sorted(self.tasks.items(), key=lambda kv: kv[1].total_s, reverse=True)
+        return tasks[:N]
+
+
+def task_name(key):
+    """
+    Name under which a task key or callable is profiled
+    """
+    if isinstance(key, functools.partial):
+        key = key.func
+    qualname = getattr(key, "__qualname__", None)
+    if qualname is not None:
+        return qualname
+    if isinstance(key, str):
+        return key
+    return repr(key)
+
+
+class ReactorProfile(object):
+    """
+    Collects the per-task run counts, execution and queue-wait times, timer heap depth and loop
+    skips of a reactor. The statistics are kept both as an interval, which the status PVs read
+    and reset, and as a running total for :meth:`dump`.
+    """
+
+    def __init__(self, mtime_start=0):
+        self.current = ProfileInterval(mtime_start)
+        self.total = ProfileInterval(mtime_start)
+
+    def _stats(self, name, group=None):
+        if group is None:
+            group = self.current.tasks
+        stats = group.get(name, None)
+        if stats is None:
+            stats = group[name] = TaskStats()
+        return stats
+
+    def record_run(self, name, run_s, wait_s=None, depth=None, lane=None):
+        current = self.current
+        stats = self._stats(name)
+        if lane is not None:
+            lstats = self._stats(lane, current.lanes)
+        else:
+            lstats = None
+        if wait_s is not None and wait_s < 0:
+            wait_s = 0
+        for st in (stats, lstats):
+            if st is None:
+                continue
+            st.runs += 1
+            st.total_s += run_s
+            if run_s > st.max_s:
+                st.max_s = run_s
+            if wait_s is not None and wait_s > st.wait_max_s:
+                st.wait_max_s = wait_s
+        current.run_hist.record(run_s)
+        if wait_s is not None:
+            current.wait_hist.record(wait_s)
+        if depth is not None and depth > current.depth_max:
+            current.depth_max = depth
+        return
+
+    def record_skip(self, name):
+        self._stats(name).skips += 1
+        self.current.skips += 1
+
+    def interval(self, mtime_now):
+        """
+        Returns the current ProfileInterval and starts a new one, folding the old one into the
+        running totals.
+        """
+        interval = self.current
+        self.current = ProfileInterval(mtime_now)
+        self.total.merge(interval)
+        return interval
+
+    def dump(self, F=None, N=None):
+        """
+        Print a table of the task statistics since the reactor started, ordered by their
+        cumulative execution time. N limits the number of tasks listed.
+        """
+        if F is None:
+            F = sys.stdout
+        total = ProfileInterval(self.total.mtime_start)
+        total.merge(self.total)
+        total.merge(self.current)
+
+        def ms(val_s):
+            if val_s is None:
+                return "-"
+            return "{0:.3f}".format(1e3 * val_s)
+
+        print("reactor profile", file=F)
+        for label, hist in [("wait", total.wait_hist), ("run", total.run_hist)]:
+            print(
+                "  {0:>4} [ms]: count {1}, mean {2}, p50 {3}, p99 {4}, p99.9 {5}, max {6}".format(
+                    label,
+                    hist.count,
+                    ms(hist.mean()),
+                    ms(hist.percentile(50)),
+                    ms(hist.percentile(99)),
+                    ms(hist.percentile(99.9)),
+                    ms(hist.max_s),
+                ),
+                file=F,
+            )
+        print(
+            "  heap depth max {0}, loop skips {1}".format(total.depth_max, total.skips),
+            file=F,
+        )
+        for name, stats in sorted(total.lanes.items()):
+            print(
+                "  lane {0:>12}: runs {1}, total {2} ms, wait max {3} ms".format(
+                    name,
+                    stats.runs,
+                    ms(stats.total_s),
+                    ms(stats.wait_max_s),
+                ),
+                file=F,
+            )
+        print(
+            "  {0:>10} {1:>12} {2:>10} {3:>10} {4:>12} {5:>6}  {6}".format(
+                "runs", "total [ms]", "mean [ms]", "max [ms]", "wait max [ms]", "skips", "task"
+            ),
+            file=F,
+        )
+        tasks = total.top_tasks(N=len(total.tasks) if N is None else N)
+        for name, stats in tasks:
+            print(
+                "  {0:>10} {1:>12} {2:>10} {3:>10} {4:>12} {5:>6}  {6}".format(
+                    stats.runs,
+                    ms(stats.total_s),
+                    ms(stats.total_s / max(stats.runs, 1)),
+                    ms(stats.max_s),
+                    ms(stats.wait_max_s),
+                    stats.skips,
+                    name,
+                ),
+                file=F,
+            )
+        return
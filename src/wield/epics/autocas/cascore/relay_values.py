@@ -9,6 +9,9 @@
 """
 
 
+import math
+import threading
+import contextlib
 import numpy as np
 from wield import declarative
 
@@ -19,12 +22,109 @@ from declarative import (
 
 from declarative import RelayValue as RelayValueDecl
 
+# the default of assumed_value in register, as in declarative. Also the key excluding no callbacks
+_UNIQUE = ("UNIQUE",)
+
+# holds the RelayBatch of each thread within batch
+_batch_local = threading.local()
+
+
+class RelayBatch(object):
+    """
+    Transaction of relay updates, see batch. Relays put within it store their new values, but defer
+    their callbacks into pending, keyed by the relay with its value before the batch. On exit, the
+    callbacks of each relay with a changed value are called once, with its final value. Relays put
+    by those callbacks, such as derived ones, are deferred into the same flush. The functions given
+    to after are then called once each, for backends to publish together.
+    """
+
+    __slots__ = ("pending", "afters")
+
+    def __init__(self):
+        self.pending = dict()
+        self.afters = dict()
+
+    def defer(self, rv, value_before, key):
+        pending = self.pending.get(rv, None)
+        if pending is None:
+            self.pending[rv] = (value_before, key)
+        elif pending[1] is not key:
+            # excluded only if every put excluded it
+            self.pending[rv] = (pending[0], _UNIQUE)
+        return
+
+    def after(self, func):
+        """
+        Call func once as the batch exits, after the relay callbacks
+        """
+        self.afters[func] = True
+        return
+
+    def flush(self):
+        pending = self.pending
+        afters = self.afters
+        while pending or afters:
+            while pending:
+                rv = next(iter(pending))
+                value_before, key = pending.pop(rv)
+                if _value_changed(rv.value, value_before):
+                    rv._fanout_now(key)
+            while afters:
+                func = next(iter(afters))
+                del afters[func]
+                func()
+        return
+
+
+def _value_changed(value, value_before):
+    if value_before is _UNIQUE:
+        return True
+    try:
+        changed = value != value_before
+    except ValueError:
+        # arrays of different shapes
+        return True
+    if changed is True or changed is False:
+        return changed
+    return bool(np.any(changed))
+
+
+def batch_active():
+    """
+    The RelayBatch of this thread, or None outside of batch
+    """
+    return getattr(_batch_local, "batch", None)
+
+
+@contextlib.contextmanager
+def batch():
+    """
+    Context deferring the callbacks of the relays put within it, in this thread, until it exits.
+    Each relay then calls its callbacks once, if its value changed, so that dependent relays and
+    the CA backends see one consistent update. Nested batches join the outermost.
+    """
+    current = getattr(_batch_local, "batch", None)
+    if current is not None:
+        yield current
+        return
+    current = RelayBatch()
+    _batch_local.batch = current
+    try:
+        yield current
+    finally:
+        try:
+            current.flush()
+        finally:
+            _batch_local.batch = None
+
 
 class CASRelay(object):
     """
     Mixin class to indicate that defaults exist for the CAS DB registration
     """
 
+    __slots__ = ()
+
     def db_defaults(self):
         return {
             "value": self.value,
@@ -32,6 +132,190 @@ class CASRelay(object):
             "burt": True,
         }
 
+    def _fanout(self, value_before, key):
+        """
+        Call the callbacks other than key, or defer them into the batch
+        """
+        current = getattr(_batch_local, "batch", None)
+        if current is None:
+            self._fanout_now(key)
+        else:
+            current.defer(self, value_before, key)
+        return
+
+
+class RelayValueBatched(CASRelay, RelayValueDecl):
+    """
+    RelayValue calling its callbacks through _fanout, to be deferred within batch
+    """
+
+    def _fanout_now(self, key):
+        value = self._value
+        for cb_key, cb in list(self.callbacks.items()):
+            if cb_key is not key:
+                cb(value)
+        return
+
+    def put(self, val):
+        if np.any(val != self._value):
+            val = self.validator(val)
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, _UNIQUE)
+        return
+
+    def put_exclude_cb(self, val, key):
+        if val != self._value:
+            val = self.validator(val)
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, key)
+        return
+
+    def put_coerce(self, val):
+        if np.any(val != self._value):
+            return self.put_coerce_exclude_cb(val, _UNIQUE)
+        return True
+
+    def put_coerce_exclude_cb(self, val, key):
+        if np.any(val != self._value):
+            try:
+                val = self.validator(val)
+                retval = True
+            except RelayValueCoerced as E:
+                val = E.preferred
+                retval = False
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, key)
+            return retval
+        return True
+
+    def put_valid(self, val):
+        self.put_valid_exclude_cb(val, _UNIQUE)
+        return
+
+    def put_valid_exclude_cb(self, val, key):
+        if np.any(val != self._value):
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, key)
+        return
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self.put(val)
+        return
+
+
+class RelayBoolBatched(CASRelay, declarative.RelayBool):
+    """
+    RelayBool calling its callbacks through _fanout, to be deferred within batch
+    """
+
+    def _fanout_now(self, key):
+        if self._assign_protect is not None:
+            raise RuntimeError("Assign Assigned during assign!")
+        state = self.state
+        self._assign_protect = state
+        try:
+            for cb_key, callback in list(self.callbacks_ontoggle.items()):
+                if key != cb_key:
+                    callback(state)
+        finally:
+            self._assign_protect = None
+        return
+
+    def put(self, value):
+        self.put_exclude_cb(value, _UNIQUE)
+        return
+
+    def put_exclude_cb(self, value, key):
+        if bool(value) != bool(self.state):
+            value_before = self.state
+            self.state = not value_before
+            self._fanout(value_before, key)
+        return
+
+    def assign_on(self):
+        self.put(True)
+        return
+
+    def assign_off(self):
+        self.put(False)
+        return
+
+    def assign_toggle(self):
+        self.put(not self.state)
+        return
+
+
+# statuses of validate, which returns (status, value) rather than raising
+VALUE_VALID = 0
+VALUE_COERCED = 1
+VALUE_REJECTED = 2
+
+
+def validate_raise(status, value):
+    """
+    Translate the (status, value) of validate into the validator exceptions
+    """
+    if status == VALUE_VALID:
+        return value
+    elif status == VALUE_COERCED:
+        raise RelayValueCoerced(value)
+    raise RelayValueRejected()
+
+
+class CASRelayValidate(CASRelay):
+    """
+    Mixin for relays implementing validate(value), which returns (VALUE_VALID, value),
+    (VALUE_COERCED, preferred) or (VALUE_REJECTED, None) without raising. The validator of the
+    declarative relays is then a compatibility shim raising RelayValueCoerced and
+    RelayValueRejected. Use relay_validate to get the validate of any relay.
+    """
+
+    __slots__ = ()
+
+    def validate(self, value):
+        return VALUE_VALID, value
+
+    def validator(self, value):
+        return validate_raise(*self.validate(value))
+
+
+def _validate_any(value):
+    return VALUE_VALID, value
+
+
+def relay_validate(rv):
+    """
+    The validate function of the relay rv. Relays with validators raising the exceptions, such
+    as those given to the constructor or overridden in subclasses, are wrapped. None for relays
+    without a validator, such as the booleans.
+    """
+    validator = getattr(rv, "validator", None)
+    if validator is None:
+        return None
+    if getattr(validator, "__func__", None) is CASRelayValidate.validator:
+        return rv.validate
+    if validator is RelayValueDecl.validator:
+        return _validate_any
+
+    def validate(value):
+        try:
+            return VALUE_VALID, validator(value)
+        except RelayValueCoerced as E:
+            return VALUE_COERCED, E.preferred
+        except RelayValueRejected:
+            return VALUE_REJECTED, None
+
+    return validate
+
 
 class CASRelayBoolTF(CASRelay):
     """
@@ -79,17 +363,17 @@ class CASRelayBoolRO(CASRelay):
         }
 
 
-class RelayValueFloat(CASRelay, RelayValueDecl):
-    def validator(self, value):
+class RelayValueFloat(CASRelayValidate, RelayValueBatched):
+    def validate(self, value):
         try:
             new_val = float(value)
         except ValueError:
-            raise RelayValueRejected()
-        if not np.isfinite(new_val):
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
+        if not math.isfinite(new_val):
+            return VALUE_REJECTED, None
         if new_val != value:
-            raise RelayValueCoerced(new_val)
-        return new_val
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def db_defaults(self):
         return {
@@ -101,27 +385,27 @@ class RelayValueFloat(CASRelay, RelayValueDecl):
 
 
 class RelayValueFloatLowHighMod(RelayValueFloat):
-    def validator(self, value):
+    def validate(self, value):
         try:
             new_val = float(value)
         except ValueError:
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
 
         if self.modulo is not None:
             eps = self.modulo * 1e-8
             new_val = ((new_val + eps) - (new_val + eps) % self.modulo)
 
         if self.high_limit is not None and (new_val > self.high_limit):
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
 
         if self.low_limit is not None and (new_val < self.low_limit):
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
 
-        if not np.isfinite(new_val):
-            raise RelayValueRejected()
+        if not math.isfinite(new_val):
+            return VALUE_REJECTED, None
         if new_val != value:
-            raise RelayValueCoerced(new_val)
-        return new_val
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def __init__(
         self,
@@ -150,15 +434,15 @@ class RelayValueFloatLowHighMod(RelayValueFloat):
         }
 
 
-class RelayValueInt(CASRelay, RelayValueDecl):
-    def validator(self, value):
+class RelayValueInt(CASRelayValidate, RelayValueBatched):
+    def validate(self, value):
         try:
             new_val = int(value)
         except ValueError:
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
         if new_val != value:
-            raise RelayValueCoerced(new_val)
-        return new_val
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def db_defaults(self):
         return {
@@ -169,15 +453,15 @@ class RelayValueInt(CASRelay, RelayValueDecl):
         }
 
 
-class RelayValueString(CASRelay, RelayValueDecl):
-    def validator(self, value):
+class RelayValueString(CASRelayValidate, RelayValueBatched):
+    def validate(self, value):
         try:
             new_val = str(value)[:40]
         except ValueError:
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
         if new_val != value:
-            raise RelayValueCoerced(new_val)
-        return new_val
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def db_defaults(self):
         return {
@@ -188,17 +472,17 @@ class RelayValueString(CASRelay, RelayValueDecl):
         }
 
 
-class RelayValueLongString(CASRelay, RelayValueDecl):
+class RelayValueLongString(CASRelayValidate, RelayValueBatched):
     max_length = 100
 
-    def validator(self, value):
+    def validate(self, value):
         try:
             new_val = str(value)[: self.max_length]
         except ValueError:
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
         if new_val != value:
-            raise RelayValueCoerced(new_val)
-        return new_val
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def db_defaults(self):
         return {
@@ -210,20 +494,19 @@ class RelayValueLongString(CASRelay, RelayValueDecl):
         }
 
 
-class RelayValueWaveform(CASRelay, RelayValueDecl):
+class RelayValueWaveform(CASRelayValidate, RelayValueBatched):
     max_length = 100
 
-    def validator(self, value):
+    def validate(self, value):
         try:
             new_val = np.asarray(value, float)[: self.max_length]
         except ValueError:
-            raise RelayValueRejected()
+            return VALUE_REJECTED, None
         if not np.all(np.isfinite(new_val)):
-            raise RelayValueRejected()
-        if new_val != value:
-            raise RelayValueCoerced(new_val)
-        # TODO catch shape mismatch and convert to Coerced
-        return new_val
+            return VALUE_REJECTED, None
+        if new_val.shape != np.shape(value) or np.any(new_val != value):
+            return VALUE_COERCED, new_val
+        return VALUE_VALID, new_val
 
     def db_defaults(self):
         return {
@@ -235,34 +518,169 @@ class RelayValueWaveform(CASRelay, RelayValueDecl):
         }
 
 
-class RelayValueEnum(CASRelay, RelayValueDecl):
+class RelayWaveform(CASRelayValidate, RelayValueDecl):
+    """
+    Waveform relay for long arrays, such as spectra and stream buffers.
+
+    The data live in a preallocated buffer of max_length elements with a fixed dtype, and the
+    value is a view of its first length elements. Assignments are copied into the buffer, with no
+    elementwise comparison to the previous value, so every assignment notifies the callbacks.
+    Each change increments version, which is the cheap way to check for new data.
+
+    To update in-place, write into buffer and then call changed. Since the value is a view of the
+    buffer, copy it to keep a snapshot.
+    """
+
+    # supported dtypes and their CAS types
+    dtypes = {
+        np.dtype(np.float64): "float",
+        np.dtype(np.int32): "int",
+        np.dtype(np.uint8): "char",
+    }
+
+    def __init__(self, max_length, dtype=float, initial_value=None):
+        dtype = np.dtype(dtype)
+        if dtype not in self.dtypes:
+            raise RuntimeError(
+                "RelayWaveform dtype must be one of {0}".format(
+                    [str(dt) for dt in self.dtypes]
+                )
+            )
+        self.max_length = max_length
+        self.buffer = np.zeros(max_length, dtype=dtype)
+        self.length = 0
+        self.version = 0
+        super(RelayWaveform, self).__init__(self.buffer[:0])
+        if initial_value is not None:
+            self._assign(self.validator(initial_value))
+        return
+
+    def validate(self, value):
+        try:
+            new_val = np.asarray(value, dtype=self.buffer.dtype)
+        except (ValueError, TypeError):
+            return VALUE_REJECTED, None
+        if new_val.ndim != 1:
+            return VALUE_REJECTED, None
+        if len(new_val) > self.max_length:
+            return VALUE_COERCED, new_val[: self.max_length]
+        return VALUE_VALID, new_val
+
+    def _assign(self, value):
+        N = len(value)
+        buffer = self.buffer
+        # skip the copy if already written in-place
+        if not (
+            isinstance(value, np.ndarray)
+            and value.base is buffer
+            and value.ctypes.data == buffer.ctypes.data
+        ):
+            buffer[:N] = value
+        if N != self.length:
+            self.length = N
+        self._value = buffer[:N]
+        self.version += 1
+        return self._value
+
+    def _fanout_now(self, key):
+        value = self._value
+        for cb_key, cb in list(self.callbacks.items()):
+            if cb_key is not key:
+                cb(value)
+        return
+
+    def _notify(self, key=_UNIQUE):
+        # every assignment notifies, the values are not compared
+        self._fanout(_UNIQUE, key)
+        return
+
+    def changed(self, length=None):
+        """
+        Notify the callbacks after writing into buffer in-place. length sets the number of valid
+        elements, which otherwise stays the same.
+        """
+        if length is None:
+            length = self.length
+        self._assign(self.buffer[:length])
+        self._notify()
+        return
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self.put(val)
+        return
+
+    def put(self, val):
+        self._assign(self.validator(val))
+        self._notify()
+        return
+
+    def put_exclude_cb(self, val, key):
+        self._assign(self.validator(val))
+        self._notify(key)
+        return
+
+    def put_coerce(self, val):
+        return self.put_coerce_exclude_cb(val, _UNIQUE)
+
+    def put_coerce_exclude_cb(self, val, key):
+        status, val = self.validate(val)
+        if status == VALUE_REJECTED:
+            raise RelayValueRejected()
+        self._assign(val)
+        self._notify(key)
+        return status == VALUE_VALID
+
+    def put_valid(self, val):
+        self._assign(val)
+        self._notify()
+        return
+
+    def put_valid_exclude_cb(self, val, key):
+        self._assign(val)
+        self._notify(key)
+        return
+
+    def db_defaults(self):
+        return {
+            "value": self.value,
+            "type": self.dtypes[self.buffer.dtype],
+            "rv": self,
+            "count": self.max_length,
+            "burt": False,
+        }
+
+
+class RelayValueEnum(CASRelayValidate, RelayValueBatched):
     """
     Performs silent coercion to the integer state
     """
 
-    def validator(self, value):
+    def validate(self, value):
         if isinstance(value, str):
             try:
                 new_val = self.state2int[value]
-                return new_val
+                return VALUE_VALID, new_val
             except KeyError:
-                raise RelayValueRejected()
+                return VALUE_REJECTED, None
 
         else:
             try:
                 new_val = int(value)
             except ValueError:
-                raise RelayValueRejected()
+                return VALUE_REJECTED, None
 
             if new_val != value:
-                raise RelayValueRejected()
+                return VALUE_REJECTED, None
 
-            try:
-                self.int2state[new_val]
-            except KeyError:
-                raise RelayValueRejected()
+            if new_val not in self.int2state:
+                return VALUE_REJECTED, None
 
-            return new_val
+            return VALUE_VALID, new_val
 
     def __init__(self, initial_value, enum_map, validator=None):
         state2int = {}
@@ -312,15 +730,15 @@ class RelayValueEnum(CASRelay, RelayValueDecl):
         }
 
 
-class RelayBool(CASRelayBoolOnOff, declarative.RelayBool):
+class RelayBool(CASRelayBoolOnOff, RelayBoolBatched):
     pass
 
 
-class RelayBoolOnOff(CASRelayBoolOnOff, declarative.RelayBool):
+class RelayBoolOnOff(CASRelayBoolOnOff, RelayBoolBatched):
     pass
 
 
-class RelayBoolTF(CASRelayBoolTF, declarative.RelayBool):
+class RelayBoolTF(CASRelayBoolTF, RelayBoolBatched):
     pass
 
 
@@ -342,3 +760,349 @@ class RelayBoolNotAll(CASRelayBoolRO, declarative.RelayBoolNotAll):
 
 class RelayBoolNotAny(CASRelayBoolRO, declarative.RelayBoolNotAny):
     pass
+
+
+class RelayCompact(CASRelayValidate):
+    """
+    Compact relay for hosting tens of thousands of scalar PVs, with the interface of the declarative
+    RelayValue. Instances have __slots__ rather than a dict, and the callbacks are a flat tuple of
+    (key, callback), rebuilt only when the registrations change, so that puts allocate nothing.
+    The validate of subclasses checks the common value types first. db_defaults fills in a copy
+    of db_template, shared by the class.
+
+    Custom validators aren't supported, subclass instead.
+    """
+
+    __slots__ = ("_value", "_callbacks")
+    db_template = {"burt": True}
+
+    def __init__(self, initial_value):
+        self._callbacks = ()
+        self._value = self.validator(initial_value)
+        return
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self._value)
+
+    @property
+    def callbacks(self):
+        """
+        Copy of the mapping of keys to callbacks
+        """
+        return dict(self._callbacks)
+
+    def register(
+        self,
+        key=None,
+        callback=None,
+        assumed_value=_UNIQUE,
+        call_immediate=False,
+        remove=False,
+    ):
+        if key is None:
+            key = callback
+        if key is None:
+            raise RuntimeError("Key or Callback must be specified")
+        callbacks = dict(self._callbacks)
+        if not remove:
+            callbacks[key] = callback
+            self._callbacks = tuple(callbacks.items())
+            if assumed_value is not _UNIQUE:
+                if self._value != assumed_value:
+                    callback(self._value)
+            elif call_immediate:
+                callback(self._value)
+        else:
+            if assumed_value is not _UNIQUE:
+                if self._value != assumed_value:
+                    callback(assumed_value)
+            del callbacks[key]
+            self._callbacks = tuple(callbacks.items())
+        return
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self.put(val)
+        return
+
+    def _fanout_now(self, key):
+        value = self._value
+        for cb_key, cb in self._callbacks:
+            if cb_key is not key:
+                cb(value)
+        return
+
+    def put(self, val):
+        self.put_exclude_cb(val, _UNIQUE)
+        return
+
+    def put_exclude_cb(self, val, key):
+        if val != self._value:
+            status, val = self.validate(val)
+            if status:
+                validate_raise(status, val)
+            value_before = self._value
+            self._value = val
+            # inlined _fanout
+            current = getattr(_batch_local, "batch", None)
+            if current is not None:
+                current.defer(self, value_before, key)
+                return
+            for cb_key, cb in self._callbacks:
+                if cb_key is not key:
+                    cb(val)
+        return
+
+    def put_coerce(self, val):
+        return self.put_coerce_exclude_cb(val, _UNIQUE)
+
+    def put_coerce_exclude_cb(self, val, key):
+        if val != self._value:
+            status, val = self.validate(val)
+            if status == VALUE_REJECTED:
+                raise RelayValueRejected()
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, key)
+            return status == VALUE_VALID
+        return True
+
+    def put_valid(self, val):
+        self.put_valid_exclude_cb(val, _UNIQUE)
+        return
+
+    def put_valid_exclude_cb(self, val, key):
+        if val != self._value:
+            value_before = self._value
+            self._value = val
+            self._fanout(value_before, key)
+        return
+
+    def db_defaults(self):
+        db = dict(self.db_template)
+        db["value"] = self._value
+        db["rv"] = self
+        return db
+
+
+class RelayCompactFloat(RelayCompact):
+    """
+    Compact RelayValueFloat
+    """
+
+    __slots__ = ()
+    db_template = {"type": "float", "burt": True}
+
+    def validate(self, value):
+        if type(value) is float:
+            if math.isfinite(value):
+                return VALUE_VALID, value
+            return VALUE_REJECTED, None
+        return RelayValueFloat.validate(self, value)
+
+
+class RelayCompactInt(RelayCompact):
+    """
+    Compact RelayValueInt
+    """
+
+    __slots__ = ()
+    db_template = {"type": "int", "burt": True}
+
+    def validate(self, value):
+        if type(value) is int:
+            return VALUE_VALID, value
+        return RelayValueInt.validate(self, value)
+
+
+class RelayCompactString(RelayCompact):
+    """
+    Compact RelayValueString
+    """
+
+    __slots__ = ()
+    db_template = {"type": "string", "burt": True}
+
+    def validate(self, value):
+        if type(value) is str and len(value) <= 40:
+            return VALUE_VALID, value
+        return RelayValueString.validate(self, value)
+
+
+class RelayArrayElement(RelayCompact):
+    """
+    Element of a RelayArrayFloatLowHighMod, an ordinary float relay to host as a PV, with its
+    value held in the vector of the bank
+    """
+
+    __slots__ = ("bank", "idx")
+    db_template = {"type": "float", "burt": True}
+
+    def __init__(self, bank, idx):
+        self.bank = bank
+        self.idx = idx
+        self._callbacks = ()
+        return
+
+    @property
+    def _value(self):
+        return float(self.bank.values[self.idx])
+
+    @_value.setter
+    def _value(self, value):
+        self.bank.values[self.idx] = value
+        return
+
+    def __repr__(self):
+        return "{0}({1!r}, {2})".format(self.__class__.__name__, self.bank, self.idx)
+
+    def validate(self, value):
+        if type(value) is float and self.bank.modulo is None:
+            bank = self.bank
+            if not math.isfinite(value):
+                return VALUE_REJECTED, None
+            if bank.high_limit is not None and value > bank.high_limit:
+                return VALUE_REJECTED, None
+            if bank.low_limit is not None and value < bank.low_limit:
+                return VALUE_REJECTED, None
+            return VALUE_VALID, value
+        return RelayValueFloatLowHighMod.validate(self.bank, value)
+
+    def db_defaults(self):
+        db = super(RelayArrayElement, self).db_defaults()
+        db.update(self.bank.db_limits())
+        return db
+
+
+class RelayArrayFloatLowHighMod(object):
+    """
+    Bank of N float relays sharing the low, high and modulo limits of RelayValueFloatLowHighMod,
+    such as for banks of DAC setpoints. The values are held in the numpy vector values, and each
+    element, from indexing the bank, is a relay to host with cas_host as its own PV.
+
+    validate_many and put_many check and coerce whole vectors of setpoints with numpy
+    operations, rather than calling the validator of each element.
+    """
+
+    def __init__(
+        self,
+        N,
+        initial_value=0,
+        low=None,
+        high=None,
+        modulo=None,
+    ):
+        self.low_limit = low
+        self.high_limit = high
+        self.modulo = modulo
+        self.values = np.zeros(N, dtype=float)
+        self.elements = [RelayArrayElement(self, idx) for idx in range(N)]
+        status, values = self.validate_many(np.broadcast_to(initial_value, (N,)))
+        if np.any(status == VALUE_REJECTED):
+            raise RuntimeError("initial_value rejected by the limits of the bank")
+        self.values[:] = values
+        return
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __getitem__(self, idx):
+        return self.elements[idx]
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __repr__(self):
+        return "{0}({1}, low={2}, high={3}, modulo={4})".format(
+            self.__class__.__name__, len(self), self.low_limit, self.high_limit, self.modulo
+        )
+
+    def db_limits(self):
+        return {
+            "lolim": self.low_limit,
+            "hilim": self.high_limit,
+            "low": self.low_limit,
+            "high": self.high_limit,
+            "lolo": self.low_limit,
+            "hihi": self.high_limit,
+        }
+
+    def validate_many(self, values):
+        """
+        Vector form of the validate of RelayValueFloatLowHighMod. Returns the arrays (status,
+        values), the values of the rejected elements being nan.
+        """
+        values_in = values
+        values = np.asarray(values)
+        try:
+            new_vals = values.astype(float)
+        except (ValueError, TypeError):
+            # any unconvertible element, so check each
+            results = [RelayValueFloatLowHighMod.validate(self, value) for value in values_in]
+            status = np.array([result[0] for result in results])
+            new_vals = np.array(
+                [np.nan if result[1] is None else result[1] for result in results]
+            )
+            return status, new_vals
+
+        with np.errstate(invalid="ignore"):
+            modulo = self.modulo
+            if modulo is not None:
+                eps = modulo * 1e-8
+                new_vals = (new_vals + eps) - (new_vals + eps) % modulo
+
+            rejected = ~np.isfinite(new_vals)
+            if self.high_limit is not None:
+                rejected |= new_vals > self.high_limit
+            if self.low_limit is not None:
+                rejected |= new_vals < self.low_limit
+            if values.dtype.kind in "biuf":
+                coerced = new_vals != values
+            else:
+                coerced = np.ones(len(new_vals), dtype=bool)
+
+        status = np.where(coerced, VALUE_COERCED, VALUE_VALID)
+        status[rejected] = VALUE_REJECTED
+        new_vals[rejected] = np.nan
+        return status, new_vals
+
+    def put_many(self, values, idxs=None, key=_UNIQUE):
+        """
+        Validate and assign values to the elements idxs, or to every element. As with
+        put_coerce, coerced values are assigned, while rejected elements keep their value.
+        The elements with changed values call their callbacks, other than key, together within a
+        batch. Returns the status of each value.
+        """
+        status, new_vals = self.validate_many(values)
+        if idxs is None:
+            idxs = np.arange(len(self.elements))
+        else:
+            idxs = np.asarray(idxs)
+        accepted = status != VALUE_REJECTED
+        idxs = idxs[accepted]
+        new_vals = new_vals[accepted]
+        values_before = self.values[idxs]
+        changed = values_before != new_vals
+        idxs = idxs[changed]
+        values_before = values_before[changed]
+        new_vals = new_vals[changed]
+        self.values[idxs] = new_vals
+
+        elements = self.elements
+        current = batch_active()
+        if current is not None:
+            for idx, value_before in zip(idxs.tolist(), values_before.tolist()):
+                current.defer(elements[idx], value_before, key)
+            return status
+        # each element changed once, so the callbacks are called directly, within a batch for the
+        # relays they put and the backends to publish together
+        with batch():
+            for idx, value in zip(idxs.tolist(), new_vals.tolist()):
+                for cb_key, cb in elements[idx]._callbacks:
+                    if cb_key is not key:
+                        cb(value)
+        return status
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+Worker threads that take blocking device I/O off of the reactor thread.
+"""
+import collections
+import threading
+import functools
+
+
+class BusWorker(object):
+    """
+    Runs jobs for a single physical bus on its own thread, one at a time and in submission order,
+    so that each bus is serialized while independent buses run in parallel.
+
+    A job holds the reactor task_lock while it runs, so it may touch relay values and call into
+    the reactor just as a reactor task would. The lock is only released during calls made through
+    :meth:`call_blocking`, which is where the actual device I/O should happen. A slow readline on
+    one bus then no longer stalls the reactor or the other buses. Relay batches are kept per
+    thread, so a batch opened by a job does not defer the callbacks of the reactor tasks that run
+    during its I/O.
+
+    Exceptions raised by a job are posted back to the reactor and raised from there, as if the
+    job had failed as a reactor task.
+    """
+
+    def __init__(self, reactor, name=None):
+        self.reactor = reactor
+        self.name = name
+        self._cv = threading.Condition(threading.Lock())
+        # maps job to None, an ordered set of the pending jobs
+        self._jobs = collections.OrderedDict()
+        self._thread = None
+        self._local = threading.local()
+        return  # ~__init__
+
+    def submit(self, job):
+        """
+        Queue the nullary callable job to run on the worker thread. A job that is already pending
+        is not queued again.
+        """
+        with self._cv:
+            if job in self._jobs:
+                return
+            self._jobs[job] = None
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run_worker,
+                    name="BusWorker-{0}".format(self.name),
+                    daemon=True,
+                )
+                self._thread.start()
+            else:
+                self._cv.notify()
+        return
+
+    def stop(self):
+        """
+        Stop the worker thread after its current job. Pending jobs are dropped. Does not wait
+        for the thread, as the current job may be waiting on the task_lock held by the caller.
+        """
+        with self._cv:
+            self._jobs.clear()
+            self._thread = None
+            self._cv.notify()
+        return
+
+    def in_worker(self):
+        """
+        True if called from the worker thread
+        """
+        return getattr(self._local, "in_job", False)
+
+    def call_blocking(self, func, *args, **kwargs):
+        """
+        Call func with the task_lock released, if called from a job on the worker thread.
+        Elsewhere (for instance from the reactor thread) it is simply called.
+        """
+        if not self.in_worker():
+            return func(*args, **kwargs)
+        task_lock = self.reactor.task_lock
+        task_lock.release()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            task_lock.acquire()
+
+    def wrap_blocking(self, func):
+        """
+        Wraps func to always be called through call_blocking
+        """
+        return functools.partial(self.call_blocking, func)
+
+    def _run_worker(self):
+        me = threading.current_thread()
+        while True:
+            with self._cv:
+                # a stopped worker is no longer the thread of this object
+                while self._thread is me and not self._jobs:
+                    self._cv.wait()
+                if self._thread is not me:
+                    return
+                job, _ = self._jobs.popitem(last=False)
+
+            self._local.in_job = True
+            try:
+                with self.reactor.task_lock, self.reactor.worker_context():
+                    job()
+            except Exception as E:
+
+                def raise_from_reactor(E=E):
+                    raise E
+
+                self.reactor.send_task(raise_from_reactor)
+            finally:
+                self._local.in_job = False
+        return
@@ -66,7 +66,7 @@ class SerialDevice(SerialUser):
                         RB()
                 for RB in self.SBlist_readbacks:
                     RB()
-                self.reactor.send_task(self.serial.run)
+                self.reactor.send_task(self.serial.run_dispatch)
                 return
 
         self.serial.rb_connected.register(
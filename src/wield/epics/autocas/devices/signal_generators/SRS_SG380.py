@@ -36,7 +36,7 @@ class SRS_SG380(SerialDevice):
                         RB()
                 for RB in self.SBlist_readbacks:
                     RB()
-                self.reactor.send_task(self.serial.run)
+                self.reactor.send_task(self.serial.run_dispatch)
                 return
 
         self.serial.rb_connected.register(
@@ -114,7 +114,11 @@ class USBPrologixGPIB(SerialConnection):
 
     @cascore.dproperty
     def _startup(self):
-        self.reactor.enqueue_looping(self._connect_task, period_s=self.poll_rate_s)
+        self.reactor.enqueue_looping(
+            self._connect_task,
+            period_s=self.poll_rate_s,
+            lane=cascore.LANE_IO,
+        )
 
     def run(self):
         if self._serial_obj is not None:
@@ -126,7 +130,9 @@ class USBPrologixGPIB(SerialConnection):
                 self.rb_connected.assign(False)
                 self.rb_communicating.assign(False)
                 self.reactor.enqueue_looping(
-                    self._connect_task, period_s=self.poll_rate_s
+                    self._connect_task,
+                    period_s=self.poll_rate_s,
+                    lane=cascore.LANE_IO,
                 )
         else:
             # TODO, print warning or something? can't do anything if device isn't connected
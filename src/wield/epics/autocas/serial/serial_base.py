@@ -55,6 +55,23 @@ class SerialConnection(
             parent=self,
         )
 
+    @cascore.dproperty_ctree(default=False)
+    def use_bus_worker(self, val):
+        """
+        Run the block-chains of this connection on its own worker thread. The task lock is
+        released during device I/O, so a slow device does not stall the reactor or other buses.
+        Off by default, since the block-chains then run concurrently with other reactor tasks,
+        which the existing serial devices were not written for.
+        """
+        val = bool(val)
+        return val
+
+    @declarative.dproperty
+    def bus_worker(self):
+        if not self.use_bus_worker:
+            return None
+        return self.reactor.bus_worker(name="_".join(self.prefix))
+
     @declarative.dproperty
     def _block_data(self):
         return dict()
@@ -81,7 +98,9 @@ class SerialConnection(
         self._block_data[blockfunc]
         self._blocks_queued.append(blockfunc)
 
-        self.reactor.enqueue(self.run, future_s=0.1, limit_s=1)
+        self.reactor.enqueue(
+            self.run_dispatch, future_s=0.1, limit_s=1, lane=cascore.LANE_IO
+        )
         return
 
     def queue_clear(self):
@@ -111,7 +130,9 @@ class SerialConnection(
             This object is used as a bfunc-key for ordering purposes. It may be called to enqueue itself
             """
             self.block_enqueue(block_func)
-            self.reactor.enqueue(self.run, future_s=0.5)
+            self.reactor.enqueue(
+                self.run_dispatch, future_s=0.5, lane=cascore.LANE_IO
+            )
 
         if name is not None:
             if prefix is not None:
@@ -131,6 +152,28 @@ class SerialConnection(
         # TODO check that the chains are also block-functions
         self._block_data[bfunc]["chain"].extend(chains)
 
+    def run_dispatch(self):
+        """
+        Reactor task to run the queued block-chains, either on the bus worker or inline
+        """
+        if self.bus_worker is None:
+            return self.run()
+        self.bus_worker.submit(self.run)
+        return
+
+    def cmd_object_blocking(self):
+        """
+        The cmd_object, with its I/O methods called through the bus worker so that they release
+        the task lock
+        """
+        cmd = self.cmd_object()
+        if self.bus_worker is None:
+            return cmd
+        for k, v in list(cmd.items()):
+            if callable(v):
+                cmd[k] = self.bus_worker.wrap_blocking(v)
+        return cmd
+
     def run(self):
         """
         generates the block-chain run tree and serial command object through the block-parents and chains. Doesn't need to check for parent loop because that is prevented currently
@@ -160,7 +203,7 @@ class SerialConnection(
             if bparent is not None:
                 stack.append(bparent)
 
-        cmd = self.cmd_object()
+        cmd = self.cmd_object_blocking()
         # utilities.dprint(plists)
 
         # get first list
@@ -180,8 +223,12 @@ class SerialConnection(
                 if not was_called[0]:
                     remainder_call()
 
-        # call on the root parent
-        block_call(None)
+        # call on the root parent. The readbacks of the blocks are published together as it
+        # completes. The batch belongs to this thread, so on the bus worker, reactor tasks that
+        # run while the task lock is released for I/O are not deferred into it. They do see the
+        # readbacks assigned so far, whose callbacks only run once the chain completes.
+        with self.batch():
+            block_call(None)
         # the block list is a sequence of bfunc, list pairs. The bfunc serial functions are called and any associated inner blocks are in the following sequence
         self.rb_running.assign(False)
 
@@ -232,6 +279,9 @@ class SerialSubBlock(
     def cmd_object(self):
         return self.serial.cmd_object()
 
+    def run_dispatch(self):
+        return self.serial.run_dispatch()
+
     def block_enqueue(self, blockfunc):
         return self.serial.block_enqueue(blockfunc)
 
@@ -167,7 +167,11 @@ class AutoSave(autosave_base.AutoSaveBase):
         if self._future_savesnap is None or window_s < self._future_savesnap:
             self._future_savesnap = window_s
             # push the rolling time ahead a bit in the queue to meet the urgency requirement
-            self.reactor.enqueue(self.save_snap_rolling, future_s=window_s)
+            self.reactor.enqueue(
+                self.save_snap_rolling,
+                future_s=window_s,
+                lane=cascore.LANE_HOUSEKEEPING,
+            )
         return
 
     @declarative.callbackmethod
@@ -247,4 +251,5 @@ class AutoSave(autosave_base.AutoSaveBase):
             self.reactor.enqueue_looping(
                 self.save_snap_rolling,
                 period_s=self.save_rate_s,
+                lane=cascore.LANE_HOUSEKEEPING,
             )
@@ -106,6 +106,8 @@ class AutoSaveBase(cascore.CASUser):
             else:
                 PV_vals[pv] = val
 
+        # elements of relay arrays, loaded together by their bank
+        banks = dict()
         for pv, pvRO in self._my_chnlist:
             if pvRO:
                 val = ROPV_vals.get(pv, None)
@@ -129,8 +131,16 @@ class AutoSaveBase(cascore.CASUser):
                 continue
 
             # TODO, make the internal/remote save decision better
-            remote = self._my_pvdb[pv].get("remote", False)
+            db_entry = self._my_pvdb[pv]
+            remote = db_entry.get("remote", False)
             if not remote:
+                rv = db_entry["rv"]
+                if (
+                    isinstance(rv, cascore.RelayArrayElement)
+                    and db_entry["interaction"] != "report"
+                ):
+                    banks.setdefault(rv.bank, []).append((rv.idx, pv, val))
+                    continue
                 did_write = self._my_casdriver.write_sync_typecast(pv, val)
                 if not did_write:
                     print(
@@ -138,6 +148,17 @@ class AutoSaveBase(cascore.CASUser):
                             pv, val
                         )
                     )
+
+        for bank, loads in banks.items():
+            idxs, pvs, vals = zip(*loads)
+            status = bank.put_many(vals, idxs=idxs)
+            for pv, val, pv_status in zip(pvs, vals, status):
+                if pv_status == cascore.VALUE_REJECTED:
+                    print(
+                        'WARNING, write failed loading non-RO PV: "{0}" with value {1}'.format(
+                            pv, val
+                        )
+                    )
         return
 
     def save_snap_file_raw(self, fobj):
@@ -8,6 +8,8 @@
 """
 """
 
+import sys
+from wield.bunch import Bunch
 
 from .. import cascore
 from . import cas_time
@@ -31,10 +33,12 @@ class ProgramStatus(cascore.CASUser):
     reactor latency
     reactor queue depth
     last reactor fault
+    reactor task profile (busiest task, loop skips, dump command)
 
     last burt time
 
     number of missing remote PVs, with names for first 5 missing.
+    busiest remote PVs, by rate of updates and puts
     number of hosted PVs
     hostname
     version
@@ -78,6 +82,212 @@ class ProgramStatus(cascore.CASUser):
         )
         return rv
 
+    @cascore.dproperty_ctree(default=10)
+    def reactor_profile_period_s(self, val):
+        """
+        Period in seconds to update the reactor profile PVs. Each update covers the tasks run
+        since the previous one.
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cascore.dproperty_ctree(default=None)
+    def reactor_profile_dump_fname(self, val):
+        """
+        File to append the reactor profile table to when REACTOR_PROF_DUMP is set. Printed to
+        stdout if not specified.
+        """
+        return val
+
+    @cascore.dproperty_ctree(default=1000)
+    def reactor_starve_ms(self, val):
+        """
+        A reactor lane is reported as starved when a task waits longer than this to run
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cascore.dproperty
+    def rv_reactor_starved(self):
+        rv = cascore.RelayValueInt(0)
+        self.cas_host(
+            rv,
+            "REACTOR_STARVED",
+            unit="number",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_lanes(self):
+        """
+        dict of lane name to a Bunch of the wait and depth relay values of that lane
+        """
+        rvs = dict()
+        for name in self.reactor.lane_names():
+            rv_wait = cascore.RelayValueFloat(-1)
+            self.cas_host(
+                rv_wait,
+                "REACTOR_LANE_{0}_WAIT_MS".format(name.upper()),
+                unit="milliseconds",
+                interaction="report",
+            )
+            rv_depth = cascore.RelayValueInt(0)
+            self.cas_host(
+                rv_depth,
+                "REACTOR_LANE_{0}_DEPTH".format(name.upper()),
+                unit="number",
+                interaction="report",
+            )
+            rvs[name] = Bunch(wait_ms=rv_wait, depth=rv_depth)
+        return rvs
+
+    @cascore.dproperty
+    def rv_reactor_latency_max_ms(self):
+        rv = cascore.RelayValueFloat(-1)
+        self.cas_host(
+            rv,
+            "REACTOR_LAT_MAX_MS",
+            unit="milliseconds",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_busy(self):
+        rv = cascore.RelayValueFloat(-1)
+        self.cas_host(
+            rv,
+            "REACTOR_BUSY",
+            unit="percentage",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_skips(self):
+        rv = cascore.RelayValueInt(0)
+        self.cas_host(
+            rv,
+            "REACTOR_SKIPS",
+            unit="number",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_top_task(self):
+        rv = cascore.RelayValueLongString("")
+        self.cas_host(
+            rv,
+            "REACTOR_TOP_TASK",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_top_task_ms(self):
+        rv = cascore.RelayValueFloat(-1)
+        self.cas_host(
+            rv,
+            "REACTOR_TOP_TASK_MS",
+            unit="milliseconds",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rv_reactor_top_task_max_ms(self):
+        rv = cascore.RelayValueFloat(-1)
+        self.cas_host(
+            rv,
+            "REACTOR_TOP_TASK_MAX_MS",
+            unit="milliseconds",
+            interaction="report",
+        )
+        return rv
+
+    @cascore.dproperty
+    def rb_reactor_profile_dump(self):
+        rb = cascore.RelayBool(False)
+        self.cas_host(
+            rb,
+            "REACTOR_PROF_DUMP",
+            interaction="command",
+        )
+
+        def _dump_clear():
+            rb.value = False
+
+        def _dump_action(value):
+            if value:
+                self.reactor_profile_dump()
+                self.reactor.send_task(_dump_clear)
+
+        rb.register(callback=_dump_action)
+        return rb
+
+    def reactor_profile_dump(self):
+        """
+        Print the reactor profile table since startup to reactor_profile_dump_fname or stdout
+        """
+        if self.reactor_profile_dump_fname is None:
+            self.reactor.profile_dump(F=sys.stdout)
+        else:
+            with open(self.reactor_profile_dump_fname, "a") as F:
+                self.reactor.profile_dump(F=F)
+        return
+
+    def reactor_profile_update(self):
+        mtime_now = self.reactor.time()
+        interval = self.reactor.profile.interval(mtime_now)
+        duration_s = mtime_now - interval.mtime_start
+        if duration_s <= 0:
+            return
+
+        lat_s = interval.wait_hist.percentile(99)
+        self.rv_reactor_latency_ms.value = -1 if lat_s is None else 1e3 * lat_s
+        self.rv_reactor_latency_max_ms.value = 1e3 * interval.wait_hist.max_s
+        self.rv_reactor_rate.value = int(interval.run_hist.count / duration_s)
+        self.rv_reactor_fill.value = interval.depth_max
+        self.rv_reactor_busy.value = 100 * interval.run_hist.total_s / duration_s
+        self.rv_reactor_skips.value = interval.skips
+
+        # a starved lane may not have run at all, so its waiting tasks are checked as well
+        starved = 0
+        for name, (depth, wait_s) in self.reactor.lane_status().items():
+            lstats = interval.lanes.get(name, None)
+            if lstats is not None:
+                wait_s = max(wait_s or 0, lstats.wait_max_s)
+            elif wait_s is None:
+                wait_s = 0
+            rvs = self.rv_reactor_lanes.get(name, None)
+            if rvs is not None:
+                rvs.wait_ms.value = 1e3 * wait_s
+                rvs.depth.value = depth
+            if 1e3 * wait_s > self.reactor_starve_ms:
+                starved += 1
+        self.rv_reactor_starved.value = starved
+
+        top = interval.top_tasks(N=1)
+        if top:
+            name, stats = top[0]
+            self.rv_reactor_top_task.put_coerce(name)
+            self.rv_reactor_top_task_ms.value = 1e3 * stats.total_s
+            self.rv_reactor_top_task_max_ms.value = 1e3 * stats.max_s
+        return
+
+    @cascore.dproperty
+    def _reactor_profile_setup(self):
+        self.reactor.enqueue_looping(
+            self.reactor_profile_update,
+            period_s=self.reactor_profile_period_s,
+            lane=cascore.LANE_HOUSEKEEPING,
+        )
+        return
+
     @cascore.dproperty
     def rv_reactor_canary(self):
         dt = cas_time.CASDateTime(parent=self, name="REACTOR_FAULT")
@@ -127,6 +337,74 @@ class ProgramStatus(cascore.CASUser):
         )
         return rv
 
+    @cascore.dproperty_ctree(default=10)
+    def PVs_busiest_period_s(self, val):
+        """
+        Period in seconds to update PVS_BUSIEST
+        """
+        val = float(val)
+        assert val > 0
+        return val
+
+    @cascore.dproperty_ctree(default=3)
+    def PVs_busiest_N(self, val):
+        """
+        Number of the busiest remote channels listed in PVS_BUSIEST
+        """
+        val = int(val)
+        assert val > 0
+        return val
+
+    @cascore.dproperty
+    def rv_PVs_busiest(self):
+        rv = cascore.RelayValueLongString("")
+        self.cas_host(
+            rv,
+            "PVS_BUSIEST",
+            interaction="report",
+        )
+        return rv
+
+    # the CAEpicsClient given to cas_attach
+    _remote = None
+
+    def PVs_busiest_update(self):
+        """
+        List the remote channels with the highest rate of updates and puts, with their rates
+        """
+        busiest = self._remote.busiest_channels(N=self.PVs_busiest_N)
+        self.rv_PVs_busiest.put_coerce(
+            " ".join("{0} {1:.3g}Hz".format(channel, hz) for channel, hz in busiest)
+        )
+        return
+
+    def cas_attach(self, db, remote):
+        """
+        Count the hosted PVs of db, and follow the connection counts of the remote client
+        (a CAEpicsClient) in PVS_MISSING, PVS_BAD and PVS_REMOTE, and its busiest channels in
+        PVS_BUSIEST
+        """
+        self.rv_PVs_hosted.value = sum(
+            1 for db_entry in db.values() if not db_entry.get("remote", False)
+        )
+
+        def update():
+            pending, bad, connected = remote.connection_counts()
+            self.rv_PVs_missing.value = pending
+            self.rv_PVs_bad.value = bad
+            self.rv_PVs_connected.value = connected
+
+        remote.connections_changed.register(callback=update)
+        update()
+
+        self._remote = remote
+        self.reactor.enqueue_looping(
+            self.PVs_busiest_update,
+            period_s=self.PVs_busiest_period_s,
+            lane=cascore.LANE_HOUSEKEEPING,
+        )
+        return
+
     @cascore.dproperty
     def rv_about_hostname(self):
         rv = cascore.RelayValueString("<TODO>")
@@ -31,7 +31,9 @@ class RestartOnEdit(cascore.CASUser):
 
     @cascore.dproperty
     def setup_action(self):
-        self.reactor.enqueue(self._startup_task, future_s=3)
+        self.reactor.enqueue(
+            self._startup_task, future_s=3, lane=cascore.LANE_HOUSEKEEPING
+        )
 
     def _startup_task(self):
         modfiles = modlist(
@@ -52,7 +54,11 @@ class RestartOnEdit(cascore.CASUser):
                 print("inotify error: ", E)
         self._myinotify = inotify
 
-        self.reactor.enqueue_looping(self._loop_check_task, period_s=self.poll_rate_s)
+        self.reactor.enqueue_looping(
+            self._loop_check_task,
+            period_s=self.poll_rate_s,
+            lane=cascore.LANE_HOUSEKEEPING,
+        )
 
     def _loop_check_task(self):
         events = self._myinotify.read(timeout=0)
@@ -8,3 +8,4 @@
 """
 """
 from .heap_priority_queue import HeapPriorityQueue
+from .indexed_heap_priority_queue import IndexedHeapPriorityQueue
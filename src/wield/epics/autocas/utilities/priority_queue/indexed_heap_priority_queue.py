@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: © 2021 Massachusetts Institute of Technology.
+# SPDX-FileCopyrightText: © 2021 Lee McCuller <mcculler@caltech.edu>
+# NOTICE: authors should document their contributions in concisely in NOTICE
+# with details inline in source files, comments, and docstrings.
+"""
+.. autoclass:: IndexedHeapPriorityQueue
+"""
+import itertools
+
+try:
+    import queue as queue
+except ImportError:
+    import Queue as queue
+
+# layout of the heap entries. Entries are small lists so that the position
+# can be updated in place as the entries move through the heap
+_PRIO = 0
+_SEQ = 1
+_KEY = 2
+_ITEM = 3
+_POS = 4
+
+_NOARG = ("NOARG",)
+
+
+def _entry_lt(a, b):
+    """
+    ordering of heap entries. Ties in priority are broken by insertion order
+    so that equal-priority items are FIFO.
+    """
+    if a[_PRIO] < b[_PRIO]:
+        return True
+    elif a[_PRIO] == b[_PRIO]:
+        return a[_SEQ] < b[_SEQ]
+    return False
+
+
+class IndexedHeapPriorityQueue(object):
+    """
+    Binary heap where every item is stored under a (hashable) key. The key acts
+    as a handle so that an item may be re-prioritized or removed in O(log n)
+    rather than left behind in the heap as a dead entry. Each key may only be
+    present once.
+
+    Only the priorities are ever compared, so the items do not need to be
+    orderable. Items with equal priority are returned in insertion order.
+
+    This implementation is **not** threadsafe
+
+    .. automethod:: __init__
+
+    .. automethod:: peek
+
+    .. automethod:: peek_key
+
+    .. automethod:: is_empty
+
+    .. automethod:: pop
+
+    .. automethod:: popitem
+
+    .. automethod:: push
+
+    .. automethod:: set
+
+    .. automethod:: update
+
+    .. automethod:: decrease_key
+
+    .. automethod:: increase_key
+
+    .. automethod:: remove
+
+    .. automethod:: discard
+
+    .. automethod:: priority
+
+    """
+
+    def __init__(self, iterable=()):
+        """
+        :param iterable: iterable of initial (key, priority, item) triples
+        """
+        self.heap = []
+        self.index = {}
+        self._seq = itertools.count()
+        for key, priority, item in iterable:
+            self.push(priority, item, key=key)
+
+    def peek(self):
+        """
+        View the first (priority, item) pair without discarding
+
+        :raises: :exc:`queue.Empty` if no items contained
+        """
+        try:
+            entry = self.heap[0]
+        except IndexError:
+            raise queue.Empty()
+        return entry[_PRIO], entry[_ITEM]
+
+    def peek_key(self):
+        """
+        View the key of the first item without discarding
+
+        :raises: :exc:`queue.Empty` if no items contained
+        """
+        try:
+            return self.heap[0][_KEY]
+        except IndexError:
+            raise queue.Empty()
+
+    def is_empty(self):
+        """
+        Returns True when empty
+        """
+        return not self.heap
+
+    def __nonzero__(self):
+        return bool(self.heap)
+
+    def __bool__(self):
+        return bool(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def priority(self, key):
+        """
+        return the current priority of key
+
+        :raises: :exc:`KeyError` if the key is not queued
+        """
+        return self.index[key][_PRIO]
+
+    def get(self, key, default=None):
+        """
+        return the item stored under key, or default if it is not queued
+        """
+        entry = self.index.get(key, None)
+        if entry is None:
+            return default
+        return entry[_ITEM]
+
+    def pop(self):
+        """
+        return the first (priority, item) pair
+
+        :raises: :exc:`queue.Empty` if no items contained
+        """
+        key, priority, item = self.popitem()
+        return priority, item
+
+    def popitem(self):
+        """
+        return the first (key, priority, item) triple
+
+        :raises: :exc:`queue.Empty` if no items contained
+        """
+        heap = self.heap
+        try:
+            last = heap.pop()
+        except IndexError:
+            raise queue.Empty()
+        if heap:
+            entry = heap[0]
+            heap[0] = last
+            last[_POS] = 0
+            self._sift_down(0)
+        else:
+            entry = last
+        del self.index[entry[_KEY]]
+        return entry[_KEY], entry[_PRIO], entry[_ITEM]
+
+    def push(self, priority, item, key=None):
+        """
+        Add an item to the priority queue. If key is None, an anonymous key is
+        generated. Returns the key, which may be used as the handle for the other
+        methods.
+
+        :raises: :exc:`KeyError` if the key is already queued
+        """
+        if key is None:
+            key = object()
+        elif key in self.index:
+            raise KeyError(key)
+        heap = self.heap
+        entry = [priority, next(self._seq), key, item, len(heap)]
+        self.index[key] = entry
+        heap.append(entry)
+        self._sift_up(entry[_POS])
+        return key
+
+    def set(self, key, priority, item):
+        """
+        Add the item under key, or replace both the priority and item if the
+        key is already queued. A replaced item loses its place among items of
+        equal priority.
+        """
+        entry = self.index.get(key, None)
+        if entry is None:
+            self.push(priority, item, key=key)
+            return
+        entry[_ITEM] = item
+        entry[_SEQ] = next(self._seq)
+        self._reprioritize(entry, priority)
+        return
+
+    def update(self, key, priority, item=_NOARG):
+        """
+        Change the priority (and optionally the item) stored under key in
+        either direction.
+
+        :raises: :exc:`KeyError` if the key is not queued
+        """
+        entry = self.index[key]
+        if item is not _NOARG:
+            entry[_ITEM] = item
+        self._reprioritize(entry, priority)
+        return
+
+    def decrease_key(self, key, priority):
+        """
+        Move the item under key earlier in the queue.
+
+        :raises: :exc:`KeyError` if the key is not queued
+        :raises: :exc:`ValueError` if priority is later than the current one
+        """
+        entry = self.index[key]
+        if priority > entry[_PRIO]:
+            raise ValueError("decrease_key given a larger priority")
+        entry[_PRIO] = priority
+        self._sift_up(entry[_POS])
+        return
+
+    def increase_key(self, key, priority):
+        """
+        Move the item under key later in the queue.
+
+        :raises: :exc:`KeyError` if the key is not queued
+        :raises: :exc:`ValueError` if priority is earlier than the current one
+        """
+        entry = self.index[key]
+        if priority < entry[_PRIO]:
+            raise ValueError("increase_key given a smaller priority")
+        entry[_PRIO] = priority
+        self._sift_down(entry[_POS])
+        return
+
+    def remove(self, key):
+        """
+        Remove the item stored under key, returning its (priority, item) pair.
+
+        :raises: :exc:`KeyError` if the key is not queued
+        """
+        entry = self.index.pop(key)
+        heap = self.heap
+        pos = entry[_POS]
+        last = heap.pop()
+        if last is not entry:
+            heap[pos] = last
+            last[_POS] = pos
+            if _entry_lt(last, entry):
+                self._sift_up(pos)
+            else:
+                self._sift_down(pos)
+        return entry[_PRIO], entry[_ITEM]
+
+    def discard(self, key):
+        """
+        Remove the item stored under key if present. Returns True if an item was removed.
+        """
+        if key not in self.index:
+            return False
+        self.remove(key)
+        return True
+
+    def clear(self):
+        self.heap[:] = []
+        self.index.clear()
+
+    def _reprioritize(self, entry, priority):
+        old = entry[:]
+        entry[_PRIO] = priority
+        if _entry_lt(entry, old):
+            self._sift_up(entry[_POS])
+        else:
+            self._sift_down(entry[_POS])
+
+    def _sift_up(self, pos):
+        heap = self.heap
+        entry = heap[pos]
+        while pos > 0:
+            ppos = (pos - 1) >> 1
+            parent = heap[ppos]
+            if not _entry_lt(entry, parent):
+                break
+            heap[pos] = parent
+            parent[_POS] = pos
+            pos = ppos
+        heap[pos] = entry
+        entry[_POS] = pos
+
+    def _sift_down(self, pos):
+        heap = self.heap
+        N = len(heap)
+        entry = heap[pos]
+        while True:
+            cpos = 2 * pos + 1
+            if cpos >= N:
+                break
+            child = heap[cpos]
+            rpos = cpos + 1
+            if rpos < N and _entry_lt(heap[rpos], child):
+                cpos = rpos
+                child = heap[rpos]
+            if not _entry_lt(child, entry):
+                break
+            heap[pos] = child
+            child[_POS] = pos
+            pos = cpos
+        heap[pos] = entry
+        entry[_POS] = pos
@@ -0,0 +1,77 @@
+"""
+Checks of the PV name index kept by cas_host
+"""
+import logging
+
+from wield import declarative
+from wield.bunch.deep_bunch import DeepBunch
+from wield.epics import autocas
+from wield.epics.autocas.cascore.ctree import ConfigTree
+
+
+class Bank(autocas.CASUser):
+    N = 3
+
+    @declarative.dproperty
+    def rvs(self):
+        rvs = []
+        for idx in range(self.N):
+            rv = autocas.RelayCompactFloat(0.0)
+            self.cas_host(rv, "VAL_{0}".format(idx), interaction="setting")
+            rvs.append(rv)
+        return rvs
+
+
+def test_cas_host_index():
+    root = autocas.InstaCAS(prefix_base="X1", prefix_subsystem="HOST")
+    bank = Bank(parent=root, name="BANK")
+    db = root.cas_db_generate()
+    assert db == root.cas_db_generate()
+    assert db["X1:HOST-BANK_VAL_1"]["rv"] is bank.rvs[1]
+    db["X1:HOST-BANK_VAL_1"]["interaction"] = "report"
+    assert root.rv_db[bank.rvs[1]]["interaction"] == "setting"
+    assert root.cas_db_generate()["X1:HOST-BANK_VAL_1"]["interaction"] == "setting"
+    assert root.channel_rvs["X1:HOST-BANK_VAL_2"] is bank.rvs[2]
+    assert root.channel_name(root.rv_names[bank.rvs[0]]) == "X1:HOST-BANK_VAL_0"
+    hosted = root.channels(remote=False)
+    assert hosted == sorted(hosted)
+    assert "X1:HOST-BANK_VAL_0" in hosted
+    assert root.channels(remote=True) == []
+
+    # hosted later, indexed without changing the db already generated
+    rv = autocas.RelayValueFloat(0)
+    bank.cas_host(rv, "EXTRA", interaction="external", remote=True)
+    assert root.channels(remote=True) == ["X1:HOST-BANK_EXTRA"]
+    assert "X1:HOST-BANK_EXTRA" not in db
+    assert root.cas_db_generate()["X1:HOST-BANK_EXTRA"]["rv"] is rv
+
+    # the same name, even through a different prefix
+    try:
+        bank.cas_host(
+            autocas.RelayValueFloat(0),
+            "OTHER",
+            prefix=["HOST", "BANK", "VAL_1"],
+            interaction="setting",
+        )
+    except RuntimeError as E:
+        assert "X1:HOST-BANK_VAL_1" in str(E)
+    else:
+        assert False
+    assert root.channel_rvs["X1:HOST-BANK_VAL_1"] is bank.rvs[1]
+
+
+def test_cas_host_ctree(caplog):
+    root = autocas.InstaCAS(prefix_base="X1", prefix_subsystem="HOST")
+    bank = Bank(parent=root, name="BANK")
+    bank.rvs
+    bank.cas_host(autocas.RelayValueFloat(0), "LATE", interaction="setting")
+    assert bank.ctree["PVs"]["LATE"]._dict.mydict is bank._ctree_PVs["LATE"]._dict.mydict
+
+    # a subtree holding both configured values and further keys still warns
+    ctree = ConfigTree(DeepBunch())
+    assert ctree["A"].get_configured("B", 1) == 1
+    assert ctree["A"].get_configured("B", 1) == 1
+    ctree._dict["A"]["B"]["C"] = 2
+    with caplog.at_level(logging.WARNING):
+        ctree["A"]["B"]
+    assert "storing a value for this key" in caplog.text
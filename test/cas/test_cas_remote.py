@@ -0,0 +1,222 @@
+"""
+Checks of CAEpicsClient against remote PVs hosted by a shard worker process
+"""
+import time
+import numpy as np
+
+from wield.epics import autocas
+from wield.epics.autocas.cascore import pyepics_backend
+
+
+def test_channel_rates():
+    rates = pyepics_backend.ChannelRates(4, rateconst_s=10)
+    # the scalar EWMA kept per event before
+    expect = dict()
+    for tnow, ids in [(100, [0, 1]), (100.5, [1]), (101, [1, 2]), (101, [2])]:
+        rates.update(ids, tnow)
+        for idx in ids:
+            tintR, tlast = expect.get(idx, (0, 0))
+            tdiff = max(tnow - tlast, 1e-9)
+            weight = np.exp(-tdiff / 10)
+            expect[idx] = ((1 - weight) / tdiff + weight * tintR, tnow)
+    for idx, (tintR, tlast) in expect.items():
+        assert np.isclose(rates.tintR[idx], tintR)
+        assert rates.mtime[idx] == tlast
+    assert list(rates.count) == [1, 3, 2, 0]
+    assert np.allclose(rates.rates(101), rates.tintR * np.exp(-(101 - rates.mtime) / 10))
+
+    ids, hz = rates.top(2, 101)
+    assert list(ids) == [1, 2]
+    assert hz[0] > hz[1]
+    # channels without events are never listed
+    ids, hz = rates.top(10, 101)
+    assert list(ids) == [1, 2, 0]
+
+
+def test_cas_remote_connect(cas_remote_connect):
+    counts = []
+    backoff = []
+
+    def check(client, reactor):
+        def status():
+            counts.append(client.connection_counts())
+            backoff.append(dict(client.epics_connect_retry))
+
+        def values_arrived():
+            for idx in range(20):
+                if client.PV_RV_map["X1:REM-C{0}".format(idx)].value != idx:
+                    return False
+            return True
+
+        # let the missing channel be recreated a few times
+        time.sleep(0.5)
+        t_end = time.time() + 5
+        while time.time() < t_end and not reactor.send_task_synchronous(values_arrived):
+            time.sleep(0.01)
+        reactor.send_task_synchronous(status)
+
+    client, rvs, connect_s = cas_remote_connect(
+        "X1:REM-",
+        20,
+        N_missing=1,
+        check=check,
+        connect_batch_N=7,
+        connect_check_period_s=0.05,
+        connect_backoff_s=0.05,
+    )
+    # external PVs are read into their relays
+    for idx in range(20):
+        assert rvs["X1:REM-C{0}".format(idx)].value == idx
+    assert counts[0] == (1, 0, 20)
+    # only the missing channel retries, with a growing backoff
+    attempts, mtime_next = backoff[0]["X1:REM-C20"]
+    assert list(backoff[0]) == ["X1:REM-C20"]
+    assert 1 <= attempts < 6
+
+
+def test_cas_remote_types(cas_remote_connect):
+    """
+    Remote channels of types or counts the relays can't take are bad
+    """
+    rvs_host = {
+        "X1:REMT-FLOAT": autocas.RelayValueFloat(1.5),
+        "X1:REMT-INT": autocas.RelayValueFloat(2.5),
+        "X1:REMT-WAVE": autocas.RelayWaveform(10, initial_value=np.arange(10.0)),
+        "X1:REMT-WAVE_SHORT": autocas.RelayWaveform(3, initial_value=np.arange(3.0)),
+        "X1:REMT-STR": autocas.RelayValueLongString("remote string"),
+        "X1:REMT-ENUM": autocas.RelayValueEnum(2, ["A", "B", "C"]),
+        "X1:REMT-ENUM_FEW": autocas.RelayValueEnum(1, ["A", "B"]),
+    }
+    rvs_remote = {
+        "X1:REMT-FLOAT": autocas.RelayValueFloat(0),
+        "X1:REMT-INT": autocas.RelayValueInt(0),
+        "X1:REMT-WAVE": autocas.RelayWaveform(10),
+        "X1:REMT-WAVE_SHORT": autocas.RelayWaveform(2),
+        "X1:REMT-STR": autocas.RelayValueLongString(""),
+        "X1:REMT-ENUM": autocas.RelayValueEnum(0, ["A", "B", "C"]),
+        "X1:REMT-ENUM_FEW": autocas.RelayValueEnum(0, ["A", "B", "C"]),
+    }
+    results = dict()
+
+    def check(client, reactor):
+        def status():
+            results["counts"] = client.connection_counts()
+            results["bad"] = dict(client.epics_bad_connections)
+            results["wave"] = client.PV_values["X1:REMT-WAVE"]
+
+        reactor.send_task_synchronous(status)
+
+    cas_remote_connect("X1:REMT-", 0, check=check, rvs_host=rvs_host, rvs_remote=rvs_remote)
+    assert results["counts"] == (0, 3, 4)
+    assert sorted(results["bad"]) == ["X1:REMT-ENUM_FEW", "X1:REMT-INT", "X1:REMT-WAVE_SHORT"]
+    assert rvs_remote["X1:REMT-FLOAT"].value == 1.5
+    assert rvs_remote["X1:REMT-STR"].value == "remote string"
+    assert rvs_remote["X1:REMT-ENUM"].value == 2
+    # waveforms arrive as numpy arrays
+    assert isinstance(results["wave"], np.ndarray)
+    assert list(rvs_remote["X1:REMT-WAVE"].value) == list(range(10))
+
+
+def test_cas_remote_status(cas_remote_connect):
+    root = autocas.InstaCAS()
+    counts = []
+
+    def check(client, reactor):
+        def attach():
+            root.status.cas_attach(client.db, client)
+            root.status.PVs_busiest_update()
+            busiest.append(root.status.rv_PVs_busiest.value)
+            counts.append(
+                (
+                    root.status.rv_PVs_missing.value,
+                    root.status.rv_PVs_bad.value,
+                    root.status.rv_PVs_connected.value,
+                    root.status.rv_PVs_hosted.value,
+                )
+            )
+
+        reactor.send_task_synchronous(attach)
+
+    busiest = []
+    cas_remote_connect("X1:REMS-", 5, N_missing=2, check=check)
+    assert counts == [(2, 0, 5, 0)]
+    # the first monitor updates of the connected channels
+    listed = busiest[0].split()
+    assert len(listed) == 2 * root.status.PVs_busiest_N
+    assert all(channel.startswith("X1:REMS-C") for channel in listed[::2])
+
+
+def test_cas_remote_monitor_mailbox(cas_remote_connect):
+    results = dict()
+
+    def check(client, reactor):
+        drains = []
+        drain = client._monitor_drain
+
+        def counted_drain():
+            drains.append(dict(client._monitor_dirty or {}))
+            drain()
+
+        def post():
+            client._monitor_drain = counted_drain
+            results["dropped_before"] = dict(client.monitor_dropped)
+            results["dropped_total_before"] = client.monitor_dropped_total
+            # as from the epics thread, while the reactor is busy with this task
+            for value in [100.0, 101.0, 102.0, 103.0]:
+                client._monitor_post("X1:REMM-C0", value)
+            client._monitor_post("X1:REMM-C1", 200.0)
+            results["queued"] = client._monitor_drain_queued
+
+        reactor.send_task_synchronous(post)
+        # let any further drain run
+        time.sleep(0.2)
+
+        def collect():
+            results["drains"] = drains
+            results["dropped"] = dict(client.monitor_dropped)
+            results["dropped_total"] = client.monitor_dropped_total
+            results["queued_after"] = client._monitor_drain_queued
+
+        reactor.send_task_synchronous(collect)
+
+    client, rvs, connect_s = cas_remote_connect("X1:REMM-", 3, check=check)
+    # a single drain applied the latest value of each channel
+    assert results["queued"] is True
+    assert results["queued_after"] is False
+    assert results["drains"] == [{"X1:REMM-C0": (103.0, None), "X1:REMM-C1": (200.0, None)}]
+    assert rvs["X1:REMM-C0"].value == 103.0
+    assert rvs["X1:REMM-C1"].value == 200.0
+    assert rvs["X1:REMM-C2"].value == 2.0
+    # the three values replaced before the drain are counted as dropped
+    for channel, dropped in [("X1:REMM-C0", 3), ("X1:REMM-C1", 0)]:
+        assert (
+            results["dropped"].get(channel, 0) - results["dropped_before"].get(channel, 0)
+            == dropped
+        )
+    assert results["dropped_total"] - results["dropped_total_before"] == 3
+
+
+def test_cas_remote_write_deferred(cas_remote_connect, cas_remote_write):
+    import epics
+
+    results = dict()
+
+    def check(client, reactor):
+        cas_remote_write(client, reactor, client.PV_RV_map, 42.0)
+        results["values"] = [
+            epics.caget("X1:REMW-C{0}".format(idx), use_monitor=False) for idx in range(20)
+        ]
+        results["stats"] = reactor.send_task_synchronous(
+            lambda: (client.puts_total, client.put_batches_total, client.put_fails_total)
+        )
+        results["rates"] = reactor.send_task_synchronous(
+            lambda: [client.channel_rates("X1:REMW-C{0}".format(idx))[1] for idx in range(20)]
+        )
+        results["put_count"] = list(client.PV_put_rates.count)
+
+    cas_remote_connect("X1:REMW-", 20, check=check, deferred=True, deferred_write_period=0.05)
+    assert results["values"] == [42.0] * 20
+    # the setpoints were issued as one batch
+    assert results["stats"] == (20, 1, 0)
+    assert all(hz > 0 for hz in results["rates"])
+    assert results["put_count"] == [1] * 20
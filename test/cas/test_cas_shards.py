@@ -0,0 +1,79 @@
+"""
+Checks of ShardedCAServer, hosting the PVs across worker processes, using a local CA client
+"""
+import time
+
+from wield.epics import autocas
+from wield.epics.autocas.cascore import cas_shards
+
+
+def test_shard_partition():
+    keys = dict()
+    for idx in range(10):
+        keys["X1:TEST-A_{0}".format(idx)] = ("TEST", "A")
+    for idx in range(4):
+        keys["X1:TEST-B_{0}".format(idx)] = ("TEST", "B")
+    for idx in range(4):
+        keys["X1:TEST-C_{0}".format(idx)] = ("TEST", "C")
+    keys["X1:TEST-D"] = ("TEST", "D")
+
+    shards = cas_shards.shard_partition(keys, 2)
+    assert sorted(sum(shards, [])) == sorted(keys)
+    # subtrees stay together, largest first
+    assert shards[0] == ["X1:TEST-A_{0}".format(idx) for idx in range(10)]
+    assert len(shards[1]) == 9
+    # deterministic
+    assert shards == cas_shards.shard_partition(dict(reversed(list(keys.items()))), 2)
+
+    shards = cas_shards.shard_partition({k: k for k in keys}, 3)
+    assert [len(shard) for shard in shards] == [7, 6, 6]
+
+
+def test_cas_shards(run_reactor_with, cas_db_kinds, shard_ports):
+    import epics
+
+    db = dict()
+    rvs = dict()
+    for shard in ["X1:SHA-", "X1:SHB-"]:
+        db_shard, rvs_shard = cas_db_kinds(prefix=shard)
+        db.update(db_shard)
+        for name, rv in rvs_shard.items():
+            rvs[shard + name] = rv
+    shards = cas_shards.shard_partition(
+        {channel: channel.split("-")[0] for channel in db}, 2
+    )
+    reactor = autocas.Reactor()
+    server = cas_shards.ShardedCAServer(db, reactor, shards=shards, ports=shard_ports[:2])
+    results = dict()
+
+    def client():
+        pvs = {channel: epics.PV(channel) for channel in db}
+        for pv in pvs.values():
+            if not pv.wait_for_connection(timeout=5):
+                raise RuntimeError("Could not connect to " + pv.pvname)
+
+        # writes applied by the reactor, completing once applied
+        assert pvs["X1:SHA-VAL"].put(1.5, wait=True, timeout=5) == 1
+        assert pvs["X1:SHB-VAL"].put(2.5, wait=True, timeout=5) == 1
+        results["VAL"] = (rvs["X1:SHA-VAL"].value, rvs["X1:SHB-VAL"].value)
+
+        # rejected by the relay, and reverted in the shard
+        pvs["X1:SHB-LIM"].put(20, wait=True, timeout=5)
+        results["LIM"] = pvs["X1:SHB-LIM"].get(use_monitor=False)
+        pvs["X1:SHA-REPORT"].put(3, wait=True, timeout=5)
+        results["REPORT"] = rvs["X1:SHA-REPORT"].value
+
+        # relay changes forwarded to the shards
+        reactor.send_task_synchronous(lambda: rvs["X1:SHB-INT"].put(7))
+        t_end = time.time() + 5
+        while pvs["X1:SHB-INT"].get(use_monitor=False) != 7 and time.time() < t_end:
+            time.sleep(0.01)
+        results["INT"] = pvs["X1:SHB-INT"].get(use_monitor=False)
+
+    with server:
+        assert len(server.processes) == 2
+        run_reactor_with(reactor, client)
+    assert results["VAL"] == (1.5, 2.5)
+    assert results["LIM"] == 0
+    assert results["REPORT"] == 0
+    assert results["INT"] == 7
@@ -0,0 +1,283 @@
+"""
+Checks of the client write path of CADriverServer
+"""
+import time
+
+from wield.epics import autocas
+from wield.epics.autocas.cascore import pcaspy_backend
+
+
+def test_cas_write(run_reactor_with, cas_db_kinds):
+    db, rvs = cas_db_kinds()
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(db, reactor)
+    run_reactor_with(reactor, lambda: check_writes(driver, rvs))
+
+
+def check_writes(driver, rvs):
+    assert driver.write("X1:TEST-VAL", 1.5)
+    assert rvs["VAL"].value == 1.5
+    assert driver.getParam("X1:TEST-VAL") == 1.5
+
+    assert driver.write("X1:TEST-LIM", 5)
+    assert not driver.write("X1:TEST-LIM", 20)
+    assert rvs["LIM"].value == 5
+
+    # coerced writes are applied with the preferred value, but report failure
+    assert not driver.write("X1:TEST-INT", 2.5)
+    assert rvs["INT"].value == 2
+    assert driver.getParam("X1:TEST-INT") == 2
+
+    assert driver.write("X1:TEST-ENUM", 2)
+    assert not driver.write("X1:TEST-ENUM", 3)
+    assert not driver.write("X1:TEST-ENUM", -1)
+    assert rvs["ENUM"].value == 2
+
+    assert not driver.write("X1:TEST-REPORT", 1)
+    assert rvs["REPORT"].value == 0
+
+    # the writing server does not get its own callback
+    seen = []
+    rvs["VAL"].register(callback=seen.append)
+    driver.write("X1:TEST-VAL", 3)
+    assert seen == [3]
+
+    # the autosave loader path, typecasting the strings of snapshots
+    assert driver.write_sync_typecast("X1:TEST-LIM", "7.5")
+    assert rvs["LIM"].value == 7.5
+    assert not driver.write_sync_typecast("X1:TEST-LIM", "70")
+    assert rvs["LIM"].value == 7.5
+    assert driver.write_sync_typecast("X1:TEST-ENUM", "1")
+    assert rvs["ENUM"].value == 1
+    assert not driver.write_sync_typecast("X1:TEST-REPORT", "1")
+
+
+def test_cas_write_batch(cas_db_kinds):
+    db, rvs = cas_db_kinds()
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(
+        db, reactor, publish_mode=pcaspy_backend.PUBLISH_IMMEDIATE
+    )
+    posted = []
+    update_pv = driver.updatePV
+
+    def update_pv_count(channel):
+        posted.append(channel)
+        update_pv(channel)
+
+    driver.updatePV = update_pv_count
+    rvs["VAL"].value = 1
+    assert posted == ["X1:TEST-VAL"]
+
+    # posted together as the batch exits, once each
+    with autocas.batch():
+        for value in [2, 3, 4]:
+            rvs["VAL"].value = value
+            rvs["INT"].value = value
+        assert posted == ["X1:TEST-VAL"]
+        assert driver.getParam("X1:TEST-VAL") == 1
+    assert sorted(posted[1:]) == ["X1:TEST-INT", "X1:TEST-VAL"]
+    assert driver.getParam("X1:TEST-VAL") == 4
+
+
+def test_cas_write_publish_batched(cas_db_kinds):
+    db, rvs = cas_db_kinds()
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(
+        db, reactor, deferred_write_period=None, publish_mode=pcaspy_backend.PUBLISH_BATCHED
+    )
+    posted = []
+    update_pv = driver.updatePV
+
+    def update_pv_count(channel):
+        posted.append(channel)
+        update_pv(channel)
+
+    driver.updatePV = update_pv_count
+
+    # nothing dirty, nothing posted
+    reactor.flush()
+    driver._publish_flush()
+    assert posted == []
+
+    # stored right away, posted once each by the next pass
+    for value in [1, 2, 3]:
+        rvs["VAL"].value = value
+        rvs["INT"].value = value
+    assert posted == []
+    assert driver.getParam("X1:TEST-VAL") == 3
+    reactor.flush()
+    assert sorted(posted) == ["X1:TEST-INT", "X1:TEST-VAL"]
+    reactor.flush()
+    driver._publish_flush()
+    assert len(posted) == 2
+
+
+def test_cas_write_publish_latency(cas_db_kinds):
+    latency_s = 0.2
+    db, rvs = cas_db_kinds(prefix="X1:TEST-LATENCY-")
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(
+        db,
+        reactor,
+        deferred_write_period=None,
+        publish_mode=pcaspy_backend.PUBLISH_BATCHED,
+        publish_max_latency_s=latency_s,
+    )
+    posted = []
+    update_pv = driver.updatePV
+
+    def update_pv_count(channel):
+        posted.append((channel, reactor.time()))
+        update_pv(channel)
+
+    driver.updatePV = update_pv_count
+
+    mtime_start = reactor.time()
+    rvs["VAL"].value = 1
+    reactor.flush()
+    # changes within the latency join the pending post
+    rvs["VAL"].value = 2
+    rvs["INT"].value = 2
+    assert posted == []
+    reactor.flush(for_s=2 * latency_s)
+    assert sorted(channel for channel, mtime in posted) == [
+        "X1:TEST-LATENCY-INT",
+        "X1:TEST-LATENCY-VAL",
+    ]
+    for channel, mtime in posted:
+        assert mtime_start + latency_s <= mtime < mtime_start + 1.5 * latency_s
+
+
+def test_cas_write_deadband():
+    rv = autocas.RelayValueFloat(0)
+    entry = rv.db_defaults()
+    entry.update(
+        interaction="report", remote=False, deferred=False, mdel=10, lolo=-100, hihi=5
+    )
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(
+        {"X1:TEST-DB": entry}, reactor, publish_mode=pcaspy_backend.PUBLISH_IMMEDIATE
+    )
+    posted = []
+    update_pv = driver.updatePV
+
+    def update_pv_count(channel):
+        posted.append(channel)
+        update_pv(channel)
+
+    driver.updatePV = update_pv_count
+    param = driver.pvDB["X1:TEST-DB"]
+    time_before = param.time
+    assert param.severity == pcaspy_backend.pcaspy.Severity.NO_ALARM
+
+    # within the deadband, so stored for reads without a value post, along with its time
+    # and its alarm
+    rv.value = 6
+    assert posted == []
+    assert driver.getParam("X1:TEST-DB") == 6
+    assert param.time is not time_before
+    assert param.severity == pcaspy_backend.pcaspy.Severity.MAJOR_ALARM
+    assert param.alarm == pcaspy_backend.pcaspy.Alarm.HIHI_ALARM
+
+    rv.value = 11
+    assert posted == ["X1:TEST-DB"]
+    rv.value = 4
+    assert posted == ["X1:TEST-DB"]
+    assert param.severity == pcaspy_backend.pcaspy.Severity.NO_ALARM
+
+
+def test_cas_alarm_check():
+    Alarm = pcaspy_backend.pcaspy.Alarm
+    Severity = pcaspy_backend.pcaspy.Severity
+    entry = dict(type="float", low=-1, high=1, lolo=-5, hihi=5)
+    assert pcaspy_backend.alarm_check(entry, 0) == (Alarm.NO_ALARM, Severity.NO_ALARM)
+    assert pcaspy_backend.alarm_check(entry, 1) == (Alarm.HIGH_ALARM, Severity.MINOR_ALARM)
+    assert pcaspy_backend.alarm_check(entry, -6) == (Alarm.LOLO_ALARM, Severity.MAJOR_ALARM)
+    assert pcaspy_backend.alarm_check(entry, [0, -2]) == (Alarm.LOW_ALARM, Severity.MINOR_ALARM)
+    # unordered limits are unset
+    assert pcaspy_backend.alarm_check(dict(type="int", low=1, high=1), 1) == (
+        Alarm.NO_ALARM,
+        Severity.NO_ALARM,
+    )
+    assert pcaspy_backend.alarm_check(dict(type="string", hihi=1), "2") == (
+        Alarm.NO_ALARM,
+        Severity.NO_ALARM,
+    )
+
+    entry = dict(type="enum", enums=["A", "B"], states=[Severity.NO_ALARM, Severity.MINOR_ALARM])
+    assert pcaspy_backend.alarm_check(entry, 0) == (Alarm.NO_ALARM, Severity.NO_ALARM)
+    assert pcaspy_backend.alarm_check(entry, 1) == (Alarm.STATE_ALARM, Severity.MINOR_ALARM)
+    assert pcaspy_backend.alarm_check(entry, 2) == (Alarm.STATE_ALARM, Severity.MAJOR_ALARM)
+    assert pcaspy_backend.alarm_check(dict(type="enum", enums=["A"]), 0) == (
+        Alarm.NO_ALARM,
+        Severity.NO_ALARM,
+    )
+
+
+def test_cas_write_array(run_reactor_with):
+    bank = autocas.RelayArrayFloatLowHighMod(3, low=0, high=10)
+    db = dict()
+    for rv in bank:
+        entry = rv.db_defaults()
+        entry.update(interaction="setting", remote=False, deferred=False)
+        db["X1:TEST-DAC_{0}".format(rv.idx)] = entry
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(db, reactor)
+
+    def writes():
+        assert driver.write("X1:TEST-DAC_1", 2.5)
+        assert not driver.write("X1:TEST-DAC_1", 20)
+        assert bank.values[1] == 2.5
+
+    run_reactor_with(reactor, writes)
+    bank.put_many([1, 2, 3])
+    assert [driver.getParam("X1:TEST-DAC_{0}".format(idx)) for idx in range(3)] == [1, 2, 3]
+    # as the autosave loader does, from the strings of snapshots
+    bank.put_many(["4", "5"], idxs=[0, 2])
+    assert list(bank.values) == [4, 2, 5]
+    assert driver.getParam("X1:TEST-DAC_2") == 5
+
+
+def test_cas_write_handoff(run_reactor_with, cas_db_kinds):
+    db, rvs = cas_db_kinds()
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(db, reactor, write_handoff=True)
+    assert driver.db_cas_raw["X1:TEST-VAL"]["asyn"]
+    completed = []
+    driver.callbackPV = completed.append
+    write_s = []
+
+    def busy():
+        # a slow task holding the task_lock
+        time.sleep(0.3)
+
+    def writes():
+        reactor.send_task(busy)
+        time.sleep(0.05)
+        t_start = time.perf_counter()
+        assert driver.write("X1:TEST-VAL", 1.5)
+        assert driver.write("X1:TEST-VAL", 2.5)
+        # rejected and coerced in this thread
+        assert not driver.write("X1:TEST-LIM", 20)
+        assert not driver.write("X1:TEST-INT", 2.5)
+        write_s.append(time.perf_counter() - t_start)
+        # not yet applied
+        assert rvs["VAL"].value == 0
+        reactor.send_task_synchronous(lambda: None)
+
+    run_reactor_with(reactor, writes)
+    # the writes returned without waiting on the busy reactor
+    assert write_s[0] < 0.1
+    # coalesced into the latest
+    assert rvs["VAL"].value == 2.5
+    # posted and completed by the server thread, which isn't running here
+    assert completed == []
+    driver.cas_thread.complete()
+    assert driver.cas_thread.outstanding == 0
+    assert driver.getParam("X1:TEST-VAL") == 2.5
+    assert rvs["LIM"].value == 0
+    assert rvs["INT"].value == 2
+    # the replaced write completes along with the applied one, the coerced write already
+    # completed in pcaspy
+    assert completed == ["X1:TEST-VAL", "X1:TEST-VAL"]
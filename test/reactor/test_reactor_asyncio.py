@@ -0,0 +1,103 @@
+"""
+Checks of the asyncio reactor backend against the behavior of the threaded reactor
+"""
+import time
+import asyncio
+import threading
+
+from wield.epics.autocas import AsyncioReactor
+from wield.epics.autocas.cascore import LANE_CONTROL, LANE_MONITOR, LANE_HOUSEKEEPING
+
+
+def test_asyncio_timed_order():
+    reactor = AsyncioReactor()
+    t_start = time.time()
+    calls = []
+
+    def sender():
+        reactor.send_task(lambda: calls.append("timed"), run_at=t_start + 0.1)
+        reactor.send_task(lambda: calls.append("timed_early"), run_at=t_start + 0.05)
+        with reactor.task_lock:
+            reactor.enqueue(lambda: calls.append("enq"), key="k", future_s=0.3)
+            reactor.enqueue(lambda: calls.append("enq"), key="k", future_s=0.15)
+        calls.append(reactor.send_task_synchronous(lambda: "sync"))
+
+    reactor.send_task(lambda: calls.append("immediate"))
+    thread = threading.Thread(target=sender)
+    thread.start()
+    reactor.flush(for_s=0.4)
+    thread.join()
+    calls.remove("sync")
+    assert calls == ["immediate", "timed_early", "timed", "enq"]
+    assert not reactor._timer_handles
+
+
+def test_asyncio_coroutine_task():
+    reactor = AsyncioReactor()
+    calls = []
+    ticks = [0]
+
+    def tick():
+        ticks[0] += 1
+
+    async def slow_io():
+        calls.append("start")
+        await reactor.run_blocking(time.sleep, 0.2)
+        calls.append("end")
+
+    reactor.enqueue_looping(tick, period_s=0.01)
+    reactor.send_task(slow_io)
+    reactor.flush(for_s=0.3)
+    assert calls == ["start", "end"]
+    # the looping task kept running while the coroutine waited on the I/O
+    assert ticks[0] > 10
+    reactor.enqueue_looping(tick, period_s=None)
+    assert not reactor._timer_handles
+
+
+def test_asyncio_run_async():
+    reactor = AsyncioReactor(loop=asyncio.new_event_loop())
+    calls = []
+
+    async def main():
+        reactor.send_task(lambda: calls.append("task"))
+        reactor.send_task(reactor.loop_kill, run_at=time.time() + 0.05)
+        await reactor.run_async()
+
+    reactor.loop.run_until_complete(main())
+    assert calls == ["task"]
+
+
+def test_asyncio_lanes():
+    reactor = AsyncioReactor()
+    order = []
+    for idx in range(1000):
+        reactor.send_task(lambda: order.append(LANE_MONITOR), lane=LANE_MONITOR)
+    for idx in range(100):
+        reactor.send_task(lambda: order.append(LANE_CONTROL))
+        reactor.send_task(lambda: order.append(LANE_HOUSEKEEPING), lane=LANE_HOUSEKEEPING)
+    assert reactor.lane_status()[LANE_MONITOR][0] == 1000
+    reactor.flush()
+    assert len(order) == 1200
+
+    # the same stride scheduling as the threaded reactor
+    assert max(idx for idx, lane in enumerate(order) if lane == LANE_CONTROL) < 150
+    first = order[:150]
+    assert first.count(LANE_HOUSEKEEPING) > 10
+    assert abs(first.count(LANE_MONITOR) / first.count(LANE_HOUSEKEEPING) - 2) < 0.5
+
+    reactor.enqueue(
+        lambda: order.append("timed"), key="timed", future_s=0.05, lane=LANE_HOUSEKEEPING
+    )
+    reactor.flush(for_s=0.1)
+    assert order[-1] == "timed"
+    assert reactor.lane_status()[LANE_MONITOR] == (0, None)
+    interval = reactor.profile.interval(reactor.time())
+    assert interval.lanes[LANE_HOUSEKEEPING].runs == 101
+
+    try:
+        reactor.send_task(lambda: None, lane="bogus")
+    except RuntimeError:
+        pass
+    else:
+        assert False
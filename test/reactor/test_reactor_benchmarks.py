@@ -0,0 +1,895 @@
+"""
+Benchmark suite for the reactor, the relays and the CA servers and clients. The test here only
+runs a quick version of every benchmark, to check that they still work. Run the file directly for
+the full suite, which writes its results as JSON so that runs before and after changes can be
+compared
+
+    PYTHONPATH=../.. python test_reactor_benchmarks.py -o after.json --compare before.json
+
+Benchmarks that only measure scheduling cost run the reactor on a VirtualClock, so that long
+schedules take only as long as their tasks. Latency and jitter are measured on the real clock.
+
+Benchmarks needing the helpers of conftest take them as the fixtures argument, a Bunch of the
+fixtures of the same names.
+"""
+import sys
+import time
+import json
+import random
+import argparse
+import functools
+import itertools
+import platform
+import tracemalloc
+
+import numpy as np
+
+from wield import declarative
+from wield.bunch import Bunch
+from wield.epics import autocas
+from wield.epics.autocas import Reactor
+from wield.epics.autocas.cascore import cas_shards, pcaspy_backend, pyepics_backend
+from wield.epics.autocas.cascore.clocks import VirtualClock
+from wield.epics.autocas.utilities.priority_queue import HeapPriorityQueue
+
+
+def bench_send_task(fixtures, N=100000, N_threads=1):
+    """
+    Tasks sent from N_threads threads while the reactor runs. Reports the rate from the first
+    send until the last task ran.
+    """
+    reactor = Reactor()
+    runs = [0]
+
+    def task():
+        runs[0] += 1
+
+    N_each = N // N_threads
+
+    def producer():
+        send_task = reactor.send_task
+        for idx in range(N_each):
+            send_task(task)
+        # a final synchronous task waits for everything sent before it
+        reactor.send_task_synchronous(lambda: None)
+
+    t_start = time.perf_counter()
+    fixtures.run_reactor_with(reactor, *[producer] * N_threads)
+    duration_s = time.perf_counter() - t_start
+    return dict(
+        tasks=runs[0],
+        threads=N_threads,
+        tasks_per_s=runs[0] / duration_s,
+    )
+
+
+def bench_send_task_batch(N=100000):
+    """
+    Tasks sent from the thread owning the reactor and then flushed, without any cross-thread
+    traffic
+    """
+    reactor = Reactor()
+    runs = [0]
+
+    def task():
+        runs[0] += 1
+
+    t_start = time.perf_counter()
+    for idx in range(N):
+        reactor.send_task(task)
+    t_sent = time.perf_counter()
+    reactor.flush()
+    t_done = time.perf_counter()
+    return dict(
+        tasks=runs[0],
+        sends_per_s=N / (t_sent - t_start),
+        runs_per_s=N / (t_done - t_sent),
+    )
+
+
+def bench_enqueue_rekey(N_keys=1000, N_ops=200000, sim_duration_s=100, seed=0):
+    """
+    Random reschedules and cancellations of N_keys keyed tasks, interleaved with running the
+    reactor through sim_duration_s of simulated time
+    """
+    rand = random.Random(seed)
+    clock = VirtualClock(start=0)
+    reactor = Reactor(clock=clock)
+    runs = [0]
+
+    def command_gen():
+        def command():
+            runs[0] += 1
+
+        return command
+
+    commands = [command_gen() for idx in range(N_keys)]
+    N_steps = 100
+    step_s = sim_duration_s / N_steps
+    ops_step = N_ops // N_steps
+
+    heap_max = 0
+    enqueue_s = 0
+    flush_s = 0
+    enqueue = reactor.enqueue
+    for step in range(N_steps):
+        keys = [rand.randrange(N_keys) for idx in range(ops_step)]
+        delays = [rand.uniform(0, 10 * step_s) for idx in range(ops_step)]
+        t_start = time.perf_counter()
+        for key, delay in zip(keys, delays):
+            if delay < 0.5 * step_s:
+                # cancel
+                enqueue(commands[key], force_requeue=True)
+            else:
+                enqueue(commands[key], future_s=delay, force_requeue=True)
+        t_enq = time.perf_counter()
+        reactor.flush(for_s=step_s)
+        t_flush = time.perf_counter()
+        enqueue_s += t_enq - t_start
+        flush_s += t_flush - t_enq
+        heap_max = max(heap_max, len(reactor._pqueue))
+    return dict(
+        keys=N_keys,
+        enqueues=ops_step * N_steps,
+        enqueues_per_s=ops_step * N_steps / enqueue_s,
+        tasks_run=runs[0],
+        run_cost_us=1e6 * flush_s / max(runs[0], 1),
+        heap_max=heap_max,
+    )
+
+
+def bench_reschedules(
+    N_keys=500,
+    rate_hz=10000,
+    duration_s=2.0,
+    step_s=0.01,
+    seed=0,
+):
+    """
+    Reschedules random keys in the reactor at rate_hz while it runs. Returns the
+    maximum timer heap size and the mean cost of popping and running each due task.
+
+    Also runs the same sequence through a model of the previous behavior, where every
+    reschedule left a dead entry in the heap. The model only tracks its heap size, to compare
+    the heap growth; the pop cost is only measured for the reactor.
+    """
+    rand = random.Random(seed)
+    reactor = Reactor()
+    runs = [0]
+
+    def command_gen():
+        def command():
+            runs[0] += 1
+
+        return command
+
+    commands = [command_gen() for idx in range(N_keys)]
+
+    # the tombstone model
+    tomb_heap = HeapPriorityQueue()
+    tomb_live = dict()
+    tomb_seq = itertools.count()
+    tomb_max = 0
+
+    heap_max = 0
+    pop_time = 0
+    pops = 0
+    N_step = int(rate_hz * step_s)
+    t_end = time.time() + duration_s
+    while time.time() < t_end:
+        for idx in range(N_step):
+            key = rand.randrange(N_keys)
+            future_s = rand.uniform(0, 20 * step_s)
+            reactor.enqueue(
+                commands[key],
+                future_s=future_s,
+                force_requeue=rand.random() < 0.5,
+            )
+            # the tombstone model always pushes a new entry
+            seq = next(tomb_seq)
+            tomb_live[key] = seq
+            tomb_heap.push((time.time() + future_s, seq, key))
+
+        heap_max = max(heap_max, len(reactor._pqueue))
+        tomb_max = max(tomb_max, len(tomb_heap))
+
+        # sleep outside of the reactor so that only the task work is timed
+        time.sleep(step_s)
+        t_start = time.perf_counter()
+        reactor.flush()
+        pop_time += time.perf_counter() - t_start
+        pops += runs[0]
+        runs[0] = 0
+
+        now = time.time()
+        while tomb_heap and tomb_heap.peek()[0] <= now:
+            t, seq, key = tomb_heap.pop()
+            if tomb_live.get(key) == seq:
+                del tomb_live[key]
+
+    return dict(
+        heap_max=heap_max,
+        heap_bound=N_keys,
+        tombstone_heap_max=tomb_max,
+        tasks_run=pops,
+        pop_time_per_task_us=1e6 * pop_time / max(pops, 1),
+    )
+
+
+def bench_looping_jitter(rates_hz=(1, 10, 100, 1000), duration_s=5):
+    """
+    Looping tasks at each of rates_hz running together on the real clock. The jitter is the
+    lateness of each run behind its period boundary.
+    """
+    reactor = Reactor()
+    lateness = {rate: [] for rate in rates_hz}
+    skips = {rate: 0 for rate in rates_hz}
+
+    def loop_gen(rate):
+        period_s = 1 / rate
+        lates = lateness[rate]
+
+        def loop():
+            now = reactor.time()
+            lates.append(now % period_s)
+
+        def skip():
+            skips[rate] += 1
+
+        return loop, skip
+
+    for rate in rates_hz:
+        loop, skip = loop_gen(rate)
+        reactor.enqueue_looping(loop, period_s=1 / rate, skip_cb=skip)
+    reactor.flush(for_s=duration_s)
+
+    results = dict()
+    for rate in rates_hz:
+        lates = sorted(lateness[rate])
+        if not lates:
+            continue
+        results["{0}Hz".format(rate)] = dict(
+            runs=len(lates),
+            skips=skips[rate],
+            jitter_median_us=1e6 * lates[len(lates) // 2],
+            jitter_p99_us=1e6 * lates[min(int(len(lates) * 0.99), len(lates) - 1)],
+            jitter_max_us=1e6 * lates[-1],
+        )
+    return results
+
+
+def bench_looping_simulated(rates_hz=(1, 10, 100, 1000), sim_duration_s=600):
+    """
+    The same loops on a VirtualClock, for the CPU cost of each looping run
+    """
+    clock = VirtualClock(start=0)
+    reactor = Reactor(clock=clock)
+    runs = [0]
+
+    def loop():
+        runs[0] += 1
+
+    for rate in rates_hz:
+        reactor.enqueue_looping(loop, key=rate, period_s=1 / rate)
+    t_start = time.perf_counter()
+    reactor.flush(for_s=sim_duration_s)
+    duration_s = time.perf_counter() - t_start
+    return dict(
+        runs=runs[0],
+        sim_duration_s=sim_duration_s,
+        run_cost_us=1e6 * duration_s / max(runs[0], 1),
+        speedup=sim_duration_s / duration_s,
+    )
+
+
+def bench_round_trip(fixtures, N=5000):
+    """
+    Cross-thread send_task_synchronous round trips
+    """
+    reactor = Reactor()
+
+    def target():
+        times = []
+        for idx in range(N):
+            t_start = time.perf_counter()
+            reactor.send_task_synchronous(lambda: None)
+            times.append(time.perf_counter() - t_start)
+        return times
+
+    (times,) = fixtures.run_reactor_with(reactor, target)
+    times.sort()
+    return dict(
+        round_trips=N,
+        median_us=1e6 * times[N // 2],
+        p99_us=1e6 * times[int(N * 0.99)],
+        max_us=1e6 * times[-1],
+    )
+
+
+def bench_flush(N=20000, for_s=0.001, N_timed=200):
+    """
+    The overhead of flush on an idle reactor, and how far flush(for_s) overshoots on the real clock
+    """
+    reactor = Reactor()
+    t_start = time.perf_counter()
+    for idx in range(N):
+        reactor.flush()
+    empty_us = 1e6 * (time.perf_counter() - t_start) / N
+
+    overshoot = []
+    for idx in range(N_timed):
+        t_start = time.perf_counter()
+        reactor.flush(for_s=for_s)
+        overshoot.append(time.perf_counter() - t_start - for_s)
+    overshoot.sort()
+    return dict(
+        empty_flush_us=empty_us,
+        timed_for_s=for_s,
+        overshoot_median_us=1e6 * overshoot[N_timed // 2],
+        overshoot_max_us=1e6 * overshoot[-1],
+    )
+
+
+def bench_relay_validate(N=200000):
+    """
+    Validations per second of strings longer than the 40 characters of string PVs, through the
+    exceptions of validator and through validate
+    """
+    rv = autocas.RelayValueString("")
+    value = "x" * 50
+
+    t_start = time.perf_counter()
+    for idx in range(N):
+        try:
+            rv.validator(value)
+        except autocas.RelayValueCoerced as E:
+            E.preferred
+    rate_raise = N / (time.perf_counter() - t_start)
+
+    validate = autocas.relay_validate(rv)
+    t_start = time.perf_counter()
+    for idx in range(N):
+        validate(value)
+    rate_validate = N / (time.perf_counter() - t_start)
+    return dict(
+        raising_per_s=rate_raise,
+        validate_per_s=rate_validate,
+    )
+
+
+def bench_relay_compact(N_memory=20000, N_assign=200000):
+    """
+    Bytes allocated per relay with one callback registered, and assignments of changed values
+    per second with two callbacks registered, for the declarative and the compact relays
+    """
+
+    def cb(value):
+        pass
+
+    results = dict()
+    for cls in [autocas.RelayValueFloat, autocas.RelayCompactFloat]:
+        tracemalloc.start()
+        snap_start = tracemalloc.take_snapshot()
+        rvs = [cls(float(idx)) for idx in range(N_memory)]
+        for rv in rvs:
+            rv.register(callback=cb)
+        snap_end = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        total = sum(stat.size_diff for stat in snap_end.compare_to(snap_start, "filename"))
+        del rvs
+
+        rv = cls(0.0)
+        rv.register(key="A", callback=cb)
+        rv.register(key="B", callback=cb)
+        values = [float(idx) for idx in range(1, N_assign + 1)]
+        t_start = time.perf_counter()
+        for value in values:
+            rv.put_exclude_cb(value, "B")
+        results[cls.__name__] = dict(
+            # not counting the list
+            bytes_per_relay=(total - 8 * N_memory) / N_memory,
+            assigns_per_s=N_assign / (time.perf_counter() - t_start),
+        )
+    return results
+
+
+def bench_relay_batch(N_rvs=20, N_polls=2000):
+    """
+    A device poll assigning N_rvs readbacks, gated by a RelayBoolAll and each with a callback,
+    as for a hosted channel. Reports the callbacks per poll and the polls per second, with and
+    without a batch.
+    """
+    results = dict()
+    for use_batch in [False, True]:
+        counts = [0]
+
+        def cb(value):
+            counts[0] += 1
+
+        rvs = [autocas.RelayValueFloat(0) for idx in range(N_rvs)]
+        rbs = [autocas.RelayBool(False) for idx in range(N_rvs)]
+        rb_all = autocas.RelayBoolAll(rbs)
+        rb_all.register(callback=cb)
+        for rv in rvs + rbs:
+            rv.register(callback=cb)
+
+        def poll(idx):
+            for rv, rb in zip(rvs, rbs):
+                # a readback, then its status
+                rv.value = idx
+                rv.value = idx + 0.5
+                rb.value = False
+                rb.value = True
+
+        t_start = time.perf_counter()
+        for idx in range(N_polls):
+            if use_batch:
+                with autocas.batch():
+                    poll(idx)
+            else:
+                poll(idx)
+        duration_s = time.perf_counter() - t_start
+        results["batch" if use_batch else "unbatched"] = dict(
+            callbacks_per_poll=counts[0] / N_polls,
+            polls_per_s=N_polls / duration_s,
+        )
+    return results
+
+
+def bench_relay_array(N=10000, N_puts=20):
+    """
+    Setpoints assigned per second through put_coerce of each element and through put_many
+    """
+    bank = autocas.RelayArrayFloatLowHighMod(N, low=0, high=1e6, modulo=0.5)
+    for rv in bank:
+        rv.register(callback=lambda value: None)
+    vectors = [np.arange(N) * 0.3 + idx for idx in range(N_puts)]
+
+    t_start = time.perf_counter()
+    for values in vectors:
+        for rv, value in zip(bank, values.tolist()):
+            rv.put_coerce(value)
+    rate_elements = N * N_puts / (time.perf_counter() - t_start)
+
+    t_start = time.perf_counter()
+    for values in vectors:
+        bank.put_many(values + 0.1)
+    rate_vector = N * N_puts / (time.perf_counter() - t_start)
+    return dict(
+        elementwise_per_s=rate_elements,
+        put_many_per_s=rate_vector,
+    )
+
+
+class _Bank(autocas.CASUser):
+    N = 3
+
+    @declarative.dproperty
+    def rvs(self):
+        rvs = []
+        for idx in range(self.N):
+            rv = autocas.RelayCompactFloat(0.0)
+            self.cas_host(rv, "VAL_{0}".format(idx), interaction="setting")
+            rvs.append(rv)
+        return rvs
+
+
+def bench_cas_host(N=5000, N_generate=10):
+    """
+    Seconds to host N PVs, and to generate their db N_generate times
+    """
+    root = autocas.InstaCAS(prefix_base="X1", prefix_subsystem="HOSTBENCH")
+    bank = _Bank(parent=root, name="BANK", N=N)
+    t_start = time.perf_counter()
+    bank.rvs
+    host_s = time.perf_counter() - t_start
+    t_start = time.perf_counter()
+    for idx in range(N_generate):
+        root.cas_db_generate()
+        root.channels(remote=False)
+    generate_s = time.perf_counter() - t_start
+    return dict(
+        PVs=N,
+        host_s=host_s,
+        generate_s=generate_s / N_generate,
+    )
+
+
+def bench_cas_puts(fixtures, N_direct=100000, N_ca=2000):
+    """
+    Writes per second through CADriverServer.write, as called by the pcaspy server thread, and
+    puts per second from a CA client in another thread while the reactor runs, each waiting on
+    completion, with and without write_handoff
+    """
+    import epics
+
+    results = dict()
+    db, rvs = fixtures.cas_db_kinds(prefix="X1:BENCH-")
+    reactor = autocas.Reactor()
+    driver = pcaspy_backend.CADriverServer(db, reactor)
+
+    def writes():
+        write = driver.write
+        t_start = time.perf_counter()
+        for idx in range(N_direct):
+            write("X1:BENCH-VAL", float(idx))
+        results["direct_per_s"] = N_direct / (time.perf_counter() - t_start)
+
+    fixtures.run_reactor_with(reactor, writes)
+    assert rvs["VAL"].value == N_direct - 1
+
+    for write_handoff in [False, True]:
+        # separate channels for each run, as pyepics keeps its connections to the previous server
+        prefix = "X1:CABENCH{0}-".format("H" if write_handoff else "")
+        db, rvs = fixtures.cas_db_kinds(prefix=prefix)
+        reactor = autocas.Reactor()
+        driver = pcaspy_backend.CADriverServer(db, reactor, write_handoff=write_handoff)
+
+        def client():
+            pv = epics.PV(prefix + "VAL")
+            if not pv.wait_for_connection(timeout=5):
+                raise RuntimeError("Could not connect to the local CA server")
+            t_start = time.perf_counter()
+            for idx in range(N_ca):
+                pv.put(float(idx), wait=True)
+            return N_ca / (time.perf_counter() - t_start)
+
+        with driver:
+            (rate,) = fixtures.run_reactor_with(reactor, client)
+        assert rvs["VAL"].value == N_ca - 1
+        results["ca_handoff_per_s" if write_handoff else "ca_per_s"] = rate
+    return results
+
+
+def bench_cas_monitors(fixtures, N_shards=2, N_channels=1000, N_updates=50):
+    """
+    A client monitoring every channel while the reactor changes all of them N_updates times.
+    Reports the rate of channel updates until the client has the last value of every channel,
+    and the fraction of the updates it received as events, as CA servers drop the intermediate
+    events of slow clients.
+    """
+    import epics
+
+    rvs = {
+        "X1:SHBENCH{0}-C{1}_V".format(N_shards, idx): autocas.RelayValueFloat(0)
+        for idx in range(N_channels)
+    }
+    db = fixtures.cas_db_relays(rvs)
+    for entry in db.values():
+        entry["interaction"] = "report"
+    reactor = autocas.Reactor()
+    if N_shards == 0:
+        server = autocas.CADriverServer(db, reactor)
+    else:
+        shards = cas_shards.shard_partition({channel: channel for channel in db}, N_shards)
+        server = cas_shards.ShardedCAServer(
+            db, reactor, shards=shards, ports=fixtures.shard_ports[:N_shards]
+        )
+    counts = [0]
+    # channels not yet at the last value
+    remaining = set(db)
+    results = dict()
+
+    def monitor_cb(pvname=None, value=None, **kwargs):
+        counts[0] += 1
+        if value == N_updates:
+            remaining.discard(pvname)
+
+    def client():
+        pvs = [epics.PV(channel, callback=monitor_cb) for channel in db]
+        for pv in pvs:
+            if not pv.wait_for_connection(timeout=5):
+                raise RuntimeError("Could not connect to " + pv.pvname)
+        time.sleep(0.5)
+        counts[0] = 0
+        t_start = time.perf_counter()
+        for idx in range(1, N_updates + 1):
+
+            def update(idx=idx):
+                for rv in rvs.values():
+                    rv.put(float(idx))
+
+            reactor.send_task_synchronous(update)
+        t_end = time.time() + 30
+        while remaining and time.time() < t_end:
+            time.sleep(0.001)
+        duration_s = time.perf_counter() - t_start
+        results["updates_per_s"] = N_channels * N_updates / duration_s
+        results["events_fraction"] = counts[0] / (N_channels * N_updates)
+        results["missing"] = len(remaining)
+        for pv in pvs:
+            pv.disconnect()
+
+    with server:
+        fixtures.run_reactor_with(reactor, client)
+    return results
+
+
+def bench_cas_shards(fixtures, shard_counts=(0, 1, 2, 4), **kwargs):
+    """
+    bench_cas_monitors from a single reactor, for each of the shard counts
+    """
+    return {
+        "{0}_shards".format(N_shards): bench_cas_monitors(fixtures, N_shards=N_shards, **kwargs)
+        for N_shards in shard_counts
+    }
+
+
+def bench_cas_remote_rates(N=1000, N_batches=200):
+    """
+    Channel events per second recorded into ChannelRates, in batches of N channels, and as
+    the scalar EWMA per event kept in a dict before
+    """
+    ids = np.arange(N)
+    rates = pyepics_backend.ChannelRates(N, rateconst_s=10)
+    t_start = time.perf_counter()
+    for idx in range(N_batches):
+        rates.update(ids, time.time())
+    columnar_s = time.perf_counter() - t_start
+
+    fom = dict()
+    t_start = time.perf_counter()
+    for idx in range(N_batches):
+        for channel in ids:
+            tnow = time.time()
+            tintR, tlast = fom.get(channel, (0, 0))
+            tdiff = tnow - tlast
+            weight = np.exp(-tdiff / 10)
+            fom[channel] = ((1 - weight) / tdiff + weight * tintR, tnow)
+    scalar_s = time.perf_counter() - t_start
+    return dict(
+        columnar_per_s=N * N_batches / columnar_s,
+        scalar_per_s=N * N_batches / scalar_s,
+    )
+
+
+def bench_cas_remote_connect(fixtures, counts=(200, 2000)):
+    """
+    Seconds until each of counts of remote PVs are connected
+    """
+    results = dict()
+    for N in counts:
+        client, rvs, connect_s = fixtures.cas_remote_connect("X1:REMBENCH{0}-".format(N), N)
+        assert client.epics_connected_count == N
+        results["{0}_PVs_s".format(N)] = connect_s
+    return results
+
+
+def bench_cas_remote_waveform(fixtures, N=100000, N_updates=50):
+    """
+    Updates per second of an N element waveform monitored into the relay of the client, until
+    the relay has the last update
+    """
+    rv_host = autocas.RelayWaveform(N)
+    rv_remote = autocas.RelayWaveform(N)
+    results = dict()
+
+    def check(client, reactor):
+        t_start = time.perf_counter()
+        for idx in range(1, N_updates + 1):
+            reactor.send_task_synchronous(lambda idx=idx: rv_host.put(np.full(N, float(idx))))
+        t_end = time.time() + 30
+        while time.time() < t_end:
+            value = reactor.send_task_synchronous(lambda: rv_remote.value)
+            if len(value) == N and value[-1] == N_updates:
+                break
+            time.sleep(0.001)
+        results["updates_per_s"] = N_updates / (time.perf_counter() - t_start)
+
+    channel = "X1:REMWAVE{0}-WF".format(N)
+    fixtures.cas_remote_connect(
+        "X1:REMWAVE{0}-".format(N),
+        0,
+        check=check,
+        rvs_host={channel: rv_host},
+        rvs_remote={channel: rv_remote},
+    )
+    results["elements"] = N
+    return results
+
+
+def bench_cas_remote_write(fixtures, N=500, N_updates=20):
+    """
+    Setpoints written per second to N remote PVs, each update writing all of them, with the
+    writes immediate and deferred
+    """
+    results = dict()
+    for deferred in [False, True]:
+
+        def check(client, reactor):
+            rvs = dict(client.PV_RV_map)
+            duration_s = 0
+            for idx in range(1, N_updates + 1):
+                duration_s += fixtures.cas_remote_write(client, reactor, rvs, float(idx))
+            results["deferred" if deferred else "immediate"] = dict(
+                puts_per_s=N * N_updates / duration_s,
+                batches=client.put_batches_total,
+            )
+
+        fixtures.cas_remote_connect(
+            "X1:REMWBENCH{0}{1}-".format(N, "D" if deferred else "I"),
+            N,
+            check=check,
+            deferred=deferred,
+            deferred_write_period=0.01,
+        )
+    return results
+
+
+# benchmarks of each group by name, with the arguments of their full and quick runs
+GROUPS = dict(
+    reactor=dict(
+        send_task=(bench_send_task, dict(), dict(N=2000)),
+        send_task_threads=(bench_send_task, dict(N_threads=4), dict(N=2000, N_threads=4)),
+        send_task_batch=(bench_send_task_batch, dict(), dict(N=2000)),
+        enqueue_rekey=(
+            bench_enqueue_rekey,
+            dict(),
+            dict(N_keys=50, N_ops=2000, sim_duration_s=10),
+        ),
+        reschedules=(
+            bench_reschedules,
+            dict(),
+            dict(N_keys=50, rate_hz=2000, duration_s=0.2),
+        ),
+        looping_jitter=(
+            bench_looping_jitter,
+            dict(),
+            dict(rates_hz=(10, 100), duration_s=0.2),
+        ),
+        looping_simulated=(bench_looping_simulated, dict(), dict(sim_duration_s=2)),
+        round_trip=(bench_round_trip, dict(), dict(N=200)),
+        flush=(bench_flush, dict(), dict(N=200, N_timed=10)),
+    ),
+    relay=dict(
+        relay_validate=(bench_relay_validate, dict(), dict(N=2000)),
+        relay_compact=(bench_relay_compact, dict(), dict(N_memory=200, N_assign=2000)),
+        relay_batch=(bench_relay_batch, dict(), dict(N_polls=20)),
+        relay_array=(bench_relay_array, dict(), dict(N=100, N_puts=2)),
+    ),
+    cas=dict(
+        cas_host=(bench_cas_host, dict(), dict(N=100, N_generate=2)),
+        cas_puts=(bench_cas_puts, dict(), dict(N_direct=2000, N_ca=20)),
+        cas_shards=(
+            bench_cas_shards,
+            dict(),
+            dict(shard_counts=(0, 2), N_channels=20, N_updates=5),
+        ),
+        cas_remote_rates=(bench_cas_remote_rates, dict(), dict(N=100, N_batches=5)),
+        cas_remote_connect=(bench_cas_remote_connect, dict(), dict(counts=(20,))),
+        cas_remote_waveform=(bench_cas_remote_waveform, dict(), dict(N=1000, N_updates=5)),
+        cas_remote_write=(bench_cas_remote_write, dict(), dict(N=20, N_updates=2)),
+    ),
+)
+
+# the benchmarks taking the fixtures argument
+FIXTURES_USED = [
+    bench_send_task,
+    bench_round_trip,
+    bench_cas_puts,
+    bench_cas_shards,
+    bench_cas_remote_connect,
+    bench_cas_remote_waveform,
+    bench_cas_remote_write,
+]
+
+
+def run_suite(fixtures, quick=False, groups=None):
+    """
+    Run every benchmark of groups, all of them by default, returning a JSON-able dict of the
+    results along with the platform
+    """
+    if groups is None:
+        groups = list(GROUPS)
+    results = dict()
+    for group in groups:
+        for name, (bench, scale, scale_quick) in GROUPS[group].items():
+            if quick:
+                scale = scale_quick
+            if bench in FIXTURES_USED:
+                bench = functools.partial(bench, fixtures)
+            results[name] = bench(**scale)
+    return dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        time=time.time(),
+        quick=quick,
+        groups=groups,
+        results=results,
+    )
+
+
+def flatten(results, prefix=()):
+    flat = dict()
+    for key, val in results.items():
+        if isinstance(val, dict):
+            flat.update(flatten(val, prefix + (key,)))
+        else:
+            flat[".".join(prefix + (key,))] = val
+    return flat
+
+
+def compare(results, baseline, F=sys.stdout):
+    """
+    Print each metric against the baseline run
+    """
+    flat = flatten(results["results"])
+    flat_base = flatten(baseline["results"])
+    for key in sorted(flat):
+        val = flat[key]
+        base = flat_base.get(key, None)
+        if base is None or not base:
+            print("{0:>45}: {1:12.4g}".format(key, val), file=F)
+        else:
+            print(
+                "{0:>45}: {1:12.4g} {2:12.4g} {3:8.3f}x".format(key, val, base, val / base),
+                file=F,
+            )
+
+
+def test_benchmarks_quick(
+    run_reactor_with,
+    cas_db_relays,
+    cas_db_kinds,
+    shard_ports,
+    cas_remote_connect,
+    cas_remote_write,
+):
+    fixtures = Bunch(
+        run_reactor_with=run_reactor_with,
+        cas_db_relays=cas_db_relays,
+        cas_db_kinds=cas_db_kinds,
+        shard_ports=shard_ports,
+        cas_remote_connect=cas_remote_connect,
+        cas_remote_write=cas_remote_write,
+    )
+    results = run_suite(fixtures, quick=True)
+    json.dumps(results)
+    compare(results, results)
+    results = results["results"]
+    assert results["send_task"]["tasks"] == 2000
+    assert results["send_task_threads"]["tasks"] == 2000
+    assert results["looping_simulated"]["runs"] > 0
+    assert results["reschedules"]["heap_max"] <= results["reschedules"]["heap_bound"]
+    # the previous implementation polled every 50ms
+    assert results["round_trip"]["median_us"] < 10000
+    assert results["cas_shards"]["2_shards"]["missing"] == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="autocas benchmark suite")
+    parser.add_argument("-o", "--output", help="JSON file to write the results to")
+    parser.add_argument("-c", "--compare", help="JSON results of a previous run to compare to")
+    parser.add_argument("-q", "--quick", action="store_true", help="run a reduced suite")
+    parser.add_argument(
+        "-g",
+        "--group",
+        action="append",
+        choices=list(GROUPS),
+        help="only run the benchmarks of this group, may be given more than once",
+    )
+    args = parser.parse_args()
+
+    # outside of pytest, the fixtures are the conftest helpers they return
+    import conftest
+
+    conftest.ca_local_environ()
+    fixtures = Bunch(
+        run_reactor_with=conftest.run_reactor_with,
+        cas_db_relays=conftest.cas_db_relays,
+        cas_db_kinds=conftest.cas_db_kinds,
+        shard_ports=conftest.SHARD_PORTS,
+        cas_remote_connect=conftest.cas_remote_connect,
+        cas_remote_write=conftest.cas_remote_write,
+    )
+    results = run_suite(fixtures, quick=args.quick, groups=args.group)
+    if args.output is not None:
+        with open(args.output, "w") as F:
+            json.dump(results, F, indent=2)
+    if args.compare is not None:
+        with open(args.compare, "r") as F:
+            baseline = json.load(F)
+        compare(results, baseline)
+    else:
+        for key, val in sorted(flatten(results["results"]).items()):
+            print("{0:>45}: {1:12.4g}".format(key, val))
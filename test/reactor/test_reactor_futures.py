@@ -0,0 +1,68 @@
+"""
+Checks of the reactor futures
+"""
+import time
+
+from wield.epics.autocas import Reactor
+from wield.epics.autocas.cascore import FutureCancelled, gather
+
+
+def test_run_reactor_with_raises(run_reactor_with):
+    reactor = Reactor()
+
+    def target():
+        raise ValueError("target failed")
+
+    try:
+        run_reactor_with(reactor, target, lambda: None)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_future_results(run_reactor_with):
+    reactor = Reactor()
+
+    def fail():
+        raise ValueError("failed")
+
+    def target():
+        assert reactor.send_task_synchronous(lambda x: x + 1, 1) == 2
+        try:
+            reactor.send_task_synchronous(fail)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+        chained = reactor.send_task_future(lambda: 2).then(lambda x: x * 10)
+        assert chained.result(timeout=1) == 20
+        # chaining through a future and passing an exception through
+        chained = reactor.send_task_future(lambda: 3).then(
+            lambda x: reactor.send_task_future(lambda: x * 100)
+        )
+        assert chained.result(timeout=1) == 300
+        assert isinstance(reactor.send_task_future(fail).then(lambda x: x).exception(), ValueError)
+
+        batch = gather(reactor.send_task_future(lambda i=i: i) for i in range(100))
+        assert batch.result(timeout=1) == list(range(100))
+
+        # timeouts and cancellation of a task that has not yet run
+        late = reactor.send_task_future(lambda: 1, run_at=time.time() + 10)
+        try:
+            late.result(timeout=0.01)
+        except TimeoutError:
+            pass
+        else:
+            assert False
+        assert late.cancel()
+        try:
+            late.result()
+        except FutureCancelled:
+            pass
+        else:
+            assert False
+        return True
+
+    assert run_reactor_with(reactor, target) == [True]
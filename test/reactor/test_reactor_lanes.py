@@ -0,0 +1,50 @@
+"""
+Checks of the reactor priority lanes
+"""
+
+from wield.epics.autocas import Reactor
+from wield.epics.autocas.cascore import LANE_CONTROL, LANE_MONITOR, LANE_HOUSEKEEPING
+from wield.epics.autocas.cascore.clocks import VirtualClock
+
+
+def test_lane_shares():
+    reactor = Reactor()
+    order = []
+    for idx in range(1000):
+        reactor.send_task(lambda: order.append(LANE_MONITOR), lane=LANE_MONITOR)
+    for idx in range(100):
+        reactor.send_task(lambda: order.append(LANE_CONTROL))
+        reactor.send_task(lambda: order.append(LANE_HOUSEKEEPING), lane=LANE_HOUSEKEEPING)
+    reactor.flush()
+    assert len(order) == 1200
+
+    # the control writes are not stuck behind the monitor burst
+    assert max(idx for idx, lane in enumerate(order) if lane == LANE_CONTROL) < 150
+    # and the housekeeping still gets its share while the monitor lane is busy
+    first = order[:150]
+    assert first.count(LANE_HOUSEKEEPING) > 10
+    assert abs(first.count(LANE_MONITOR) / first.count(LANE_HOUSEKEEPING) - 2) < 0.5
+
+
+def test_lane_status():
+    clock = VirtualClock(start=0)
+    reactor = Reactor(clock=clock)
+    calls = []
+    reactor.enqueue(lambda: calls.append("timed"), key="timed", future_s=1, lane=LANE_MONITOR)
+    reactor.send_task(lambda: calls.append("sent"), lane=LANE_MONITOR)
+    clock.advance(2)
+    status = reactor.lane_status()
+    assert status[LANE_MONITOR] == (1, 2)
+    assert status[LANE_CONTROL] == (0, None)
+    reactor.flush()
+    assert calls == ["sent", "timed"]
+    interval = reactor.profile.interval(clock.time())
+    assert interval.lanes[LANE_MONITOR].runs == 2
+    assert interval.lanes[LANE_MONITOR].wait_max_s == 2
+
+    try:
+        reactor.send_task(lambda: None, lane="bogus")
+    except RuntimeError:
+        pass
+    else:
+        assert False
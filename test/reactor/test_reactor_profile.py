@@ -0,0 +1,69 @@
+"""
+Checks of the reactor task profiling
+"""
+import io
+import random
+import time
+
+from wield.epics.autocas import Reactor
+from wield.epics.autocas.cascore.clocks import VirtualClock
+from wield.epics.autocas.cascore.reactor_profile import LogHistogram
+
+
+def test_log_histogram():
+    rand = random.Random(0)
+    hist = LogHistogram()
+    values = sorted(rand.lognormvariate(-7, 2) for idx in range(10000))
+    for val in values:
+        hist.record(val)
+    for pct in [50, 90, 99]:
+        exact = values[int(len(values) * pct / 100) - 1]
+        # within the bucket precision
+        assert abs(hist.percentile(pct) - exact) <= exact / 8 + 1e-6
+    assert hist.percentile(100) == values[-1]
+
+
+def test_profile_tasks():
+    clock = VirtualClock(start=0)
+    reactor = Reactor(clock=clock)
+
+    def poll():
+        return
+
+    def slow():
+        # runs long enough, in simulated time, to make the poll skip
+        clock.advance(0.8)
+
+    reactor.enqueue_looping(poll, period_s=1)
+    for idx in range(5):
+        reactor.send_task(slow, run_at=10.9 + 10 * idx)
+    reactor.flush(for_s=100.5)
+
+    interval = reactor.profile.interval(clock.time())
+    stats = interval.tasks["test_profile_tasks.<locals>.poll"]
+    assert stats.runs + stats.skips == 100
+    assert stats.skips == 5
+    assert interval.tasks["test_profile_tasks.<locals>.slow"].runs == 5
+    assert interval.wait_hist.max_s >= 0.3
+
+    F = io.StringIO()
+    reactor.profile_dump(F=F)
+    assert "test_profile_tasks.<locals>.poll" in F.getvalue()
+
+
+def test_profile_status_long_name():
+    from wield.epics import autocas
+
+    root = autocas.InstaCAS()
+    reactor = root.reactor
+
+    def task():
+        # the top task of the interval
+        time.sleep(0.05)
+
+    # such as the repr of an object key
+    task.profile_name = "x" * 150
+    reactor.send_task(task)
+    reactor.flush()
+    root.status.reactor_profile_update()
+    assert root.status.rv_reactor_top_task.value == "x" * 100
@@ -0,0 +1,153 @@
+"""
+Checks of the keyed timer heap used by Reactor.enqueue
+"""
+import time
+import random
+import threading
+
+from wield.epics.autocas import Reactor
+from wield.epics.autocas.cascore.clocks import VirtualClock
+from wield.epics.autocas.utilities.priority_queue import IndexedHeapPriorityQueue
+
+
+def test_indexed_heap_random():
+    rand = random.Random(0)
+    pq = IndexedHeapPriorityQueue()
+    ref = {}
+    for step in range(5000):
+        key = rand.randrange(50)
+        prio = rand.randrange(1000)
+        op = rand.random()
+        if op < 0.4:
+            pq.set(key, prio, key)
+            ref[key] = prio
+        elif op < 0.55 and key in ref:
+            pq.remove(key)
+            del ref[key]
+        elif op < 0.7 and key in ref:
+            prio = min(prio, ref[key])
+            pq.decrease_key(key, prio)
+            ref[key] = prio
+        elif op < 0.85 and key in ref:
+            prio = max(prio, ref[key])
+            pq.increase_key(key, prio)
+            ref[key] = prio
+        elif ref:
+            key, prio, item = pq.popitem()
+            assert prio == min(ref.values())
+            assert ref.pop(key) == prio
+        assert len(pq) == len(ref)
+
+
+def test_indexed_heap_fifo_ties():
+    pq = IndexedHeapPriorityQueue()
+    for idx in range(10):
+        pq.push(1.0, idx)
+    assert [pq.pop()[1] for idx in range(10)] == list(range(10))
+
+
+def test_enqueue_single_entry():
+    reactor = Reactor()
+    calls = []
+
+    def task():
+        calls.append(task)
+
+    for idx in range(100):
+        reactor.enqueue(task, future_s=1 + (idx % 7) * 0.1, force_requeue=True)
+    assert len(reactor._pqueue) == 1
+
+    # cancel through the looping interface
+    reactor.enqueue_looping(task, period_s=0.01)
+    assert len(reactor._pqueue) == 1
+    reactor.enqueue_looping(task, period_s=None)
+    assert len(reactor._pqueue) == 0
+
+    reactor.enqueue(task, future_s=0.5)
+    reactor.enqueue(task, future_s=0.01)
+    reactor.flush(for_s=0.05)
+    assert calls == [task]
+    assert len(reactor._pqueue) == 0
+
+
+def test_timed_send_wakeup():
+    reactor = Reactor()
+    t_start = time.time()
+    calls = []
+
+    # timed sends no longer inject placeholder tasks into the immediate queue
+    reactor.send_task(lambda: calls.append(time.time()), run_at=t_start + 10)
+    assert len(reactor._task_queue) == 0
+
+    # a send from another thread must wake the flush that is sleeping until t_start + 10
+    def sender():
+        time.sleep(0.05)
+        reactor.send_task(lambda: calls.append(time.time()), run_at=time.time() + 0.05)
+        reactor.send_task(reactor.loop_kill, run_at=time.time() + 0.1)
+
+    thread = threading.Thread(target=sender)
+    thread.start()
+    reactor.flush(for_s=5)
+    thread.join()
+    assert len(calls) == 1
+    assert calls[0] - t_start < 0.2
+
+
+def test_virtual_clock_loop():
+    clock = VirtualClock(start=0)
+    reactor = Reactor(clock=clock)
+    calls = []
+
+    def poll():
+        calls.append(clock.time())
+
+    reactor.enqueue_looping(poll, period_s=1)
+    # an hour of polling, without sleeping
+    t_start = time.time()
+    reactor.flush(for_s=3600.5)
+    assert time.time() - t_start < 60
+    assert len(calls) == 3600
+    assert calls[:3] == [1, 2, 3]
+    assert clock.time() == 3600.5
+
+
+def test_enqueue_same_pass():
+    # both tasks are due in the same pass, so b has already left the heap when a runs
+    for action in ["cancel", "reschedule", "requeue", "earlier"]:
+        clock = VirtualClock(start=0)
+        reactor = Reactor(clock=clock)
+        calls = []
+
+        def a():
+            calls.append("a")
+            if action == "cancel":
+                reactor.enqueue_looping(b, period_s=None)
+            elif action == "reschedule":
+                reactor.enqueue(b, mtime_at=5, force_requeue=True)
+            elif action == "requeue":
+                reactor.enqueue(b, mtime_at=1, force_requeue=True)
+            elif action == "earlier":
+                reactor.enqueue(b, mtime_at=0.5)
+
+        def b():
+            calls.append(("b", clock.time()))
+
+        reactor.enqueue(a, mtime_at=1)
+        reactor.enqueue(b, mtime_at=1)
+        clock.advance(1)
+        reactor.flush(for_s=10)
+        assert calls[0] == "a"
+        if action == "cancel":
+            assert calls == ["a"]
+        elif action == "reschedule":
+            assert calls == ["a", ("b", 5)]
+        else:
+            assert calls == ["a", ("b", 1)]
+        assert len(reactor._pqueue) == 0
+        assert reactor._task_map == {}
+
+        # the reactor still schedules both keys afterwards
+        reactor.enqueue(a, future_s=1)
+        reactor.enqueue(b, future_s=1)
+        reactor.flush(for_s=2)
+        assert calls.count("a") == 2
@@ -0,0 +1,116 @@
+"""
+Checks that blocking bus I/O on BusWorkers runs off of the reactor thread, serialized per bus
+"""
+import time
+import statistics
+
+from wield.epics import autocas
+from wield.epics.autocas import Reactor
+
+# long enough that scheduler jitter under load stays well below the stall bound
+READ_S = 0.3
+
+
+def test_bus_workers():
+    reactor = Reactor()
+    buses = [reactor.bus_worker(name="bus{0}".format(idx)) for idx in range(3)]
+    ticks = []
+    reads = []
+    active = dict()
+
+    def tick():
+        ticks.append(time.time())
+
+    def job_gen(bus, idx):
+        def slow_readline():
+            # only one job of each bus may be in I/O at once
+            assert active.setdefault(bus.name, 0) == 0
+            active[bus.name] += 1
+            time.sleep(READ_S)
+            active[bus.name] -= 1
+            return idx
+
+        def job():
+            # holding the task_lock, as for a reactor task
+            assert reactor.check_living_in_reactor()
+            reads.append((bus.name, bus.call_blocking(slow_readline)))
+
+        return job
+
+    def submitter():
+        for bus in buses:
+            for idx in range(3):
+                bus.submit(job_gen(bus, idx))
+
+    reactor.enqueue_looping(tick, period_s=0.01)
+    reactor.send_task(submitter)
+    reactor.flush(for_s=3.5 * READ_S)
+    for bus in buses:
+        bus.stop()
+
+    # three buses of three reads run in parallel
+    assert len(reads) == 9
+    assert [idx for name, idx in reads if name == "bus0"] == [0, 1, 2]
+    # and the reactor kept ticking at its period while they read
+    gaps = [b - a for a, b in zip(ticks[:-1], ticks[1:])]
+    assert len(ticks) > 2.5 * READ_S / 0.01
+    assert statistics.median(gaps) < 0.015
+    assert max(gaps) < 0.5 * READ_S
+
+
+def test_bus_worker_failure():
+    reactor = Reactor()
+    bus = reactor.bus_worker(name="bus")
+
+    def job():
+        raise ValueError("device failed")
+
+    bus.submit(job)
+    try:
+        reactor.flush(for_s=0.2)
+    except ValueError:
+        pass
+    else:
+        assert False
+    bus.stop()
+
+
+def test_bus_worker_batch():
+    reactor = Reactor()
+    bus = reactor.bus_worker(name="bus")
+    rv_job = autocas.RelayValueFloat(0)
+    rv_task = autocas.RelayValueFloat(0)
+    seen = []
+    rv_job.register(callback=lambda value: seen.append(("job", value)))
+    rv_task.register(callback=lambda value: seen.append(("task", value)))
+
+    def job():
+        with autocas.batch():
+            rv_job.value = 1
+            bus.call_blocking(time.sleep, 0.2)
+            seen.append("job done")
+
+    def task():
+        # runs during the I/O, outside of the batch of the job
+        rv_task.value = rv_job.value
+
+    bus.submit(job)
+    reactor.send_task(task, run_at=time.time() + 0.1)
+    reactor.flush(for_s=0.4)
+    bus.stop()
+    assert seen == [("task", 1), "job done", ("job", 1)]
+
+
+def test_bus_workers_stop():
+    root = autocas.InstaCAS()
+    reactor = root.reactor
+    buses = [reactor.bus_worker(name="bus{0}".format(idx)) for idx in range(2)]
+    for bus in buses:
+        bus.submit(lambda: None)
+    reactor.flush(for_s=0.1)
+    threads = [bus._thread for bus in buses]
+    assert all(thread.is_alive() for thread in threads)
+    root.stop()
+    for thread in threads:
+        thread.join(timeout=1)
+        assert not thread.is_alive()
@@ -0,0 +1,76 @@
+"""
+Checks of RelayArrayFloatLowHighMod against the scalar RelayValueFloatLowHighMod
+"""
+import numpy as np
+
+from wield.epics import autocas
+
+
+LIMITS = [
+    dict(),
+    dict(low=-1, high=2),
+    dict(low=0, high=10, modulo=0.25),
+]
+VALUES = [0, 1, 1.5, 1.6, -1, -1.2, 2, 2.01, 9.9, 10, 11, float("nan"), float("inf"), "1.5", "x"]
+
+
+def test_validate_many():
+    for limits in LIMITS:
+        rv = autocas.RelayValueFloatLowHighMod(0, **limits)
+        bank = autocas.RelayArrayFloatLowHighMod(len(VALUES), **limits)
+        # the vector path for numbers, and the elementwise fallback with the strings
+        for values in [VALUES[:-2], VALUES]:
+            status, new_vals = bank.validate_many(values)
+            for value, value_status, new_val in zip(values, status, new_vals):
+                result = rv.validate(value)
+                assert value_status == result[0]
+                if result[0] == autocas.VALUE_REJECTED:
+                    assert np.isnan(new_val)
+                else:
+                    assert new_val == result[1]
+                    # the elements validate with the same semantics
+                    assert bank[0].validate(value) == result
+
+
+def test_put_many():
+    bank = autocas.RelayArrayFloatLowHighMod(4, initial_value=1, low=0, high=10)
+    seen = []
+    for rv in bank:
+        rv.register(key="A", callback=lambda value, idx=rv.idx: seen.append((idx, value)))
+    assert [rv.value for rv in bank] == [1.0] * 4
+
+    status = bank.put_many([1, 2, 20, 3.5])
+    assert list(status) == [autocas.VALUE_VALID] * 2 + [autocas.VALUE_REJECTED, autocas.VALUE_VALID]
+    assert list(bank.values) == [1, 2, 1, 3.5]
+    # only the changed elements notify
+    assert seen == [(1, 2.0), (3, 3.5)]
+
+    del seen[:]
+    bank.put_many([5, 6], idxs=[2, 3], key="A")
+    assert list(bank.values) == [1, 2, 5, 6]
+    assert seen == []
+
+    # within a batch, deferred with the other relays
+    with autocas.batch():
+        bank.put_many([7, 8], idxs=[2, 3])
+        bank[3].value = 6
+        assert seen == []
+    assert seen == [(2, 7.0)]
+    del seen[:]
+
+    # the elements are ordinary relays
+    bank[0].value = 4
+    assert bank.values[0] == 4
+    assert seen == [(0, 4.0)]
+    assert bank[0].put_coerce(4.5) is True
+    try:
+        bank[0].value = 11
+    except autocas.RelayValueRejected:
+        pass
+    else:
+        assert False
+    db = bank[1].db_defaults()
+    assert db["type"] == "float"
+    assert db["value"] == 2.0
+    assert db["hilim"] == 10
+    assert db["rv"] is bank[1]
@@ -0,0 +1,103 @@
+"""
+Checks of batch, deferring the relay callbacks until it exits
+"""
+from wield.epics import autocas
+
+
+def record(rv, key=None):
+    seen = []
+    rv.register(key=key, callback=seen.append)
+    return seen
+
+
+def test_batch():
+    rv_a = autocas.RelayValueFloat(0)
+    rv_b = autocas.RelayCompactInt(0)
+    rv_c = autocas.RelayValueString("")
+    seen_a = record(rv_a)
+    seen_b = record(rv_b)
+    seen_c = record(rv_c)
+    excluded = record(rv_a, key="X")
+
+    with autocas.batch() as batch:
+        rv_a.value = 1
+        rv_a.put_exclude_cb(2, key="X")
+        rv_b.value = 5
+        # changed back, so not notified
+        rv_c.value = "a"
+        rv_c.value = ""
+        # values are assigned immediately, the callbacks are deferred
+        assert rv_a.value == 2
+        assert seen_a == []
+        assert autocas.batch_active() is batch
+        # nested batches join the outer
+        with autocas.batch():
+            rv_b.value = 6
+        assert seen_b == []
+    assert autocas.batch_active() is None
+    assert seen_a == [2]
+    # X is notified, as not every put excluded it
+    assert excluded == [2]
+    assert seen_b == [6]
+    assert seen_c == []
+
+    # only excluded when every put excludes the key
+    with autocas.batch():
+        rv_a.put_exclude_cb(3, key="X")
+    assert seen_a == [2, 3]
+    assert excluded == [2]
+
+    # flushed on errors
+    try:
+        with autocas.batch():
+            rv_a.value = 4
+            raise KeyError()
+    except KeyError:
+        pass
+    assert seen_a == [2, 3, 4]
+
+
+def test_batch_derived():
+    rb_a = autocas.RelayBool(False)
+    rb_b = autocas.RelayBool(False)
+    rb_all = autocas.RelayBoolAll([rb_a, rb_b])
+    seen = record(rb_all)
+    seen_a = record(rb_a)
+
+    with autocas.batch():
+        rb_a.value = True
+        rb_b.value = True
+        # consistent within the batch, as the gate waits on the callbacks
+        assert rb_all.value is False
+    assert seen == [True]
+    assert seen_a == [True]
+
+    # toggled and back, invisible to the gate
+    with autocas.batch():
+        rb_a.value = False
+        rb_a.value = True
+    assert seen == [True]
+    assert seen_a == [True]
+    rb_b.value = False
+    assert seen == [True, False]
+
+    # relays put by callbacks in the flush are deferred into it, and called once
+    rv_in = autocas.RelayValueFloat(0)
+    rv_out = autocas.RelayValueFloat(0)
+    rv_in.register(callback=lambda value: rv_out.put(value * 2))
+    rv_in2 = autocas.RelayValueFloat(0)
+    rv_in2.register(callback=lambda value: rv_out.put(rv_out.value + value))
+    seen_out = record(rv_out)
+    with autocas.batch():
+        rv_in.value = 1
+        rv_in2.value = 1
+    assert seen_out == [3]
+
+    # waveforms notify for every assignment, once per batch
+    rv_wave = autocas.RelayWaveform(10)
+    seen_wave = record(rv_wave)
+    with autocas.batch():
+        rv_wave.value = [1, 2]
+        rv_wave.value = [1, 2, 3]
+    assert len(seen_wave) == 1
+    assert list(seen_wave[0]) == [1, 2, 3]
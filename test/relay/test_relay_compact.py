@@ -0,0 +1,72 @@
+"""
+Checks of the compact relays against the declarative ones they replace
+"""
+from wield.epics import autocas
+
+
+def record(rv, key):
+    seen = []
+    rv.register(key=key, callback=seen.append)
+    return seen
+
+
+def test_compact_same_as_declarative():
+    for compact, declarative, values in [
+        (autocas.RelayCompactFloat, autocas.RelayValueFloat, [1, 1.0, 2.5, 3, 2.5]),
+        (autocas.RelayCompactInt, autocas.RelayValueInt, [1, True, 5, 5, 0]),
+        (autocas.RelayCompactString, autocas.RelayValueString, ["a", "a", "b", "x" * 50]),
+    ]:
+        results = []
+        for cls in [compact, declarative]:
+            rv = cls(values[0])
+            seen = record(rv, "A")
+            excluded = record(rv, "B")
+            for value in values:
+                try:
+                    rv.put_exclude_cb(value, key="B")
+                except autocas.RelayValueCoerced as E:
+                    rv.put_valid(E.preferred)
+            rv.value = values[0]
+            results.append((rv.value, seen, excluded, rv.db_defaults()["type"]))
+        assert results[0] == results[1]
+
+
+def test_compact_register():
+    rv = autocas.RelayCompactFloat(1.5)
+    seen = record(rv, "A")
+    assert hasattr(rv, "__dict__") is False
+    assert list(rv.callbacks) == ["A"]
+
+    # immediately called with the current value if it differs from the assumed one
+    also = []
+    rv.register(callback=also.append, assumed_value=0.0)
+    assert also == [1.5]
+    rv.value = 2.0
+    assert seen == [2.0]
+    assert also == [1.5, 2.0]
+
+    rv.register(key="A", remove=True)
+    rv.value = 3.0
+    assert seen == [2.0]
+    assert also == [1.5, 2.0, 3.0]
+
+    # coercion
+    assert rv.put_coerce(4) is True
+    assert rv.value == 4.0
+    for value in [float("nan"), "bad"]:
+        try:
+            rv.value = value
+        except autocas.RelayValueRejected:
+            pass
+        else:
+            assert False
+    assert rv.value == 4.0
+    rv_str = autocas.RelayCompactString("")
+    assert rv_str.put_coerce("x" * 50) is False
+    assert rv_str.value == "x" * 40
+
+    db = rv.db_defaults()
+    assert db == {"type": "float", "burt": True, "value": 4.0, "rv": rv}
+    db["prec"] = 3
+    # copied from the template of the class
+    assert "prec" not in rv.db_defaults()
@@ -0,0 +1,80 @@
+"""
+Checks of the validate protocol of the relays, returning (status, value) rather than raising
+RelayValueCoerced and RelayValueRejected
+"""
+import declarative
+from wield.epics import autocas
+
+
+def test_validate():
+    VALID, COERCED, REJECTED = autocas.VALUE_VALID, autocas.VALUE_COERCED, autocas.VALUE_REJECTED
+    for rv, value, result in [
+        (autocas.RelayValueFloat(0), 1.5, (VALID, 1.5)),
+        (autocas.RelayValueFloat(0), 2, (VALID, 2.0)),
+        (autocas.RelayValueFloat(0), float("inf"), (REJECTED, None)),
+        (autocas.RelayValueFloat(0), "bad", (REJECTED, None)),
+        (autocas.RelayValueFloatLowHighMod(0, low=0, high=10), 20, (REJECTED, None)),
+        (autocas.RelayValueFloatLowHighMod(0, modulo=0.5), 1.7, (COERCED, 1.5)),
+        (autocas.RelayValueInt(0), 2.5, (COERCED, 2)),
+        (autocas.RelayValueString(""), "x" * 50, (COERCED, "x" * 40)),
+        (autocas.RelayValueLongString(""), "x" * 50, (VALID, "x" * 50)),
+        (autocas.RelayValueEnum(0, ["A", "B"]), "B", (VALID, 1)),
+        (autocas.RelayValueEnum(0, ["A", "B"]), 2, (REJECTED, None)),
+        (autocas.RelayCompactFloat(0.0), 1, (VALID, 1.0)),
+        (autocas.RelayCompactString(""), "x" * 50, (COERCED, "x" * 40)),
+    ]:
+        validate = autocas.relay_validate(rv)
+        assert validate == rv.validate
+        assert validate(value) == result
+
+        # the compatibility shim
+        try:
+            assert rv.validator(value) == result[1]
+        except autocas.RelayValueCoerced as E:
+            assert result[0] == COERCED
+            assert E.preferred == result[1]
+        except autocas.RelayValueRejected:
+            assert result[0] == REJECTED
+        else:
+            assert result[0] == VALID
+
+
+def test_validate_wrapped():
+    VALID, COERCED, REJECTED = autocas.VALUE_VALID, autocas.VALUE_COERCED, autocas.VALUE_REJECTED
+
+    # validators given to the constructor
+    rv = declarative.RelayValue(2, declarative.min_max_validator(0, 10))
+    validate = autocas.relay_validate(rv)
+    assert validate(5) == (VALID, 5)
+    assert validate(20)[0] != VALID
+
+    rv = autocas.RelayValueEnum(0, ["A", "B"], validator=lambda value: 0)
+    assert autocas.relay_validate(rv)(1) == (VALID, 0)
+    assert autocas.relay_validate(declarative.RelayValue(0))(3) == (VALID, 3)
+
+    # subclasses overriding the exception validator take precedence over validate
+    class RelayValueFloatOdd(autocas.RelayValueFloat):
+        def validator(self, value):
+            if value % 2 != 1:
+                raise autocas.RelayValueCoerced(1.0)
+            return float(value)
+
+    rv = RelayValueFloatOdd(1)
+    validate = autocas.relay_validate(rv)
+    assert validate(3) == (VALID, 3.0)
+    assert validate(4) == (COERCED, 1.0)
+
+    assert autocas.relay_validate(autocas.RelayBool(False)) is None
+
+
+def test_put_coerce():
+    rv = autocas.RelayCompactInt(0)
+    assert rv.put_coerce(2.5) is False
+    assert rv.value == 2
+    try:
+        rv.put_coerce("bad")
+    except autocas.RelayValueRejected:
+        pass
+    else:
+        assert False
+    assert rv.value == 2
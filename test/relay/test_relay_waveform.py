@@ -0,0 +1,101 @@
+"""
+Checks of RelayWaveform, the preallocated buffer relay for long waveforms
+"""
+import time
+import numpy as np
+
+from wield.epics import autocas
+from wield.epics.autocas import RelayWaveform
+
+
+def test_waveform_assign():
+    rv = RelayWaveform(1000)
+    assert rv.version == 0
+    assert len(rv.value) == 0
+    seen = []
+    rv.register(callback=lambda value: seen.append((rv.version, value.copy())))
+
+    rv.value = np.arange(10)
+    assert rv.version == 1
+    assert rv.length == 10
+    assert rv.value.dtype == np.float64
+    assert np.all(rv.value == np.arange(10))
+    # the value is a view of the buffer
+    assert np.shares_memory(rv.value, rv.buffer)
+
+    # equal values still count as a change
+    rv.value = np.arange(10)
+    assert rv.version == 2
+    assert [v for v, val in seen] == [1, 2]
+
+    rv.value = [1, 2, 3]
+    assert rv.length == 3
+    assert np.all(rv.value == [1, 2, 3])
+
+
+def test_waveform_inplace():
+    rv = RelayWaveform(100, dtype=np.int32, initial_value=[0] * 50)
+    assert rv.version == 1
+    seen = []
+    rv.register(callback=lambda value: seen.append(value))
+    buffer = rv.buffer
+    buffer[:60] = np.arange(60)
+    rv.changed(60)
+    assert rv.version == 2
+    assert rv.length == 60
+    assert rv.buffer is buffer
+    assert np.all(seen[-1] == np.arange(60))
+
+    # assigning the view back does not copy, but is still a change
+    rv.value = rv.value
+    assert rv.version == 3
+
+
+def test_waveform_coerce_reject():
+    rv = RelayWaveform(10)
+    try:
+        rv.put_exclude_cb(np.arange(20), key=None)
+    except autocas.RelayValueCoerced as E:
+        assert len(E.preferred) == 10
+        rv.put_valid(E.preferred)
+    else:
+        assert False
+    assert rv.length == 10
+
+    try:
+        rv.value = "not numbers"
+    except autocas.RelayValueRejected:
+        pass
+    else:
+        assert False
+    assert rv.length == 10
+
+    try:
+        RelayWaveform(10, dtype=np.complex128)
+    except RuntimeError:
+        pass
+    else:
+        assert False
+
+
+def test_waveform_exclude_cb():
+    rv = RelayWaveform(10)
+    calls = []
+    rv.register(key="a", callback=lambda value: calls.append("a"))
+    rv.register(key="b", callback=lambda value: calls.append("b"))
+    rv.put_exclude_cb([1, 2], key="a")
+    assert calls == ["b"]
+
+
+def test_waveform_large():
+    N = 200000
+    rv = RelayWaveform(N)
+    data = np.random.randn(N)
+    N_put = 200
+    t_start = time.perf_counter()
+    for idx in range(N_put):
+        rv.value = data
+    duration_s = time.perf_counter() - t_start
+    print("{0:.1f} us per {1} point assignment".format(1e6 * duration_s / N_put, N))
+    assert rv.version == N_put
+    assert np.all(rv.value == data)